@@ -0,0 +1,254 @@
+"""
+Per-frame memory allocation tracking with tracemalloc, and budgets to catch regressions.
+
+While ENABLED is set, tracemalloc traces every allocation, and its traces are cleared at the
+start of each frame.  At the end of the frame a snapshot holds exactly the allocations made
+during the frame that are still alive, which are grouped by the source line that made them.
+Short-lived objects - the rects from RectForTile() and ComputeHitbox(), the lists from
+TilesForRect() and GetInput() - are freed before the frame ends, so they aren't in the
+snapshot.  They do raise the frame's peak: the most memory the frame's allocations held at
+any one time.
+
+To see where those come from, TEMPORARIES also keeps every object returned from a function
+during the frame alive until the frame ends, using sys.setprofile().  An extra snapshot is
+taken while they are still held, so the difference between the two is what the frame
+allocated for those objects and then would have freed, by the line that allocated it.  That
+covers the helpers that build a rect, list or tuple for their caller to use and drop, though
+not objects that never leave the function that made them.  Holding the objects puts all of
+them in the peak, and leaves more of them on the interpreter's free lists at the end of the
+frame, where they still count as retained, so budgets mean little with TEMPORARIES on.  The
+profile hook is skipped for frames that are already being profiled, e.g. by the spike
+catcher.
+
+Each frame is recorded as a FrameAllocations, and the tracker can report the lines that
+retained the most per frame, and the lines that made the most short-lived objects.
+CheckBudget() raises AllocationBudgetError, an AssertionError, when a frame goes over a
+budget, which is how benchmarks/allocations.py fails when a change makes frames allocate
+more.  In the game, "python worldtree.py --allocations FILE" writes the report to FILE when
+the game ends, and warns about frames over BUDGET_BLOCKS or BUDGET_PEAK_BYTES as they
+happen.  Add --temporaries to turn on TEMPORARIES.
+
+tracemalloc slows everything down considerably, so this is only for debugging.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import collections
+import linecache
+import os
+import sys
+import tracemalloc
+
+ENABLED = False
+# Also group the frame's short-lived objects by the line that made them.  This makes traced
+# frames slower still, and their peaks meaningless.
+TEMPORARIES = False
+# Frames of traceback stored with each allocation.  One is enough to group by line.
+TRACE_DEPTH = 1
+# Frames kept in the history.
+HISTORY = 600
+# Lines listed in the report.
+REPORT_LINES = 20
+# Budgets checked in the game, per frame.  None means no budget.
+BUDGET_BLOCKS = None  # Allocations still alive at the end of the frame.
+BUDGET_PEAK_BYTES = None  # Most memory held by the frame's allocations at once.
+
+# Allocations made by tracemalloc itself and by this module are left out.
+_IGNORED = (tracemalloc.__file__, __file__)
+_FILTERS = [tracemalloc.Filter(False, filename) for filename in _IGNORED]
+
+
+class AllocationBudgetError(AssertionError):
+  """A frame allocated more than its budget."""
+
+
+class FrameAllocations(object):
+  """The allocations made in one frame.
+
+  Attributes:
+    blocks: int number of the frame's allocations still alive at the end of the frame.
+    size: int bytes in those allocations.
+    peak: int most bytes the frame's allocations held at once.
+    lines: list of (filename, lineno, blocks, size) tuples for the lines that made the live
+      allocations, largest first.
+    temporaries: list of (filename, lineno, blocks, size) tuples for the lines that made
+      the frame's short-lived objects, largest first, or None if TEMPORARIES wasn't on for
+      the frame.
+  """
+
+  def __init__(self, blocks, size, peak, lines, temporaries=None):
+    self.blocks = blocks
+    self.size = size
+    self.peak = peak
+    self.lines = lines
+    self.temporaries = temporaries
+
+
+class AllocationTracker(object):
+  """Records the allocations made in each frame.
+
+  Attributes:
+    history: collections.deque of the last HISTORY FrameAllocations.
+    line_totals: dict of (filename, lineno) to [blocks, size] summed over every frame.
+    temporary_totals: dict of (filename, lineno) to [blocks, size] of short-lived objects,
+      summed over every frame they were grouped in.
+    frames: int number of frames recorded.
+    temporary_frames: int number of frames short-lived objects were grouped in.
+    tracing: bool, whether a frame is being traced.
+    returned: list of the objects returned so far in the frame being traced, or None if its
+      returns aren't being kept.
+  """
+
+  def __init__(self):
+    self.history = collections.deque(maxlen=HISTORY)
+    self.line_totals = {}
+    self.temporary_totals = {}
+    self.frames = 0
+    self.temporary_frames = 0
+    self.tracing = False
+    self.returned = None
+
+  def BeginFrame(self):
+    """Start tracing a frame's allocations, if ENABLED is set."""
+    if not ENABLED:
+      return
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(TRACE_DEPTH)
+    if TEMPORARIES and sys.getprofile() is None:
+      self.returned = []
+      sys.setprofile(self.Profile)
+    tracemalloc.clear_traces()
+    tracemalloc.reset_peak()
+    self.tracing = True
+
+  def Profile(self, frame, event, arg):
+    """The profile hook while TEMPORARIES is on: keeps whatever functions return."""
+    if event == 'return':
+      self.returned.append(arg)
+
+  def EndFrame(self):
+    """Record the allocations made since BeginFrame().
+
+    Returns:
+      The frame's FrameAllocations, or None if it wasn't traced.
+    """
+    if not self.tracing:
+      return None
+    self.tracing = False
+    peak = tracemalloc.get_traced_memory()[1]
+    held = None
+    if self.StopKeepingReturns():
+      held = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+      self.returned = None
+    snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    lines = []
+    for stat in snapshot.statistics('lineno'):
+      frame = stat.traceback[0]
+      lines.append((frame.filename, frame.lineno, stat.count, stat.size))
+      total = self.line_totals.setdefault((frame.filename, frame.lineno), [0, 0])
+      total[0] += stat.count
+      total[1] += stat.size
+    temporaries = None
+    if held is not None:
+      # What was only alive because it was held.
+      temporaries = []
+      for stat in held.compare_to(snapshot, 'lineno'):
+        if stat.size_diff <= 0:
+          continue
+        frame = stat.traceback[0]
+        temporaries.append((frame.filename, frame.lineno, stat.count_diff, stat.size_diff))
+        total = self.temporary_totals.setdefault((frame.filename, frame.lineno), [0, 0])
+        total[0] += stat.count_diff
+        total[1] += stat.size_diff
+      self.temporary_frames += 1
+    record = FrameAllocations(sum(line[2] for line in lines), sum(line[3] for line in lines),
+                              peak, lines, temporaries)
+    self.history.append(record)
+    self.frames += 1
+    return record
+
+  def StopKeepingReturns(self):
+    """Take the profile hook back out.  Returns whether it was in."""
+    if self.returned is None:
+      return False
+    sys.setprofile(None)
+    return True
+
+  def Stop(self):
+    """Stop tracing allocations altogether."""
+    self.tracing = False
+    if self.StopKeepingReturns():
+      self.returned = None
+    if tracemalloc.is_tracing():
+      tracemalloc.stop()
+
+  def Report(self):
+    """Returns the per-frame averages, the lines that retained the most and, if TEMPORARIES
+    was on, the lines that made the most short-lived objects."""
+    frames = list(self.history)
+    if not frames:
+      return 'No frames recorded.\n'
+    count = float(len(frames))
+    lines = [
+      '{} frames: retained {:.1f} blocks ({} max) and {:.0f} bytes per frame'.format(
+          len(frames), sum(frame.blocks for frame in frames) / count,
+          max(frame.blocks for frame in frames), sum(frame.size for frame in frames) / count),
+      'peak {:.0f} bytes per frame ({} max)'.format(
+          sum(frame.peak for frame in frames) / count, max(frame.peak for frame in frames)),
+    ]
+    lines.append('retained:')
+    lines.extend(self.ReportLines(self.line_totals, self.frames))
+    if self.temporary_frames:
+      lines.append('short-lived ({} frames):'.format(self.temporary_frames))
+      lines.extend(self.ReportLines(self.temporary_totals, self.temporary_frames))
+    return '\n'.join(lines) + '\n'
+
+  def ReportLines(self, totals, frames):
+    """Returns the report's lines for the REPORT_LINES lines with the most bytes in totals."""
+    lines = ['  {:>10} {:>10}  line'.format('blocks/fr', 'bytes/fr')]
+    for (filename, lineno), (blocks, size) in sorted(totals.items(),
+                                                     key=lambda item: -item[1][1])[:REPORT_LINES]:
+      lines.append('  {:10.2f} {:10.1f}  {}:{}  {}'.format(
+          blocks / float(frames), size / float(frames),
+          os.path.relpath(filename), lineno, linecache.getline(filename, lineno).strip()))
+    return lines
+
+  def Save(self, path):
+    with open(path, 'w') as output:
+      output.write(self.Report())
+
+
+def CheckBudget(record, blocks=None, peak_bytes=None):
+  """Raise AllocationBudgetError if a frame went over a budget.
+
+  Args:
+    record: FrameAllocations of the frame.
+    blocks: most allocations the frame may leave alive, or None for no limit.
+    peak_bytes: most bytes the frame's allocations may hold at once, or None for no limit.
+  """
+  if blocks is not None and record.blocks > blocks:
+    top = record.lines[0] if record.lines else None
+    raise AllocationBudgetError(
+        'Frame retained {} allocations, over the budget of {}{}'.format(
+            record.blocks, blocks,
+            '; most from {}:{}'.format(os.path.relpath(top[0]), top[1]) if top else ''))
+  if peak_bytes is not None and record.peak > peak_bytes:
+    raise AllocationBudgetError('Frame allocations peaked at {} bytes, over the budget of '
+                                '{}'.format(record.peak, peak_bytes))
+
+
+tracker = AllocationTracker()
+
+
+def EndFrame():
+  """Finish tracing a frame in the game, printing a warning if it went over BUDGET_BLOCKS or
+  BUDGET_PEAK_BYTES."""
+  record = tracker.EndFrame()
+  if record is None:
+    return
+  try:
+    CheckBudget(record, BUDGET_BLOCKS, BUDGET_PEAK_BYTES)
+  except AllocationBudgetError as e:
+    print('Warning: {}'.format(e))
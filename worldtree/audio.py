@@ -0,0 +1,85 @@
+"""
+Sound effects and music that can be switched off entirely.
+
+Sound objects are created when their classes are defined, long before the game has started the
+mixer, so the Sound here only loads its file when Preload() is called or the first time it's
+played.  When audio is disabled (see headless.py) or the mixer couldn't be started, sounds and
+music do nothing: a Sound plays on no channel, and every music function returns None.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import pygame
+
+# False to play no audio at all, without touching the mixer.
+ENABLED = True
+
+# Every Sound that has been created.
+_SOUNDS = []
+
+
+def Disable():
+  """Turn off all sound and music."""
+  global ENABLED
+  ENABLED = False
+
+
+def Available():
+  """Returns True if sounds and music will actually be played."""
+  return ENABLED and pygame.mixer.get_init() is not None
+
+
+def Preload():
+  """Load every Sound now, so none has to be decoded in the middle of the game."""
+  for sound in _SOUNDS:
+    sound.Load()
+
+
+class Sound(object):
+  """A sound effect, with the parts of the pygame.mixer.Sound interface the game uses.
+
+  Attributes:
+    path: str path of the sound file.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._sound = None
+    _SOUNDS.append(self)
+
+  def Load(self):
+    """Returns the pygame.mixer.Sound, loading it if needed, or None if audio is off."""
+    if self._sound is None and Available():
+      self._sound = pygame.mixer.Sound(self.path)
+    return self._sound
+
+  def play(self, *args, **kwargs):
+    """Play the sound.  Returns the pygame.mixer.Channel it's playing on, or None."""
+    sound = self.Load()
+    if sound is None:
+      return None
+    return sound.play(*args, **kwargs)
+
+  def get_length(self):
+    sound = self.Load()
+    if sound is None:
+      return 0.0
+    return sound.get_length()
+
+
+def _Ignore(*args, **kwargs):
+  return None
+
+
+class _Music(object):
+  """Stands in for pygame.mixer.music, and ignores every call while audio is off."""
+
+  def __getattr__(self, name):
+    if Available():
+      return getattr(pygame.mixer.music, name)
+    return _Ignore
+
+
+music = _Music()
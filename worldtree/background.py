@@ -0,0 +1,67 @@
+"""
+Background tasks for Game.RunAsync().
+
+Each task is a coroutine function that takes the Game.  Tasks run in the time left over after
+each frame, so they must do their work in small pieces and await between them, and they must
+never change the state of the simulation.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import asyncio
+
+import environment
+import map_transitions
+import profiling
+
+# Seconds between checks for whether the player has moved to a new room.
+PREFETCH_INTERVAL = 0.25
+# File to append a line of counters to every TELEMETRY_INTERVAL seconds.  None disables it.
+TELEMETRY_PATH = None
+TELEMETRY_INTERVAL = 5.0
+
+
+def NeighbouringRooms(region, room):
+  """Returns the set of (region, room) pairs that can be reached from the edges of a room."""
+  neighbours = set()
+  for transition_list in map_transitions.transitions[region].get(room, {}).values():
+    for transition in transition_list:
+      neighbours.add((transition.region, transition.dest))
+  return neighbours
+
+
+async def PrefetchRooms(game):
+  """Load the tile images of the rooms next to the player's, so changing rooms is faster."""
+  prefetched = set()
+  while True:
+    if (game.region, game.room) not in prefetched:
+      prefetched.add((game.region, game.room))
+      for region, room in sorted(NeighbouringRooms(game.region, game.room)):
+        map_info = environment.REGIONS[region][room]
+        image_names = set(environment.TileImageName(map_info, col, row)
+                          for row in range(map_info['height'])
+                          for col in range(map_info['width']))
+        image_names.discard(None)
+        for image_name in sorted(image_names):
+          if image_name not in environment.TILE_IMAGES:
+            environment.LoadTileImage(image_name)
+            profiling.counters.Increment('tiles_prefetched')
+            await asyncio.sleep(0)
+    await asyncio.sleep(PREFETCH_INTERVAL)
+
+
+async def WriteTelemetry(game):
+  """Append the game's progress and latest counters to TELEMETRY_PATH every so often."""
+  if TELEMETRY_PATH is None:
+    return
+  while True:
+    await asyncio.sleep(TELEMETRY_INTERVAL)
+    with open(TELEMETRY_PATH, 'a') as telemetry:
+      telemetry.write('{} {} {} {}\n'.format(game.steps, game.region, game.room,
+                                             profiling.counters.Report()))
+
+
+# The tasks the game runs by default.
+TASKS = [PrefetchRooms, WriteTelemetry]
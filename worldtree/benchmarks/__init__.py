@@ -0,0 +1,9 @@
+"""
+Scripted scenarios for measuring the game's performance.
+
+Each module can be run from the worldtree directory with python -m benchmarks.<name>.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
@@ -0,0 +1,103 @@
+"""
+Checks that frames stay within an allocation budget.
+
+Runs the rooms from benchmarks.scenarios with the same scripted input, tracing every frame's
+allocations with the allocations module, and fails if any frame after the warm-up leaves more
+allocations alive than the block budget, or its allocations peak above the byte budget.  The
+warm-up lets the first frames fill the image and mask caches, which are meant to allocate.
+Prints the allocations report at the end either way.  With --temporaries the report also
+lists the lines that made the most short-lived objects, and since finding them skews the
+frames' numbers, the budgets aren't checked.
+
+Run from the worldtree directory:
+  python -m benchmarks.allocations [--frames N] [--blocks N] [--peak-kb N] [--temporaries]
+      [scenario ...]
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import argparse
+import sys
+
+import allocations
+from benchmarks import scenarios
+import controller
+import game
+from game_constants import GameOverException
+import rng
+import snapshot
+
+DEFAULT_FRAMES = 300
+WARMUP_FRAMES = 60
+# Default budgets, with headroom over what the scenarios use now.
+BUDGET_BLOCKS = 500
+BUDGET_PEAK_KB = 64
+
+
+def RunScenario(name, frames, blocks, peak_bytes):
+  """Run one scenario, checking every frame after the warm-up against the budgets.
+
+  Raises:
+    allocations.AllocationBudgetError: if a frame goes over a budget.
+  """
+  region, room, position, _ = scenarios.SCENARIOS[name]
+  scenario_game = game.Game(scenarios.screen, room=room, region=region, position=position)
+  rng.Seed(scenarios.SEED)
+  source = controller.input_source
+  controller.input_source = scenarios.ScriptedInput()
+  # Dying goes back to the start of the scenario, as in benchmarks.scenarios.
+  scenario_game.checkpoint = snapshot.Capture(scenario_game)
+  restart = game.RESTART_FROM_CHECKPOINT
+  game.RESTART_FROM_CHECKPOINT = True
+  allocations.ENABLED = True
+  try:
+    for frame in range(frames):
+      allocations.tracker.BeginFrame()
+      scenario_game.Tick()
+      scenario_game.Present(scenario_game.Render(1.0))
+      record = allocations.tracker.EndFrame()
+      if frame >= WARMUP_FRAMES:
+        allocations.CheckBudget(record, blocks, peak_bytes)
+  except GameOverException:
+    pass
+  finally:
+    game.RESTART_FROM_CHECKPOINT = restart
+    allocations.ENABLED = False
+    allocations.tracker.Stop()
+    controller.input_source = source
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Per-frame allocation budget check.')
+  parser.add_argument('scenarios', nargs='*', default=sorted(scenarios.SCENARIOS),
+                      help='scenarios to run: ' + ', '.join(sorted(scenarios.SCENARIOS)))
+  parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES)
+  parser.add_argument('--blocks', type=int, default=BUDGET_BLOCKS,
+                      help='most allocations a frame may leave alive')
+  parser.add_argument('--peak-kb', type=int, default=BUDGET_PEAK_KB,
+                      help='most KB a frame\'s allocations may hold at once')
+  parser.add_argument('--temporaries', action='store_true',
+                      help='also report short-lived objects by line, without checking budgets')
+  args = parser.parse_args(argv[1:])
+  allocations.TEMPORARIES = args.temporaries
+  blocks, peak_bytes = args.blocks, args.peak_kb * 1024
+  if args.temporaries:
+    blocks = peak_bytes = None
+  failed = False
+  for name in args.scenarios:
+    if name not in scenarios.SCENARIOS:
+      parser.error('unknown scenario {}'.format(name))
+    try:
+      RunScenario(name, args.frames, blocks, peak_bytes)
+      print('{}: {}'.format(name, 'no budgets checked' if args.temporaries else 'within budget'))
+    except allocations.AllocationBudgetError as e:
+      print('{}: {}'.format(name, e))
+      failed = True
+  sys.stdout.write(allocations.tracker.Report())
+  return 1 if failed else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
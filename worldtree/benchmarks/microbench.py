@@ -0,0 +1,207 @@
+"""
+Microbenchmarks for the environment and asset loading hot paths, checked against baselines.
+
+Each benchmark times one function in isolation: building every room's Environment, redrawing
+the map (GetImage with a clean and a dirty surface), the collision queries characters make
+every frame, loading a sprite sheet and drawing the status bar.  A benchmark's result is the
+fastest of several batches of calls, in microseconds per call, which is far less noisy than
+the mean.
+
+The results are compared with the baselines stored next to this file in baselines.json, and
+any benchmark that got slower by more than the tolerance is reported as a regression, which
+makes the script exit with an error.  Baselines are only meaningful on the machine they were
+recorded on, so after pulling in a change that moves them, or on a new machine, record your
+own with --update before making the change you want to measure.
+
+Run from the worldtree directory:
+  python -m benchmarks.microbench [--update] [--tolerance T] [--baselines FILE] [name ...]
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+import headless
+headless.Init()
+
+import pygame
+
+from characters import character
+from characters import hero
+import environment
+import game_constants
+import statusbar
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+# A benchmark regresses when it's this fraction slower than its baseline.
+DEFAULT_TOLERANCE = 0.25
+# Each benchmark is run in batches of calls, and the fastest batch is its result.  Batches
+# are kept short, so that few of them are hit by anything else running on the machine, and
+# there are at least MIN_BATCHES of them, and more until TIME_PER_BENCHMARK has passed.
+BATCH_SECONDS = 0.001
+MIN_BATCHES = 20
+TIME_PER_BENCHMARK = 0.2
+# A benchmark that looks like a regression is timed again this many times before it's
+# reported, since a busy machine can slow down every batch of a short benchmark.
+RETRIES = 3
+
+# The room, hero position and movement used by the collision benchmarks.  The hero stands on
+# the floor of the first room, so moves are cut short by the ground.
+ROOM = 'Map1'
+REGION = 1
+POSITION = (2, 10)
+FALL = (4, 10)
+STEP = (6, 0)
+
+
+def Benchmarks():
+  """Set up every benchmark.
+
+  Returns:
+    List of (name, function) pairs, where function takes no arguments.
+  """
+  benchmarks = []
+  for region in sorted(environment.REGIONS):
+    for room in sorted(environment.REGIONS[region], key=lambda name: int(name[3:])):
+      benchmarks.append(('Environment.__init__ {}/{}'.format(region, room),
+                         lambda room=room, region=region: environment.Environment(room, region)))
+  # Build every room once first, so every benchmark runs with all the tile images and sprites
+  # loaded, however many of them are selected.
+  for _, function in benchmarks:
+    function()
+
+  env = environment.Environment(ROOM, REGION)
+  player = hero.Hero(env, position=POSITION)
+  status = statusbar.Statusbar(player)
+  hitbox = player.Hitbox()
+
+  def DirtyImage():
+    env.dirty = True
+    env.GetImage()
+
+  benchmarks.extend([
+    ('Environment.GetImage clean', env.GetImage),
+    ('Environment.GetImage dirty', DirtyImage),
+    ('Environment.AttemptMove fall', lambda: env.AttemptMove(player, FALL)),
+    ('Environment.AttemptMove step', lambda: env.AttemptMove(player, STEP)),
+    ('Environment.IsMoveLegal', lambda: env.IsMoveLegal(player, STEP)),
+    ('Environment.IsRectSupported', lambda: env.IsRectSupported(hitbox)),
+    ('Environment.TilesForRect', lambda: env.TilesForRect(hitbox)),
+    ('character.LoadImages', lambda: character.LoadImages(
+        'treeguywalk*.png', scaled=True, colorkey=game_constants.SPRITE_COLORKEY)),
+    ('Statusbar.GetImage', status.GetImage),
+  ])
+  return benchmarks
+
+
+def Time(function):
+  """Returns the fastest time per call of a function, in microseconds.
+
+  Like timeit, this turns off the garbage collector while a batch is running, but it collects
+  between batches so the garbage from slow functions doesn't pile up.
+  """
+  enabled = gc.isenabled()
+  # The first call may fill caches, such as GetImage's surface.
+  function()
+  try:
+    loops = 1
+    while True:
+      elapsed = _TimeBatch(function, loops)
+      if elapsed >= BATCH_SECONDS:
+        break
+      loops *= 10 if elapsed < BATCH_SECONDS / 10 else 2
+    best = elapsed
+    batches = 1
+    deadline = time.perf_counter() + TIME_PER_BENCHMARK
+    while batches < MIN_BATCHES or time.perf_counter() < deadline:
+      best = min(best, _TimeBatch(function, loops))
+      batches += 1
+  finally:
+    if enabled:
+      gc.enable()
+  return best * 1e6 / loops
+
+
+def _TimeBatch(function, loops):
+  """Returns the seconds taken to call a function loops times, with the collector off."""
+  gc.collect()
+  gc.disable()
+  start = time.perf_counter()
+  for _ in range(loops):
+    function()
+  return time.perf_counter() - start
+
+
+def LoadBaselines(path):
+  """Returns the dict of benchmark name to baseline microseconds stored at path, if any."""
+  if not os.path.exists(path):
+    return {}
+  with open(path) as baseline_file:
+    return json.load(baseline_file)['benchmarks']
+
+
+def SaveBaselines(path, results):
+  with open(path, 'w') as baseline_file:
+    json.dump({
+      'python': platform.python_version(),
+      'pygame': pygame.version.ver,
+      'platform': platform.platform(),
+      'benchmarks': dict((name, round(us, 3)) for name, us in results.items()),
+    }, baseline_file, indent=2, sort_keys=True)
+    baseline_file.write('\n')
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Microbenchmarks checked against baselines.')
+  parser.add_argument('names', nargs='*',
+                      help='only run benchmarks whose name contains one of these')
+  parser.add_argument('--update', action='store_true',
+                      help='record the results as the new baselines')
+  parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                      help='fraction slower than the baseline that counts as a regression')
+  parser.add_argument('--baselines', default=BASELINES_PATH, help='baseline JSON file')
+  args = parser.parse_args(argv[1:])
+  baselines = LoadBaselines(args.baselines)
+  results = {}
+  regressions = []
+  for name, function in Benchmarks():
+    if args.names and not any(part in name for part in args.names):
+      continue
+    results[name] = Time(function)
+    baseline = baselines.get(name)
+    for _ in range(RETRIES):
+      if args.update or baseline is None or results[name] <= baseline * (1 + args.tolerance):
+        break
+      results[name] = min(results[name], Time(function))
+    if baseline is None:
+      verdict = 'no baseline'
+    else:
+      change = results[name] / baseline - 1
+      verdict = '{:+.1%}'.format(change)
+      if change > args.tolerance:
+        verdict += ' REGRESSION'
+        regressions.append(name)
+    print('{:40} {:12.2f}us  {}'.format(name, results[name], verdict))
+  if args.update:
+    # Keep the baselines of any benchmarks that weren't run.
+    baselines.update(results)
+    SaveBaselines(args.baselines, baselines)
+    print('Wrote ' + args.baselines)
+    return 0
+  if regressions:
+    print('{} regression(s) beyond {:.0%}: {}'.format(len(regressions), args.tolerance,
+                                                     ', '.join(regressions)))
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
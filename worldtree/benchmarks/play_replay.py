@@ -0,0 +1,45 @@
+"""
+Plays back a recording made with "python worldtree.py --record FILE" as fast as possible.
+
+Nothing is drawn and there's no frame limiter, so this measures the simulation alone, and
+always runs exactly the same game.  Reports the simulation steps per second and a digest of
+the final state, which is the same on every run of the same recording.
+
+Run from the worldtree directory:
+  python -m benchmarks.play_replay FILE [repeats]
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import hashlib
+import sys
+import time
+
+import game
+import headless
+import replay
+import snapshot
+
+
+def main(argv):
+  if len(argv) < 2:
+    print(__doc__)
+    return 2
+  screen = headless.Init()
+  recording = replay.Recording.Load(argv[1])
+  repeats = int(argv[2]) if len(argv) > 2 else 1
+  print('{} steps, seed {}'.format(len(recording.steps), recording.seed))
+  for _ in range(repeats):
+    playback = game.Game(screen)
+    start = time.perf_counter()
+    ticks = replay.Play(playback, recording)
+    elapsed = time.perf_counter() - start
+    digest = hashlib.md5(snapshot.Capture(playback)).hexdigest()[:12]
+    print('{}, final state {}'.format(headless.Report(ticks, elapsed), digest))
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
@@ -0,0 +1,110 @@
+"""
+Stress scenario for the sprite pools in pooling.py.
+
+Spawns projectiles, death animations and item drops every frame, far faster than a real room
+would, first with the pools turned off and then with them on.  For each run it reports how
+many sprites (each with its own rect and usually an Animation) had to be constructed, and
+the pool hit rates.  The script exits with an error if pooling didn't reduce the number of
+sprites constructed per frame.
+
+Run from the worldtree directory:
+  python -m benchmarks.pool_stress [frames]
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+pygame.init()
+
+from game_constants import *
+pygame.display.set_mode(SCREEN_SIZE)
+
+from characters import character
+from characters import powerup
+from characters import projectile
+import environment
+import pooling
+
+ROOM = 'Map1'
+REGION = 1
+DEFAULT_FRAMES = 600
+SPAWNS_PER_FRAME = 4
+# Drops are killed this many frames after they appear, as if the player picked them up.
+DROP_LIFETIME = 30
+
+
+def RunScenario(frames, pooled):
+  """Run the stress scenario once.
+
+  Args:
+    frames: int number of frames to simulate.
+    pooled: True to use the pools, False to construct every sprite.
+
+  Returns:
+    A dict of statistics about the run.
+  """
+  pooling.ENABLED = pooled
+  pooling.Clear()
+  env = environment.Environment(ROOM, REGION)
+  groups = (env.hero_projectile_group, env.enemy_projectile_group, env.dying_animation_group,
+            env.item_group)
+  drops = []
+  spawned = 0
+  start = time.perf_counter()
+  for frame in range(frames):
+    for i in range(SPAWNS_PER_FRAME):
+      x = 100 + (frame * 37 + i * 101) % (MAP_WIDTH - 200)
+      y = MAP_Y + 100 + (frame * 53 + i * 71) % (MAP_HEIGHT - 200)
+      env.hero_projectile_group.add(
+          projectile.SeedBullet.Spawn(env, [1 if i % 2 else -1, 0], (x, y)))
+      env.enemy_projectile_group.add(projectile.SporeCloud.Spawn(env, [i - 1.5, -1], (x, y)))
+      env.dying_animation_group.add(character.Dying.Spawn(pygame.Rect(x, y, 48, 48)))
+      drop_class = powerup.HealthRestore if i % 2 else powerup.AmmoRestore
+      tile = env.TileIndexForPoint(*env.MapCoordinateForScreenPoint(x, y))
+      drop = drop_class.Spawn(env, tile)
+      env.item_group.add(drop)
+      drops.append((frame, drop))
+      spawned += 4
+    for group in groups:
+      group.update()
+    while drops and drops[0][0] <= frame - DROP_LIFETIME:
+      drops.pop(0)[1].kill()
+  elapsed = time.perf_counter() - start
+  stats = pooling.Stats()
+  return {
+      'spawned': spawned,
+      'constructed': sum(misses for hits, misses, free in stats.values()),
+      'ms_per_frame': elapsed * 1000 / frames,
+      'pools': stats,
+  }
+
+
+def main(argv):
+  frames = int(argv[1]) if len(argv) > 1 else DEFAULT_FRAMES
+  results = {}
+  for pooled in (False, True):
+    results[pooled] = RunScenario(frames, pooled)
+    result = results[pooled]
+    print('{:>8}: spawned={} constructed={} ms_per_frame={:.3f}'.format(
+        'pooled' if pooled else 'unpooled', result['spawned'], result['constructed'],
+        result['ms_per_frame']))
+  for name, (hits, misses, free) in sorted(results[True]['pools'].items()):
+    print('  {}: hits={} misses={} hit_rate={:.1%} free={}'.format(
+        name, hits, misses, hits / float(hits + misses), free))
+  before = results[False]['constructed'] / float(frames)
+  after = results[True]['constructed'] / float(frames)
+  print('sprites constructed per frame: {:.2f} -> {:.2f}'.format(before, after))
+  return 0 if after < before else 1
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
@@ -0,0 +1,187 @@
+"""
+Frame time benchmarks for the game's heaviest rooms.
+
+Each scenario loads a room, drives the hero with input for a number of frames and times every
+frame in four phases: collision (sensing and every collision check), update (input, sprite
+updates and the entity systems), render (drawing the frame) and present (updating the
+display).  The input is either a fixed pseudo-random script, which is the same on every run,
+or a recording made with "python worldtree.py --record FILE", which replaces the scenario's
+room with wherever the recording starts.
+
+For each phase the p50, p95 and p99 frame times are printed and written to a JSON file, so
+runs before and after a change can be compared.  The display is the SDL dummy driver, so
+present only measures pygame's side of it.
+
+Run from the worldtree directory:
+  python -m benchmarks.scenarios [--frames N] [--replay FILE] [--output FILE] [--batch-walkers]
+      [scenario ...]
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import headless
+screen = headless.Init()
+
+import pygame
+
+import controller
+import environment
+import game
+from game_constants import GameOverException
+import profiling
+import replay
+import rng
+import snapshot
+
+# name: (region, room, (col, row) start position, description)
+SCENARIOS = {
+  'start': (1, 'Map1', (2, 10), 'the first room'),
+  'cave': (1, 'Map24', (3, 30), 'a large cave room in region 1'),
+  'spawners': (2, 'Map8', (3, 8), 'a room full of bug pipes'),
+  'wide': (2, 'Map1', (3, 100), 'a wide room with 25 enemies'),
+  'lair': (2, 'Map32', (3, 5), "Baron's lair"),
+}
+PHASES = ('collision', 'update', 'render', 'present', 'total')
+PERCENTILES = (50, 95, 99)
+DEFAULT_FRAMES = 1200
+DEFAULT_OUTPUT = 'scenarios.json'
+# The scripted input picks a new set of held actions this often.
+SCRIPT_PERIOD = 20
+SEED = 1
+
+
+def Percentile(sorted_values, percent):
+  """Returns the nearest-rank percentile of a sorted list."""
+  if not sorted_values:
+    return 0.0
+  rank = max(0, min(len(sorted_values) - 1,
+                    int(round(percent / 100.0 * len(sorted_values) + 0.5)) - 1))
+  return sorted_values[rank]
+
+
+def ScriptedInput(seed=SEED):
+  """Returns an input function that holds random actions, changing every SCRIPT_PERIOD steps."""
+  script = random.Random(seed)
+  state = {'step': 0, 'actions': []}
+  def GetInput():
+    if state['step'] % SCRIPT_PERIOD == 0:
+      state['actions'] = [action for action in controller.ALL_ACTIONS if script.random() < 0.3]
+    state['step'] += 1
+    return list(state['actions'])
+  return GetInput
+
+
+def RunScenario(name, frames, recording=None):
+  """Run one scenario and return its results.
+
+  Args:
+    name: key of the scenario in SCENARIOS.
+    frames: int number of frames to run, at one simulation step per frame.
+    recording: replay.Recording to drive the hero with, or None for the scripted input.
+
+  Returns:
+    Dict of the scenario's description and, for each phase, its frame time percentiles in ms.
+  """
+  region, room, position, description = SCENARIOS[name]
+  profiling.counters.Reset()
+  scenario_game = game.Game(screen, room=room, region=region, position=position)
+  source = controller.input_source
+  if recording is None:
+    rng.Seed(SEED)
+    controller.input_source = ScriptedInput()
+    player = None
+  else:
+    scenario_game.Restore(recording.start)
+    scenario_game.checkpoint = recording.start
+    rng.Seed(recording.seed)
+    player = replay.Player(recording)
+    frames = min(frames, len(recording.steps))
+  if scenario_game.checkpoint is None:
+    # Dying goes back to the start of the scenario.
+    scenario_game.checkpoint = snapshot.Capture(scenario_game)
+  restart = game.RESTART_FROM_CHECKPOINT
+  game.RESTART_FROM_CHECKPOINT = True
+  times = dict((phase, []) for phase in PHASES)
+  try:
+    for _ in range(frames):
+      steps = scenario_game.steps
+      scenario_game.Tick()
+      # Ticks spent paused don't run a simulation step.
+      step = profiling.counters.last_frame if scenario_game.steps > steps else {}
+      start = time.perf_counter()
+      dirty_rects = scenario_game.Render(1.0)
+      rendered = time.perf_counter()
+      scenario_game.Present(dirty_rects)
+      presented = time.perf_counter()
+      times['collision'].append(step.get('collision_ms', 0.0))
+      times['update'].append(step.get('update_ms', 0.0))
+      times['render'].append((rendered - start) * 1000)
+      times['present'].append((presented - rendered) * 1000)
+      times['total'].append(sum(times[phase][-1] for phase in PHASES[:-1]))
+  except GameOverException:
+    pass
+  finally:
+    game.RESTART_FROM_CHECKPOINT = restart
+    if player is not None:
+      player.Stop()
+    else:
+      controller.input_source = source
+  results = {'description': description, 'region': scenario_game.region,
+             'room': scenario_game.room, 'frames': len(times['total'])}
+  for phase in PHASES:
+    values = sorted(times[phase])
+    results[phase] = dict(('p{}'.format(percent), round(Percentile(values, percent), 4))
+                          for percent in PERCENTILES)
+    results[phase]['mean'] = round(sum(values) / len(values), 4) if values else 0.0
+  return results
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Frame time benchmarks for heavy rooms.')
+  parser.add_argument('scenarios', nargs='*', default=sorted(SCENARIOS),
+                      help='scenarios to run: ' + ', '.join(sorted(SCENARIOS)))
+  parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES)
+  parser.add_argument('--replay', metavar='FILE', help='drive the hero with a recording')
+  parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON file to write')
+  parser.add_argument('--batch-walkers', action='store_true',
+                      help='move walking enemies with a walkers.WalkerBatch')
+  args = parser.parse_args(argv[1:])
+  environment.BATCH_WALKERS = args.batch_walkers
+  recording = replay.Recording.Load(args.replay) if args.replay else None
+  report = {
+    'python': platform.python_version(),
+    'pygame': pygame.version.ver,
+    'frames': args.frames,
+    'input': args.replay or 'scripted',
+    'batch_walkers': args.batch_walkers,
+    'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'scenarios': {},
+  }
+  for name in args.scenarios:
+    if name not in SCENARIOS:
+      parser.error('unknown scenario {}'.format(name))
+    results = RunScenario(name, args.frames, recording)
+    report['scenarios'][name] = results
+    print('{} ({} {}, {} frames)'.format(name, results['region'], results['room'],
+                                         results['frames']))
+    for phase in PHASES:
+      print('  {:10} '.format(phase) + '  '.join(
+          'p{}={:.3f}ms'.format(percent, results[phase]['p{}'.format(percent)])
+          for percent in PERCENTILES))
+  with open(args.output, 'w') as output:
+    json.dump(report, output, indent=2, sort_keys=True)
+  print('Wrote ' + args.output)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
@@ -0,0 +1,38 @@
+"""
+Reports how much memory the game's surfaces take once every room has been loaded.
+
+Loads each room in turn with the hero in it, as walking through the whole game would, then
+prints the surfacememory report: the surfaces by owner, and the tile and class images each
+room uses.  Exits with an error if the surfaces are over surfacememory.BUDGET_BYTES.
+
+Run from the worldtree directory:
+  python -m benchmarks.surface_memory
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import sys
+
+import headless
+
+import environment
+import game
+import surfacememory
+
+
+def main(argv):
+  screen = headless.Init()
+  surfacememory.CHECK_ON_ROOM_CHANGE = False
+  loaded = game.Game(screen)
+  for region in sorted(environment.REGIONS):
+    for room in sorted(environment.REGIONS[region]):
+      loaded.ChangeRooms(room, region, (2, 2), (0, 0))
+  within_budget = surfacememory.registry.Check(loaded)
+  sys.stdout.write(surfacememory.registry.Report())
+  return 0 if within_budget else 1
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
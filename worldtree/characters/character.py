@@ -8,14 +8,19 @@ Created on Jun 11, 2012
 
 import glob
 import os
-import random
 import time
+import weakref
 
 import pygame
 
 from . import animation
+import audio
 import game_constants
 from . import powerup
+import pooling
+import profiling
+import rng
+import walkers
 
 # Enum of possible character action states.
 STAND = 1
@@ -29,6 +34,57 @@ RIGHT = game_constants.RIGHT
 ATTACK = game_constants.ATTACK
 PATH = os.path.join('media', 'sprites')
 
+# If True, character and item collisions are tested with a rect test on the whole sprite
+# followed by a pixel-perfect test of the sprites' masks, instead of the hitbox test.
+PRECISE_COLLISIONS = False
+
+# Masks for sprite images, built the first time an image is used in a precise collision.
+# Keyed weakly so flipped per-instance copies of images don't leak after the sprite is gone.
+_MASKS = weakref.WeakKeyDictionary()
+
+
+class BoxCache(object):
+  """Remembers a box built from a sprite's rect, so it's only rebuilt when the rect changes.
+
+  A box like the Map hitbox depends on the sprite's rect, the scroll position and sometimes
+  one more value such as the direction the sprite faces.  Check() compares those with what
+  they were when the box was last built, without building anything to compare, so a box that
+  hasn't changed costs nothing to ask for again.
+
+  Attributes:
+    box: the last box built, or None.
+    rect: pygame.Rect copy of the sprite's rect when the box was built.
+    offset_x, offset_y: int scroll offset when the box was built.
+    state: the extra value the box was built with.
+  """
+
+  __slots__ = ('box', 'rect', 'offset_x', 'offset_y', 'state')
+
+  def __init__(self):
+    self.box = None
+    self.rect = pygame.Rect(0, 0, 0, 0)
+    self.offset_x = 0
+    self.offset_y = 0
+    self.state = None
+
+  def Check(self, rect, offset, state=None):
+    """Returns whether box is still right for a rect, scroll offset and extra state.
+
+    If it isn't, the new values are remembered, and the caller must set box to a new box.
+    """
+    if (self.box is not None and rect == self.rect and offset[0] == self.offset_x
+        and offset[1] == self.offset_y and state == self.state):
+      if profiling.COUNT_HITBOXES:
+        profiling.counters.Increment('hitbox_saved')
+      return True
+    self.rect.update(rect)
+    self.offset_x = offset[0]
+    self.offset_y = offset[1]
+    self.state = state
+    if profiling.COUNT_HITBOXES:
+      profiling.counters.Increment('hitbox_built')
+    return False
+
 class Character(pygame.sprite.Sprite):
   """Characters include the PC, NPCs, and enemies.
   
@@ -70,9 +126,30 @@ class Character(pygame.sprite.Sprite):
   IS_PLAYER = False
   ITEM_DROPS = [powerup.HealthRestore, powerup.AmmoRestore]
   DROP_PROBABILITY = 20
-
-  HIT_SOUND = pygame.mixer.Sound(os.path.join('media', 'sfx', 'hit.wav'))
-  DEATH_SOUND = pygame.mixer.Sound(os.path.join('media', 'sfx', 'death.wav'))
+  # Distance in pixels within which Sense() is called each frame.  0 means never, and
+  # float('inf') means always.
+  SENSE_RADIUS = 0
+  # True for enemies that walk back and forth on platforms, which can be simulated together
+  # by a walkers.WalkerBatch.  Such characters must implement WalkerMode().
+  WALKER = False
+  # True for enemies that must update every frame however far they are from the camera.
+  # Otherwise, distant enemies are updated less often or not at all - see
+  # environment.SIMULATION_LOD.
+  ALWAYS_AWAKE = False
+  # The entities.EntityStore holding this character's components, and its slot there.  Set
+  # by EntityStore.Add() - while they're set, hp and invulnerable live in the store.
+  entity_store = None
+  entity_slot = None
+  # Set by Environment.AddSpawnedEnemy() for enemies that should be removed once they're well
+  # off screen.
+  despawns = False
+  # Attributes snapshot.Capture() records on top of position, direction, hp, invulnerability
+  # and movement - AI timers and the like.  Each holds an int, a bool, a list of ints or an
+  # animation.Animation.  Subclasses extend it with their own.
+  SNAPSHOT_STATE = ('action', 'vertical', 'jump_duration')
+
+  HIT_SOUND = audio.Sound(os.path.join('media', 'sfx', 'hit.wav'))
+  DEATH_SOUND = audio.Sound(os.path.join('media', 'sfx', 'death.wav'))
 
   def __init__(self, environment, position=(0, 0)):
     """Constructor.
@@ -84,6 +161,7 @@ class Character(pygame.sprite.Sprite):
     """
     pygame.sprite.Sprite.__init__(self)
     self.env = environment
+    self._hitbox_cache = BoxCache()
     self.action, self.direction = self.DEFAULT_STATE
     map_rect = self.env.RectForTile(*position)
     screen_coordinates = self.env.ScreenCoordinateForMapPoint(map_rect.left, map_rect.bottom)
@@ -98,24 +176,79 @@ class Character(pygame.sprite.Sprite):
     self.hp = self.STARTING_HP
     self.invulnerable = 0
     self.solid = True
+    # Index into self.env.walkers if this character is being moved by a WalkerBatch.
+    self.walker_slot = None
     self.InitImage()
 
   @property
   def state(self):
     return (self.action, self.direction)
 
+  @property
+  def hp(self):
+    if self.entity_store is None:
+      return self._hp
+    return self.entity_store.hp[self.entity_slot]
+
+  @hp.setter
+  def hp(self, value):
+    if self.entity_store is None:
+      self._hp = value
+    else:
+      self.entity_store.hp[self.entity_slot] = value
+
+  @property
+  def invulnerable(self):
+    if self.entity_store is None:
+      return self._invulnerable
+    return self.entity_store.invulnerable[self.entity_slot]
+
+  @invulnerable.setter
+  def invulnerable(self, value):
+    if self.entity_store is None:
+      self._invulnerable = value
+    else:
+      self.entity_store.invulnerable[self.entity_slot] = value
+
   def InitImage(self):
     raise NotImplementedError('Each subclass of Character must implement InitImage.')
 
   def Hitbox(self):
     """Gets the Map hitbox for the sprite, which is relative to the map rather than the screen.
     
+    The box is only rebuilt when the sprite's rect, the scroll position or HitboxState()
+    changes, so callers can ask for it as often as they like in a frame.  The returned Rect is
+    shared, so it must not be modified in place.
+    """
+    cache = self._hitbox_cache
+    if not cache.Check(self.rect, self.env.screen_offset, self.HitboxState()):
+      cache.box = self.ComputeHitbox()
+    return cache.box
+
+  def HitboxState(self):
+    """Returns anything besides the rect and scroll position that ComputeHitbox() depends on.
+
+    Override this along with ComputeHitbox() if the hitbox depends on more than the direction.
+    """
+    return self.direction
+
+  def ComputeHitbox(self):
+    """Builds a new Map hitbox for the sprite.  Override this rather than Hitbox().
+
     The Hitbox needs to be smaller than the sprite, partly because of weird PyGame behavior
     where a rect of width X and height y actually touches (x+1) * (y+1) pixels.
     """
     x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
-    # TODO: Make these offsets constants so they can be configured per-class?
-    return pygame.Rect(x + 1, y + 1, self.rect.width - 2, self.rect.height - 2)
+    left, top, width, height = self.HitboxOffsets(self.direction)
+    return pygame.Rect(x + left, y + top, width, height)
+
+  def HitboxOffsets(self, direction):
+    """Returns (left, top, width, height) of the hitbox relative to the sprite's rect.
+
+    Used by the default ComputeHitbox(), and by walkers.WalkerBatch which needs to know the
+    hitbox for either direction up front.
+    """
+    return (1, 1, self.rect.width - 2, self.rect.height - 2)
   
   def Fallbox(self):
     """Hitbox for the purpose of calculating falls rather than hits.
@@ -124,19 +257,23 @@ class Character(pygame.sprite.Sprite):
     """
     return self.Hitbox()
 
-  def SenseAndReturnHitbox(self, player):
-    """Allows the character to be aware of the player's position, and then returns hitbox.
+  def Sense(self, player, distance_sq):
+    """Called by Environment.SenseEnemies() when the player is within SENSE_RADIUS.
     
-    Must override if you want the enemy to actually do anything with that knowledge.
+    Args:
+      player: the Hero.
+      distance_sq: squared distance in pixels between the centers of the two hitboxes.
     """
-    return self.Hitbox()
 
   def SetCurrentImage(self):
     """Set self.image to the appropriate value.  Should be overriden for classes with animation."""
     self.image = self.IMAGE
 
   def FlickerIfInvulnerable(self):
-    """Make the character flicker if they are currently invulnerable."""
+    """Make the character flicker if they are currently invulnerable.
+
+    Only needed for characters that aren't in an entities.EntityStore.
+    """
     if self.invulnerable > 0 and self.invulnerable % 4 > 0:
       self.image.set_alpha(128)
     else:
@@ -178,11 +315,33 @@ class Character(pygame.sprite.Sprite):
     Must be implemented by any subclass that doesn't also override update().
     """
     raise NotImplementedError()
+
+  def WalkerMode(self):
+    """Replaces GetMove() for a character that's being moved by a walkers.WalkerBatch.
+
+    Advances any per-frame movement logic and returns walkers.WALK or walkers.REST.
+    """
+    return walkers.WALK
+
+  def WalkerMoved(self, walked):
+    """Called by a walkers.WalkerBatch once it has moved the character for the frame.
+
+    Does what update() does after a move for characters that aren't batched.
+
+    Args:
+      walked: bool, whether the character walked this frame rather than resting.
+    """
+    if walked and self.action != JUMP:
+      self.action = WALK
+    self.SetCurrentImage()
+    self.last_state = self.state
   
   def GetDistance(self, other):
     """Calculate the distance between this and another character."""
-    return ((self.Hitbox().centerx - other.Hitbox().centerx) ** 2
-            + (self.Hitbox().centery - other.Hitbox().centery) ** 2) ** 0.5
+    hitbox = self.Hitbox()
+    other_hitbox = other.Hitbox()
+    return ((hitbox.centerx - other_hitbox.centerx) ** 2
+            + (hitbox.centery - other_hitbox.centery) ** 2) ** 0.5
   
   def TakeHit(self, damage):
     """Take a hit for a given amount of damage."""
@@ -197,21 +356,32 @@ class Character(pygame.sprite.Sprite):
     """This character dies."""
     self.DEATH_SOUND.play()
     if len(self.ITEM_DROPS) > 0:
-      if random.randint(0, 100) < self.DROP_PROBABILITY:
+      if rng.randint(0, 100) < self.DROP_PROBABILITY:
         position = self.env.TileIndexForPoint(
             *self.env.MapCoordinateForScreenPoint(self.rect.centerx, self.rect.centery))
-        drop = random.choice(self.ITEM_DROPS)(self.env, position)
+        drop = rng.choice(self.ITEM_DROPS).Spawn(self.env, position)
         self.env.item_group.add(drop)
-    self.env.dying_animation_group.add(Dying(self.rect))
+    self.env.dying_animation_group.add(Dying.Spawn(self.rect))
     self.kill()
   
-  def CollisionPushback(self, other):
-    """Calculate and apply a movement vector for being hit by another character."""
-    pushback_x = self.rect.centerx - other.rect.centerx
-    pushback_y = self.rect.centery - other.rect.centery
+  def CollisionPushback(self, other, rect=None):
+    """Calculate and apply a movement vector for being hit by another character.
+
+    Args:
+      other: the character or hazard doing the pushing, which defines PUSHBACK.
+      rect: screen Rect to be pushed away from, if not other.rect.
+    """
+    if rect is None:
+      rect = other.rect
+    pushback_x = self.rect.centerx - rect.centerx
+    pushback_y = self.rect.centery - rect.centery
     pushback_scalar = other.PUSHBACK / (float(pushback_x ** 2 + pushback_y ** 2) ** 0.5)
-    self.movement[0] += int(pushback_x * pushback_scalar)
-    self.movement[1] += int(pushback_y * pushback_scalar)
+    push_x = int(pushback_x * pushback_scalar)
+    push_y = int(pushback_y * pushback_scalar)
+    self.movement[0] += push_x
+    self.movement[1] += push_y
+    if self.walker_slot is not None:
+      self.env.walkers.Push(self.walker_slot, push_x, push_y)
 
   def RaiseMaxHp(self, amount):
     """Raises the character's max HP and also recovers their current HP by the same amount."""
@@ -222,18 +392,61 @@ class Character(pygame.sprite.Sprite):
     """Heals a specific amount of HP."""
     self.hp = min(self.max_hp, self.hp + amount)
 
+  def SnapshotState(self):
+    """Returns the SNAPSHOT_STATE attributes flattened into a list of ints."""
+    values = []
+    for name in self.SNAPSHOT_STATE:
+      value = getattr(self, name)
+      if isinstance(value, animation.Animation):
+        values.extend((value.current, value.framecount))
+      elif isinstance(value, list):
+        values.extend(value)
+      else:
+        values.append(int(value))
+    return values
+
+  def RestoreSnapshotState(self, values):
+    """Sets the SNAPSHOT_STATE attributes from a list returned by SnapshotState()."""
+    values = iter(values)
+    for name in self.SNAPSHOT_STATE:
+      value = getattr(self, name)
+      if isinstance(value, animation.Animation):
+        value.current = next(values)
+        value.framecount = next(values)
+      elif isinstance(value, list):
+        # In place, since some characters keep other references to their lists.
+        value[:] = [next(values) for _ in value]
+      elif isinstance(value, bool):
+        setattr(self, name, bool(next(values)))
+      else:
+        setattr(self, name, next(values))
+
   def WalkBackAndForth(self):
-    """Get movement for walking back and forth on the current platform occupied."""
+    """Get movement for walking back and forth on the current platform occupied.
+    
+    While on the ground this just compares against the ends of the platform from the
+    Environment's patrol spans.  In the air it has to check the move against the tiles.
+    """
+    hitbox = self.Hitbox()
+    limits = None
+    if self.movement[1] == 0:
+      limits = self.env.PatrolLimits(hitbox.left, hitbox.top, hitbox.right, hitbox.bottom)
     if self.direction == LEFT:
       self.Walk(LEFT)
-      dest_tile = self.env.TileIndexForPoint(
-          self.Hitbox().left + self.movement[0], self.Hitbox().bottom)
+      lead_x = hitbox.left + self.movement[0]
+      if limits is not None:
+        turn = lead_x < limits[0]
     elif self.direction == RIGHT:
       self.Walk(RIGHT)
-      dest_tile = self.env.TileIndexForPoint(
-          self.Hitbox().right + self.movement[0], self.Hitbox().bottom)
+      lead_x = hitbox.right + self.movement[0]
+      if limits is not None:
+        turn = lead_x >= limits[1]
+    if limits is None:
+      dest_tile = self.env.TileIndexForPoint(lead_x, hitbox.bottom)
+      turn = (not self.env.IsMoveLegal(self, self.movement)
+              or not self.env.IsTileSupported(*dest_tile))
       
-    if not self.env.IsMoveLegal(self, self.movement) or not self.env.IsTileSupported(*dest_tile):
+    if turn:
       if self.direction == LEFT:
         self.Walk(RIGHT)
       else:
@@ -241,16 +454,20 @@ class Character(pygame.sprite.Sprite):
     return self.movement
 
   def update(self):
+    if self.walker_slot is not None:
+      # Environment.AdvanceWalkers() moves every batched walker after the enemies update, and
+      # then calls WalkerMoved().
+      self.env.walkers.SetMode(self.walker_slot, self.WalkerMode(), self.SPEED)
+      return
     new_rect = self.env.AttemptMove(self, self.GetMove())
     self.rect = new_rect
     if self.env.IsRectSupported(self.Fallbox()):
       self.Supported()
     else:
       self.Gravity()
+    # Invulnerability and flickering are handled for every enemy at once by the
+    # Environment's entity systems.
     self.SetCurrentImage()
-    self.FlickerIfInvulnerable()
-    if self.invulnerable > 0:
-      self.invulnerable -= 1
     self.last_state = self.state
     if self.env.IsOutsideMap(self.Hitbox()):
       self.kill()
@@ -292,43 +509,93 @@ def LoadImages(fileglob, scaled=False, colorkey=None):
       images.append(image.convert_alpha())
   return images
 
+def MaskForImage(image):
+  """Return the cached pygame.mask.Mask for a sprite image, building it if needed."""
+  mask = _MASKS.get(image)
+  if mask is None:
+    mask = pygame.mask.from_surface(image)
+    _MASKS[image] = mask
+    profiling.counters.Increment('masks_built')
+  return mask
+
+
+def MasksOverlap(sprite, other):
+  """Return True if the opaque pixels of two sprites' current images overlap.
+
+  This is the narrow phase of a precise collision, and should only be called once a cheaper
+  rectangle test has passed.  Records mask_checks, mask_hits and mask_ms frame counters.
+  """
+  start = time.perf_counter()
+  offset = (other.rect.left - sprite.rect.left, other.rect.top - sprite.rect.top)
+  hit = MaskForImage(sprite.image).overlap(MaskForImage(other.image), offset) is not None
+  profiling.counters.Increment('mask_checks')
+  if hit:
+    profiling.counters.Increment('mask_hits')
+  profiling.counters.Increment('mask_ms', (time.perf_counter() - start) * 1000)
+  return hit
+
+
 def CollideCharacters(player, enemy):
   """Return True if two characters collide, otherwise false.
   
-  This may produce side effects - it's the easiest way to let enemies know where the player
-  is, since it's called once per frame.
+  Enemies learn where the player is in Environment.SenseEnemies(), not here.
   """
-  return player.Hitbox().colliderect(enemy.SenseAndReturnHitbox(player))
+  if PRECISE_COLLISIONS:
+    # The full sprite rects are the broad phase here, since the masks make the hand-tuned
+    # hitbox offsets of classes like Hero, Batzor and Slug unnecessary.
+    return player.rect.colliderect(enemy.rect) and MasksOverlap(player, enemy)
+  return player.Hitbox().colliderect(enemy.Hitbox())
 
 
-class Dying(pygame.sprite.Sprite):
-  """Not actually a character, just a dying animation left behind by one."""
+class Dying(pooling.PooledSprite):
+  """Not actually a character, just a dying animation left behind by one.
+
+  Create these with Dying.Spawn() so they're recycled.
+  """
 
   IMAGES = None
   
-  def __init__(self, rect, player=False, boss=False, sound=None):
+  def __init__(self, rect, player=False, boss=False, sound=None, images=None):
     """Constructor.
     
     Args:
       rect: The rect of the enemy that is dying.
+      player: True if this is the player dying, which ends the game.
+      boss: True if this is the boss dying, which wins the game.
+      sound: audio.Sound to play for the player or boss.
+      images: list of images to animate instead of the standard explosion.
     """
     pygame.sprite.Sprite.__init__(self)
     self.InitImage()
+    self.Reset(rect, player, boss, sound, images)
+
+  def Reset(self, rect, player=False, boss=False, sound=None, images=None):
+    self.animation.images = Dying.IMAGES
+    self.animation.Reset()
+    self.SetCurrentImage()
     self.rect = pygame.Rect((0, 0), self.image.get_size())
     self.rect.centerx, self.rect.centery = rect.centerx, rect.centery
+    if images is not None:
+      self.animation.images = images
+      self.animation.Reset()
     self.death_frames = 20
     self.player = player
     self.boss = boss
+    self.channel = None
     if player or boss:
-      pygame.mixer.music.fadeout(500)
+      audio.music.fadeout(500)
       self.channel = sound.play()
-  
-  def InitImage(self):
+
+  @classmethod
+  def LoadFrames(cls):
+    """Load the standard explosion images if needed, and return them."""
     if Dying.IMAGES is None:
       Dying.IMAGES = LoadImages('regularexplode1*.png', scaled=True,
                                 colorkey=game_constants.SPRITE_COLORKEY)
-    self.animation = animation.Animation(Dying.IMAGES, looping=False, framedelay=3)
-    self.SetCurrentImage()
+    return Dying.IMAGES
+  
+  def InitImage(self):
+    self.animation = animation.Animation(self.LoadFrames(), looping=False, framedelay=3)
 
   def Hitbox(self):
     return pygame.Rect((0, 0), (0, 0))
@@ -340,14 +607,10 @@ class Dying(pygame.sprite.Sprite):
     self.SetCurrentImage()
     if self.death_frames == 0:
       self.kill()
+      # The main loop waits for the sound to finish before ending the game.
       if self.player:
-        while self.channel.get_busy():
-          time.sleep(0.1)
-        raise game_constants.GameOverException()
+        raise game_constants.GameOverException(self.channel)
       elif self.boss:
-        'boss dying!'
-        while self.channel.get_busy():
-          time.sleep(0.1)
-        raise game_constants.GameWonException()
+        raise game_constants.GameWonException(self.channel)
     else:
       self.death_frames -= 1
\ No newline at end of file
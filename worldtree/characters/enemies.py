@@ -7,17 +7,20 @@ Created on Jun 11, 2012
 """
 
 import os
-import random
 
 import pygame
 
 from . import animation
+import audio
 from . import character
 from controller import LEFT
 from controller import RIGHT
 import game_constants
+import profiling
+import rng
 from . import powerup
 from . import projectile
+import walkers
 
 class Beaver(character.Character):
   """Class for the notorious primary foe, the Beaver."""
@@ -31,6 +34,9 @@ class Beaver(character.Character):
   DROP_PROBABILITY = 20
   WIDTH = 96
   HEIGHT = 60
+  WALKER = True
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'walk_left_animation', 'walk_right_animation')
 
   def GetMove(self):
     """Get the movement vector for the Beaver."""
@@ -64,6 +70,8 @@ class Dragonfly(character.Character):
   VARIABLE_REST = 20  # Random amount in this interval
   HORIZONTAL_MOVE_TIME = 15
   VERTICAL_MOVE_TIME = 9
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'move_frames', 'rest_frames', 'vector', 'fly_left_animation', 'fly_right_animation')
   FLY_LEFT_IMAGES = None
   
   def __init__(self, environment, position):
@@ -95,7 +103,7 @@ class Dragonfly(character.Character):
       self.movement = [i * self.SPEED for i in self.vector]
       self.move_frames -= 1
       if self.move_frames == 0:
-        self.rest_frames = self.REST_TIME + random.randint(0, self.VARIABLE_REST)
+        self.rest_frames = self.REST_TIME + rng.randint(0, self.VARIABLE_REST)
     else:
       self.movement = [0, 0]
       self.rest_frames -= 1
@@ -113,9 +121,6 @@ class Dragonfly(character.Character):
     new_rect = self.env.AttemptMove(self, self.GetMove())
     self.rect = new_rect
     self.SetCurrentImage()
-    self.FlickerIfInvulnerable()
-    if self.invulnerable > 0:
-      self.invulnerable -= 1
 
 class BoomBug(character.Character):
   """Enemy that explodes when the player comes near enough."""
@@ -125,16 +130,21 @@ class BoomBug(character.Character):
   STARTING_MOVEMENT = [-SPEED, 0]
   DAMAGE = 1
   TRIGGER_RADIUS = 160
+  SENSE_RADIUS = TRIGGER_RADIUS
   EXPLODING_DAMAGE = 10
   EXPLODING_PUSHBACK = 48
   EXPLODING_DELAY = 90
   EXPLODING_FRAMES = 40
+  WALKER = True
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'triggered', 'exploding', 'walk_left_animation', 'walk_right_animation',
+      'triggered_left_animation', 'triggered_right_animation', 'exploding_animation')
   WALKING_LEFT_IMAGES = None
   TRIGGERED_IMAGES = None
   EXPLODING_IMAGES = None
   
-  DEATH_SOUND = pygame.mixer.Sound(os.path.join('media', 'sfx', 'silence.wav'))
-  EXPLOSION_SOUND = pygame.mixer.Sound(os.path.join('media', 'sfx', 'explode.wav'))
+  DEATH_SOUND = audio.Sound(os.path.join('media', 'sfx', 'silence.wav'))
+  EXPLOSION_SOUND = audio.Sound(os.path.join('media', 'sfx', 'explode.wav'))
 
   def __init__(self, environment, position):
     self.triggered = 0
@@ -184,14 +194,10 @@ class BoomBug(character.Character):
 #    else:
       
 
-  def SenseAndReturnHitbox(self, player):
+  def Sense(self, player, distance_sq):
     """Trigger an explosion if the player is close to the bug."""
-    # TODO: See if this is too slow.
     if not (self.exploding or self.triggered):
-      distance = self.GetDistance(player)
-      if distance < self.TRIGGER_RADIUS:
-        self.Trigger()
-    return self.Hitbox()
+      self.Trigger()
 
   def GetMove(self):
     return self.WalkBackAndForth()
@@ -199,6 +205,8 @@ class BoomBug(character.Character):
   def Trigger(self):
     self.triggered = self.EXPLODING_DELAY
     self.movement = [0, 0]
+    if self.walker_slot is not None:
+      self.env.walkers.SetMode(self.walker_slot, walkers.FROZEN)
 
   def Explode(self):
     # TODO: Increase the effective size to the explosion radius.
@@ -211,6 +219,18 @@ class BoomBug(character.Character):
     self.DAMAGE = self.EXPLODING_DAMAGE
     self.PUSHBACK = self.EXPLODING_PUSHBACK
 
+  def RestoreSnapshotState(self, values):
+    character.Character.RestoreSnapshotState(self, values)
+    if self.exploding > 0:
+      # As Explode() left it, but without the sound or restarting the animation.
+      topleft = self.rect.topleft
+      self.rect.width, self.rect.height = self.EXPLODING_IMAGES[0].get_size()
+      self.rect.topleft = topleft
+      self.DAMAGE = self.EXPLODING_DAMAGE
+      self.PUSHBACK = self.EXPLODING_PUSHBACK
+    if (self.triggered or self.exploding) and self.walker_slot is not None:
+      self.env.walkers.SetMode(self.walker_slot, walkers.FROZEN)
+
   def update(self):
     if self.triggered > 0:
       self.triggered -= 1
@@ -221,6 +241,9 @@ class BoomBug(character.Character):
       if self.exploding == 0:
         self.env.dirty = True
         self.Die()
+    elif self.walker_slot is not None:
+      # WalkerMoved() sets the image once Environment.AdvanceWalkers() has moved it.
+      return
     else:
       new_rect = self.env.AttemptMove(self, self.GetMove())
       self.rect = new_rect
@@ -229,9 +252,6 @@ class BoomBug(character.Character):
       else:
         self.Gravity()
     self.SetCurrentImage()
-    if self.invulnerable > 0:
-      self.invulnerable -= 1
-    self.FlickerIfInvulnerable()
     self.last_state = self.state
 
 
@@ -246,6 +266,8 @@ class Shooter(character.Character):
   DAMAGE = 1
   SENSE_RADIUS = 480
   SHOOTING_COOLDOWN = 90
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'shooting_cooldown', 'aim', 'shoot_animation')
   IMAGES = None
 
   def __init__(self, environment, position):
@@ -268,21 +290,21 @@ class Shooter(character.Character):
     else:
       self.image = self.shoot_animation.NextFrame()
 
-  def SenseAndReturnHitbox(self, player):
-    """Trigger an explosion if the player is close to the bug."""
-    if ((self.rect.centerx - player.rect.centerx) ** 2 
-        + (self.rect.centery - player.rect.centerx) ** 2) ** 0.5 < self.SENSE_RADIUS:
-      self.aim = [player.rect.centerx - self.rect.centerx, player.rect.centery - self.rect.centery]
-    else:
-      self.aim = [0, -1]
-    return self.Hitbox()
+  def Sense(self, player, distance_sq):
+    """Aim at the player while he is within SENSE_RADIUS and not hidden behind a wall."""
+    hitbox = self.Hitbox()
+    player_box = player.Hitbox()
+    if (player_box.center != hitbox.center
+        and self.env.HasLineOfSight(hitbox.center, player_box.center)):
+      self.aim = [player_box.centerx - hitbox.centerx, player_box.centery - hitbox.centery]
 
   def GetMove(self):
     return self.movement
 
   def Shoot(self):
     self.shooting_cooldown = self.SHOOTING_COOLDOWN
-    bullet = projectile.SporeCloud(self.env, self.aim, (self.rect.left, self.rect.centery))
+    bullet = projectile.SporeCloud.Spawn(self.env, self.aim,
+                                         (self.rect.left, self.rect.centery))
     self.env.enemy_projectile_group.add(bullet)
 
   def update(self):
@@ -292,10 +314,9 @@ class Shooter(character.Character):
       self.Shoot()
       self.shoot_animation.Reset()
     self.SetCurrentImage()
-    if self.invulnerable > 0:
-      self.invulnerable -= 1
-    self.FlickerIfInvulnerable()
     self.last_state = self.state
+    # Sense() re-aims each frame the player is in range, otherwise go back to shooting up.
+    self.aim = [0, -1]
 
 
 class PipeBug(character.Character):
@@ -307,6 +328,9 @@ class PipeBug(character.Character):
   SPEED = 8
   GRAVITY = 0
   DAMAGE = 1
+  SENSE_RADIUS = float('inf')
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'turned', 'left_animation', 'right_animation')
   IMAGES = None
 
   def __init__(self, environment, position):
@@ -329,8 +353,8 @@ class PipeBug(character.Character):
     else:
       self.image = self.left_animation.NextFrame()
 
-  def SenseAndReturnHitbox(self, player):
-    """Trigger an explosion if the player is close to the bug."""
+  def Sense(self, player, distance_sq):
+    """Turn toward the player once the bug has flown up level with him."""
     if not self.turned and self.rect.top < player.rect.top:
       self.turned = True
       if self.rect.centerx < player.rect.centerx:
@@ -338,8 +362,6 @@ class PipeBug(character.Character):
       else:
         self.movement = [-self.SPEED, 0]
 
-    return self.Hitbox()
-
   def GetMove(self):
     return self.movement
 
@@ -357,9 +379,6 @@ class PipeBug(character.Character):
     else:
       self.rect = self.rect.move(self.GetMove())
       self.SetCurrentImage()
-      self.FlickerIfInvulnerable()
-      if self.invulnerable > 0:
-        self.invulnerable -= 1
   
 
 class BugPipe(character.Character):
@@ -374,12 +393,23 @@ class BugPipe(character.Character):
   IMAGE = None
   IMAGE_FILE = 'transparent.png'
   SPAWNING_COOLDOWN = 120
+  # The pipe's hitbox is empty, so it can't be placed relative to the camera.  It checks
+  # whether it's on screen itself instead.
+  ALWAYS_AWAKE = True
+  # Most of this pipe's bugs that can be alive at once.  The room has its own budget too.
+  SPAWN_BUDGET = 4
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + ('spawning_cooldown',)
   
   def __init__(self, environment, position):
     character.Character.__init__(self, environment, position)
     self.spawning_cooldown = self.SPAWNING_COOLDOWN
     self.movement = [0, 0]
     self.invulnerable = 2**31
+    self.bugs = []
+
+  @property
+  def bug_class(self):
+    return PipeBug
 
   def InitImage(self):
     if BugPipe.IMAGE is None:
@@ -387,27 +417,35 @@ class BugPipe(character.Character):
                                           colorkey=game_constants.SPRITE_COLORKEY)
     self.image = self.IMAGE
 
-  def Hitbox(self):
+  def ComputeHitbox(self):
     """Can't be hit."""
     return pygame.Rect(0, 0, 0, 0)
 
   def GetMove(self):
     return self.movement
 
+  def CanSpawn(self):
+    """Return True if neither this pipe nor the room has used up its spawn budget."""
+    self.bugs = [bug for bug in self.bugs if bug.alive()]
+    return len(self.bugs) < self.SPAWN_BUDGET and self.env.CanSpawn()
+
   def SpawnBug(self):
-    print('spawning a bug!')
     self.spawning_cooldown = self.SPAWNING_COOLDOWN
     map_coordinate = self.env.MapCoordinateForScreenPoint(self.rect.centerx, self.rect.top-1)
-    new_bug = PipeBug(self.env, self.env.TileIndexForPoint(*map_coordinate))
-    self.env.enemy_group.add(new_bug)
+    new_bug = self.bug_class(self.env, self.env.TileIndexForPoint(*map_coordinate))
+    self.bugs.append(new_bug)
+    self.env.AddSpawnedEnemy(new_bug)
 
   def update(self):
     if not self.env.IsScreenCoordinateVisible(*self.rect.midtop):
       return
     if self.spawning_cooldown > 0:
       self.spawning_cooldown -= 1
-    else:
+    elif self.CanSpawn():
       self.SpawnBug()
+    else:
+      # Wait until one of the bugs is gone.
+      profiling.counters.Increment('spawns_blocked')
 
 
 class Biter(PipeBug):
@@ -430,12 +468,10 @@ class Biter(PipeBug):
 
 class BiterPipe(BugPipe):
   """Enemy that spawns a stream of Biters."""
-  
-  def SpawnBug(self):
-    self.spawning_cooldown = self.SPAWNING_COOLDOWN
-    map_coordinate = self.env.MapCoordinateForScreenPoint(self.rect.centerx, self.rect.top-1)
-    new_bug = Biter(self.env, self.env.TileIndexForPoint(*map_coordinate))
-    self.env.enemy_group.add(new_bug)
+
+  @property
+  def bug_class(self):
+    return Biter
 
 
 class Batzor(character.Character):
@@ -449,6 +485,8 @@ class Batzor(character.Character):
   REST_TIME = 20
   VARIABLE_REST = 120  # Random amount in this interval
   MOVE_TIME = 40
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'move_frames', 'rest_frames', 'vector', 'animation')
   IMAGES = None
   
   def __init__(self, environment, position):
@@ -466,9 +504,8 @@ class Batzor(character.Character):
     self.animation = animation.Animation(Batzor.IMAGES)
     self.SetCurrentImage()
 
-  def Hitbox(self):
-    x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
-    return pygame.Rect(x + 1, y + 1, self.rect.width - 2, self.rect.height - 24)
+  def HitboxOffsets(self, direction):
+    return (1, 1, self.rect.width - 2, self.rect.height - 24)
 
   def SetCurrentImage(self):
     self.image = self.animation.NextFrame()
@@ -479,7 +516,7 @@ class Batzor(character.Character):
       self.movement = [i * self.SPEED for i in self.vector]
       self.move_frames -= 1
       if self.move_frames == 0:
-        self.rest_frames = self.REST_TIME + random.randint(0, self.VARIABLE_REST)
+        self.rest_frames = self.REST_TIME + rng.randint(0, self.VARIABLE_REST)
     else:
       self.movement = [0, 0]
       self.rest_frames -= 1
@@ -494,9 +531,6 @@ class Batzor(character.Character):
     new_rect = self.env.AttemptMove(self, self.GetMove())
     self.rect = new_rect
     self.SetCurrentImage()
-    self.FlickerIfInvulnerable()
-    if self.invulnerable > 0:
-      self.invulnerable -= 1
 
 
 class Slug(character.Character):
@@ -516,6 +550,10 @@ class Slug(character.Character):
   REST_TIME = 60
   VARIABLE_REST = 60
   MOVE_TIME = 48
+  WALKER = True
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'move_frames', 'rest_frames', 'walk_left_animation', 'walk_right_animation',
+      'idle_left_animation', 'idle_right_animation')
   
   def __init__(self, environment, position):
 #    self.surface_vector = None
@@ -570,32 +608,42 @@ class Slug(character.Character):
     return None
     '''
 
+  def AdvanceWalkCycle(self):
+    """Count down the current move or rest period.  Returns True if the slug moves this frame."""
+    if self.move_frames > 0:
+      self.move_frames -= 1
+      if self.move_frames == 0:
+        self.rest_frames = self.REST_TIME + rng.randint(0, self.VARIABLE_REST)
+      return True
+    self.rest_frames -= 1
+    if self.rest_frames == 0:
+      self.move_frames = self.MOVE_TIME
+      return True
+    return False
+
   def GetMove(self):
     """Inch along the wall."""
 #    if self.surface_vector is None:
 #      self.surface_vector = self.FindSurface()
 #      if self.surface_vector is None:
 #        self.movement = [0, 8]
-    if self.move_frames > 0:
-      self.move_frames -= 1
-      if self.move_frames == 0:
-        self.rest_frames = self.REST_TIME + random.randint(0, self.VARIABLE_REST)
-      self.movement = self.WalkBackAndForth()
-#      self.movement = self.WalkBackAndForthAndAround()
-    else:
+    if self.move_frames <= 0:
       # TODO: make gravity work if not supported
       self.movement[0] = 0
-      self.rest_frames -= 1
-      if self.rest_frames == 0:
-        self.move_frames = self.MOVE_TIME
-        self.movement = self.WalkBackAndForth()
-#        self.movement = self.WalkBackAndForthAndAround()
+    if self.AdvanceWalkCycle():
+      self.movement = self.WalkBackAndForth()
+#      self.movement = self.WalkBackAndForthAndAround()
 
     return self.movement
 
-  def Hitbox(self):
+  def WalkerMode(self):
+    if self.AdvanceWalkCycle():
+      return walkers.WALK
+    return walkers.REST
+
+  def HitboxOffsets(self, direction):
     """Return one-tile large rect of the leading edge of the slug."""
-    if self.direction == LEFT:
+    if direction == LEFT:
 #      if self.surface_vector in ((1, 0), (0, 1)):
 #        x, y = self.env.MapCoordinateForScreenPoint(self.rect.right, self.rect.bottom)
 #        hitbox = pygame.Rect((0, 0), (self.HITBOX_WIDTH, self.HITBOX_HEIGHT))
@@ -603,12 +651,9 @@ class Slug(character.Character):
 #        hitbox.bottom = y
 #        return hitbox
 #      else:
-      x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
-      return pygame.Rect(x + 1, y + 1, self.HITBOX_WIDTH, self.HITBOX_HEIGHT)
+      return (1, 1, self.HITBOX_WIDTH, self.HITBOX_HEIGHT)
     else:
-      x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
-      return pygame.Rect(x + 1 + (self.WIDTH - self.HITBOX_WIDTH),
-                         y + 1, self.HITBOX_WIDTH, self.HITBOX_HEIGHT)
+      return (1 + self.WIDTH - self.HITBOX_WIDTH, 1, self.HITBOX_WIDTH, self.HITBOX_HEIGHT)
       
   '''
   def TurnDownward(self):
@@ -666,6 +711,7 @@ class Baron(Beaver):
   STARTING_MOVEMENT = [-SPEED, 0]
   DAMAGE = 3
   IMAGES = None
+  DYING_IMAGES = None  # Dying.IMAGES scaled up to the Baron's size.
   ITEM_DROPS = [powerup.HealthRestore, powerup.AmmoRestore]
   DROP_PROBABILITY = 20
   WIDTH = 384
@@ -673,8 +719,9 @@ class Baron(Beaver):
   REST_TIME = 60
   VARIABLE_REST = 60
   MOVE_TIME = 48
+  SNAPSHOT_STATE = Beaver.SNAPSHOT_STATE + ('move_frames', 'rest_frames')
 
-  DEATH_SOUND = pygame.mixer.Sound(os.path.join('media', 'music', 'win.ogg'))
+  DEATH_SOUND = audio.Sound(os.path.join('media', 'music', 'win.ogg'))
 
   def __init__(self, environment, position):
     self.move_frames = self.MOVE_TIME
@@ -682,8 +729,11 @@ class Baron(Beaver):
     character.Character.__init__(self, environment, position)
     self.last_movement = self.movement
 
-  def GetMove(self):
-    """Get the movement vector for the Beaver."""
+  def AdvanceWalkCycle(self):
+    """Count down the current move or rest period.  Returns True if the Baron moves this frame.
+
+    The Baron also gets faster and more restless once he is badly hurt.
+    """
     if self.hp < 10:
       self.SPEED = 12
       self.REST_TIME = 0
@@ -691,16 +741,27 @@ class Baron(Beaver):
     if self.move_frames > 0:
       self.move_frames -= 1
       if self.move_frames == 0:
-        self.rest_frames = self.REST_TIME + random.randint(0, self.VARIABLE_REST)
+        self.rest_frames = self.REST_TIME + rng.randint(0, self.VARIABLE_REST)
         self.last_movement = self.movement
+      return True
+    self.rest_frames -= 1
+    if self.rest_frames == 0:
+      self.move_frames = self.MOVE_TIME
+      self.movement = self.last_movement
+    return False
+
+  def GetMove(self):
+    """Get the movement vector for the Beaver."""
+    if self.AdvanceWalkCycle():
       self.movement = self.WalkBackAndForth()
     else:
       self.movement[0] = 0
-      self.rest_frames -= 1
-      if self.rest_frames == 0:
-        self.move_frames = self.MOVE_TIME
-        self.movement = self.last_movement
     return self.movement
+
+  def WalkerMode(self):
+    if self.AdvanceWalkCycle():
+      return walkers.WALK
+    return walkers.REST
   
   def InitImage(self):
     if Beaver.IMAGES is None:
@@ -714,9 +775,10 @@ class Baron(Beaver):
 
   def Die(self):
     """This character dies."""
-    dying = character.Dying(self.rect, boss=True, sound=self.DEATH_SOUND)
-    dying.animation = animation.Animation(
-      [pygame.transform.scale(i, (self.WIDTH, self.HEIGHT)) for i in character.Dying.IMAGES],
-      looping=False, framedelay=3)
+    if Baron.DYING_IMAGES is None:
+      Baron.DYING_IMAGES = [pygame.transform.scale(i, (self.WIDTH, self.HEIGHT))
+                            for i in character.Dying.LoadFrames()]
+    dying = character.Dying.Spawn(self.rect, boss=True, sound=self.DEATH_SOUND,
+                                  images=Baron.DYING_IMAGES)
     self.env.dying_animation_group.add(dying)
     self.kill()
@@ -14,6 +14,7 @@ import os
 import pygame
 
 from . import animation
+import audio
 from . import character
 import controller
 from . import enemies
@@ -75,6 +76,10 @@ class Hero(character.Character):
   IS_PLAYER = True
   HITBOX_LEFT_OFFSET = -20
   HITBOX_RIGHT_OFFSET = 19
+  SNAPSHOT_STATE = character.Character.SNAPSHOT_STATE + (
+      'movement', 'jump_ready', 'remaining_jumps', 'attack_ready', 'attacking',
+      'shooting_cooldown', 'WALK_RIGHT_ANIMATION', 'WALK_LEFT_ANIMATION',
+      'ATTACK_RIGHT_ANIMATION', 'ATTACK_LEFT_ANIMATION')
 
   # Store surfaces in class variables so they're only loaded once.
   WALK_RIGHT_ANIMATION = None
@@ -87,12 +92,13 @@ class Hero(character.Character):
   FALL_LEFT_IMAGE = None
   
   # Some sounds
-  ATTACK_SOUND = pygame.mixer.Sound(os.path.join('media', 'sfx', 'attack.wav'))
-  JUMP_SOUND = pygame.mixer.Sound(os.path.join('media', 'sfx', 'jump.wav'))
-  DEATH_SOUND = pygame.mixer.Sound(os.path.join('media', 'music', 'game_over.ogg'))
+  ATTACK_SOUND = audio.Sound(os.path.join('media', 'sfx', 'attack.wav'))
+  JUMP_SOUND = audio.Sound(os.path.join('media', 'sfx', 'jump.wav'))
+  DEATH_SOUND = audio.Sound(os.path.join('media', 'music', 'game_over.ogg'))
     
   def __init__(self, environment, position=(0, 0)):
     self._direction = None
+    self._fallbox_cache = character.BoxCache()
     character.Character.__init__(self, environment, position)
   
     # Load the sprite graphics once so we don't need to reload on the fly.
@@ -136,8 +142,12 @@ class Hero(character.Character):
     else:
       self._direction = new_direction
   
-  def Hitbox(self):
-    """Gets the Map hitbox for the sprite, which is relative to the map rather than the screen.
+  def HitboxState(self):
+    # The hitbox covers the whole sprite while attacking, whichever way it faces.
+    return None if self.attacking else self.direction
+
+  def ComputeHitbox(self):
+    """Builds the Map hitbox for the sprite, which is relative to the map rather than the screen.
     
     The Hitbox needs to be smaller than the sprite, partly because of weird PyGame behavior
     where a rect of width X and height y actually touches (x+1) * (y+1) pixels.
@@ -153,8 +163,16 @@ class Hero(character.Character):
   def Fallbox(self):
     """Gets the character's fallbox, that shows the area they're standing on.
     
-    This box does not change size or position when the player attacks.
+    This box does not change size or position when the player attacks.  Like Hitbox() it is
+    memoised until the rect, scroll position or direction changes.
     """
+    cache = self._fallbox_cache
+    if not cache.Check(self.rect, self.env.screen_offset, self.direction):
+      cache.box = self.ComputeFallbox()
+    return cache.box
+
+  def ComputeFallbox(self):
+    """Builds a new fallbox for the character's current position and direction."""
     x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
     if self.direction == LEFT:
       fallbox = pygame.Rect(x + self.HITBOX_LEFT_OFFSET + self.rect.width - self.STAND_WIDTH, y + 1,
@@ -283,7 +301,7 @@ class Hero(character.Character):
       direction = [1, 0]
       position = (self.rect.right, self.rect.centery - 32)
       
-    bullet = projectile.SeedBullet(self.env, direction, position)
+    bullet = projectile.SeedBullet.Spawn(self.env, direction, position)
     self.env.hero_projectile_group.add(bullet)
     
   def SetCurrentImage(self):
@@ -359,6 +377,14 @@ class Hero(character.Character):
     self.rect = pygame.Rect((left, top),
                             (self.WIDTH, self.HEIGHT))
 
+  def SnapshotState(self):
+    # The width follows the image, and the hitbox and fallbox are placed relative to it.
+    return character.Character.SnapshotState(self) + [self.rect.width]
+
+  def RestoreSnapshotState(self, values):
+    character.Character.RestoreSnapshotState(self, values[:-1])
+    self.rect.width = values[-1]
+
   def update(self):
     self.SetCurrentImage()
     new_rect = self.env.AttemptMove(self, self.movement)
@@ -384,7 +410,7 @@ class Hero(character.Character):
   def Die(self):
     """Game over, man."""
     self.invulnerable = 2**31
-    self.env.dying_animation_group.add(character.Dying(self.rect, player=True,
-                                                       sound=self.DEATH_SOUND))
+    self.env.dying_animation_group.add(character.Dying.Spawn(self.rect, player=True,
+                                                             sound=self.DEATH_SOUND))
     self.kill()
     
\ No newline at end of file
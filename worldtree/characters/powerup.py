@@ -11,15 +11,14 @@ Created on Jun 16, 2012
 """
 
 import os
-import time
 
 import pygame
 
 from . import animation
+import audio
 from . import character
 import game_constants
-import map_data
-import map_data2
+import pooling
 
 class Powerup(pygame.sprite.Sprite):
   """An item picked up by the player that has an effect on his stats.
@@ -43,25 +42,31 @@ class Powerup(pygame.sprite.Sprite):
       position: Initial (x, y) tile position for this item.  The top left corner of the
         item will be aligned with this tile.
       one_time: Boolean, if True this item will be removed from the screen after it's encountered.
-      cleanup: Boolean, if True the object will be removed from map_data after it is picked up.
-      sound: pygame.mixer.Sound object to play when the item is picked up.
+      cleanup: Boolean, if True the object will never appear again after it is picked up.
+      sound: audio.Sound object to play when the item is picked up.
     """
     pygame.sprite.Sprite.__init__(self)
-    self.env = environment
-    self.col = position[0]
-    self.row = position[1]
     self.one_time = one_time
     self.cleanup = cleanup
     self.sound = sound
-    self.dead = False
-    map_rect = self.env.RectForTile(*position)
-    self.rect = pygame.Rect(self.env.ScreenCoordinateForMapPoint(map_rect.left, map_rect.top),
-                            (self.WIDTH, self.HEIGHT))
     self.InitImage()
     if self.IMAGE is not None:
       self.image = self.IMAGE
     elif self.IMAGES is not None:
       self.animation = animation.Animation(self.IMAGES, framedelay=1)
+    self.Place(environment, position)
+
+  def Place(self, environment, position):
+    """Put the item at a tile position, with its animation starting from the beginning."""
+    self.env = environment
+    self.col = position[0]
+    self.row = position[1]
+    self.dead = False
+    map_rect = self.env.RectForTile(*position)
+    self.rect = pygame.Rect(self.env.ScreenCoordinateForMapPoint(map_rect.left, map_rect.top),
+                            (self.WIDTH, self.HEIGHT))
+    if self.IMAGE is None and self.IMAGES is not None:
+      self.animation.Reset()
       self.image = self.animation.NextFrame()
 
   @classmethod
@@ -92,19 +97,11 @@ class Powerup(pygame.sprite.Sprite):
   def PickUp(self, player):
     """Handle the object being acquired by the player."""
     if self.sound is not None:
-      pygame.mixer.music.pause()
-      channel = self.sound.play()
-      while channel.get_busy():
-        # TODO: consider whether we want this to happen or not.  This freezes the game while
-        # playing the jingle!
-        time.sleep(0.1)
-      pygame.mixer.music.unpause()
+      # The main loop pauses the game while the jingle plays.
+      self.env.fanfare = self.sound
     self.Use(player)
     if self.cleanup:
-      if self.env.region == 1:
-        map_data.map_data[self.env.name]['mapcodes'][self.row][self.col] = 0
-      elif self.env.region == 2:
-        map_data2.map_data[self.env.name]['mapcodes'][self.row][self.col] = 0
+      self.env.Collect(self.col, self.row)
     if self.one_time:
       self.env.dirty = True  # Needed to make the image vanish right away.
       self.kill()
@@ -113,7 +110,7 @@ class Powerup(pygame.sprite.Sprite):
 class HealthBoost(Powerup):
   
   HEALTH_BONUS = 5
-  SOUND = pygame.mixer.Sound(os.path.join(game_constants.MUSIC_DIR, 'item_get.ogg'))
+  SOUND = audio.Sound(os.path.join(game_constants.MUSIC_DIR, 'item_get.ogg'))
   IMAGE_FILE = None
   IMAGE_FILES = 'lifeup*.png'
   
@@ -124,7 +121,8 @@ class HealthBoost(Powerup):
     player.RaiseMaxHp(self.HEALTH_BONUS)
 
 
-class HealthRestore(Powerup):
+class HealthRestore(Powerup, pooling.PooledSprite):
+  """Health dropped by enemies.  Create these with HealthRestore.Spawn()."""
   
   HEALTH_BONUS = 3
   IMAGE_FILE = None
@@ -132,7 +130,9 @@ class HealthRestore(Powerup):
 
   def __init__(self, environment, position):
     Powerup.__init__(self, environment, position)
-    print('creating powerup at {}'.format(position))
+
+  def Reset(self, environment, position):
+    self.Place(environment, position)
     
   def Use(self, player):
     player.RecoverHealth(self.HEALTH_BONUS)
@@ -140,7 +140,7 @@ class HealthRestore(Powerup):
 
 class DoubleJump(Powerup):
   
-  SOUND = pygame.mixer.Sound(os.path.join(game_constants.MUSIC_DIR, 'item_get.ogg'))
+  SOUND = audio.Sound(os.path.join(game_constants.MUSIC_DIR, 'item_get.ogg'))
   IMAGE = None
   
   def __init__(self, environment, position):
@@ -154,7 +154,7 @@ class DoubleJump(Powerup):
 class MoreSeeds(Powerup):
   """Powerup that increases the player's maximum ammo."""
 
-  SOUND = pygame.mixer.Sound(os.path.join(game_constants.MUSIC_DIR, 'item_get.ogg'))
+  SOUND = audio.Sound(os.path.join(game_constants.MUSIC_DIR, 'item_get.ogg'))
   IMAGE_FILE = None
   IMAGE_FILES = 'ammoup*.png'
   
@@ -166,8 +166,11 @@ class MoreSeeds(Powerup):
     player.ammo = min(player.max_ammo, player.ammo + 2)
 
 
-class AmmoRestore(Powerup):
-  """Powerup that refills some of the player's ammo."""
+class AmmoRestore(Powerup, pooling.PooledSprite):
+  """Powerup that refills some of the player's ammo.
+
+  These are dropped by enemies, so create them with AmmoRestore.Spawn().
+  """
 
   IMAGE_FILE = None
   IMAGE_FILES = 'seedammo*.png'
@@ -175,74 +178,102 @@ class AmmoRestore(Powerup):
   def __init__(self, environment, position):
     Powerup.__init__(self, environment, position)
 
+  def Reset(self, environment, position):
+    self.Place(environment, position)
+
   def Use(self, player):
     player.ammo = min(player.max_ammo, player.ammo + 2)
 
 
-class Lava(Powerup):
-  """An area that inflicts damage when the player stands in it.
-  
-  Although the name is confusing, this is a "Powerup" because it is a static object that
-  doesn't get updated each frame.  If I were starting over I'd probably rename the Powerup class.
-  
-  This class is also handled somewhat differently from other powerups in that the game will
-  try to join adjacent Lava tiles into a single object to reduce the number amount of collision
-  checks taking place each frame.
+class Hazard(object):
+  """A static area of the map that affects the player while he is inside it.
+
+  Hazards are not sprites.  They are invisible and fixed to the map, so rather than being
+  updated, drawn and collision checked through a sprite group every frame, the Environment
+  merges adjacent hazard tiles into as few rectangles as possible and keeps them in a static
+  index that is queried once per frame with the player's hitbox.
+
+  Each row of a hazard can be touched separately, the way each row used to be its own item: a
+  strip STRIP_HEIGHT pixels tall straddling the top edge of the row's tiles, inset by
+  STRIP_INSET pixels at either end.
+
+  Attributes:
+    env: Environment object this hazard exists in.
+    area: pygame.Rect covering the hazard's tiles, relative to the map origin.
+    strips: list of pygame.Rect the player must touch to be affected, one per row from the top,
+      relative to the map origin.
   """
-  
-  IMAGE_FILE = 'transparent.png'
-  DAMAGE = 2
+
+  DAMAGE = 0
+  STRIP_INSET = 3
+  STRIP_HEIGHT = 6
 
   def __init__(self, environment, position, size):
     """Constructor.
-    
+
     Args:
-      environment: Environment object this Lava exists in.
-      position: (x, y) tile position of the Lava.
-      size: (width, height) of the lava in tiles.
+      environment: Environment object this hazard exists in.
+      position: (x, y) tile position of the top left corner of the hazard.
+      size: (width, height) of the hazard in tiles.
     """
-    Powerup.__init__(self, environment, position, one_time=False, cleanup=False)
-    self.rect.width = size[0] * game_constants.TILE_WIDTH
-    self.rect.height = size[1] * game_constants.TILE_HEIGHT
-    
+    self.env = environment
+    map_rect = self.env.RectForTile(*position)
+    self.area = pygame.Rect(map_rect.topleft, (size[0] * game_constants.TILE_WIDTH,
+                                               size[1] * game_constants.TILE_HEIGHT))
+    self.strips = [
+        pygame.Rect(self.area.left + self.STRIP_INSET, top - self.STRIP_HEIGHT // 2,
+                    self.area.width - 2 * self.STRIP_INSET, self.STRIP_HEIGHT)
+        for top in range(self.area.top, self.area.bottom, game_constants.TILE_HEIGHT)]
+
+  @property
+  def rect(self):
+    """Screen position of the hazard, for anything that expects a sprite-like rect."""
+    return self.env.ScreenRectForMapRect(self.area)
+
+  def RowRect(self, row):
+    """Returns the screen rect of the top edge of a row, which things are pushed away from."""
+    top = self.area.top + row * game_constants.TILE_HEIGHT
+    return pygame.Rect(self.env.ScreenCoordinateForMapPoint(self.area.left, top),
+                       (self.area.width, 0))
+
   def Use(self, player):
+    """Affect the player once for every row they touch, from the top down."""
+    hitbox = player.Hitbox()
+    for row, strip in enumerate(self.strips):
+      if strip.colliderect(hitbox):
+        self.Touch(player, row)
+
+  def Touch(self, player, row):
+    raise NotImplementedError('Subclasses must define the effect of the hazard.')
+
+
+class Lava(Hazard):
+  """An area that inflicts damage when the player stands in it."""
+  
+  DAMAGE = 2
+
+  def Touch(self, player, row):
     if player.invulnerable == 0:
       player.TakeHit(self.DAMAGE)
 
 
-class Spike(Powerup):
-  """An area that inflicts damage and pushes the player back when the player touches it.
+class Spike(Hazard):
+  """An area that inflicts damage and pushes the player back when the player touches it."""
   
-  As with Lava, the game will try to join adjacent Spike tiles into a single object to reduce
-  the number amount of collision checks taking place each frame.
-  """
-  
-  IMAGE_FILE = 'transparent.png'
   DAMAGE = 2
   PUSHBACK = 32
 
-  def __init__(self, environment, position, size):
-    """Constructor.
-    
-    Args:
-      environment: Environment object this Spike exists in.
-      position: (x, y) tile position of the Spike.
-      size: (width, height) of the Spike in tiles.
-    """
-    Powerup.__init__(self, environment, position, one_time=False, cleanup=False)
-    self.rect.width = size[0] * game_constants.TILE_WIDTH
-    self.rect.height = size[1] * game_constants.TILE_HEIGHT
-    
-  def Use(self, player):
+  def Touch(self, player, row):
     if player.invulnerable == 0:
-      player.CollisionPushback(self)
+      player.CollisionPushback(self, self.RowRect(row))
       player.TakeHit(self.DAMAGE)
 
 
 def CollideSprites(player, other):
-  """Return True if two characters collide, otherwise false.
+  """Return True if the player collides with an item, otherwise false.
   
-  This may produce side effects - it's the easiest way to let enemies know where the player
-  is, since it's called once per frame.
+  Uses a rect and mask test instead of hitboxes if character.PRECISE_COLLISIONS is set.
   """
+  if character.PRECISE_COLLISIONS:
+    return player.rect.colliderect(other.rect) and character.MasksOverlap(player, other)
   return player.Hitbox().colliderect(other.Hitbox())
\ No newline at end of file
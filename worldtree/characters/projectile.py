@@ -11,6 +11,7 @@ import pygame
 from . import animation
 from . import character
 import game_constants
+import pooling
 
 class Projectile(pygame.sprite.Sprite):
   """This class is abstract, because it has no image."""
@@ -29,23 +30,35 @@ class Projectile(pygame.sprite.Sprite):
       position: (x, y) initial screen position in pixels.
     """
     pygame.sprite.Sprite.__init__(self)
+    self.InitImage()
+    self.Launch(env, damage, speed, direction, position)
+
+  def Launch(self, env, damage, speed, direction, position):
+    """Set the projectile on its way.  Takes the same arguments as the constructor.
+
+    Called from the constructor, and again whenever a pooled projectile is reused.
+    """
     self.env = env
     self.damage = damage
     self.speed = speed
     self.direction = direction
     multiplier = speed / float((direction[0]**2 + direction[1]**2) ** 0.5)
     self.movement = [int(multiplier * direction[0]), int(multiplier * direction[1])]
-    self.InitImage()
+    self._hitbox_cache = character.BoxCache()
+    # Frames left until this hits a wall, worked out on the first update.
+    self.frames_to_impact = None
     self.rect = pygame.Rect(position, self.image.get_size())
 
   def Hitbox(self):
     """Gets the Map hitbox for the sprite, which is relative to the map rather than the screen.
     
-    The Hitbox needs to be smaller than the sprite, partly because of weird PyGame behavior
-    where a rect of width X and height y actually touches (x+1) * (y+1) pixels.
+    Memoised the same way as character.Character.Hitbox(), so the result must not be modified.
     """
-    x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
-    return pygame.Rect(x, y, self.rect.width, self.rect.height)
+    cache = self._hitbox_cache
+    if not cache.Check(self.rect, self.env.screen_offset):
+      x, y = self.env.MapCoordinateForScreenPoint(self.rect.left, self.rect.top)
+      cache.box = pygame.Rect(x, y, self.rect.width, self.rect.height)
+    return cache.box
 
   def InitImage(self):
     """Initialize the image or animation for this projectile.
@@ -71,13 +84,22 @@ class Projectile(pygame.sprite.Sprite):
     
   def update(self):
     self.SetCurrentImage()
-    if not self.env.IsMoveLegal(self, self.movement):
+    if self.frames_to_impact is None:
+      # Projectiles fly in a straight line through walls that never move, so the frame they
+      # hit one can be found once instead of checking every frame.  Subclasses may move the
+      # rect after Projectile.__init__(), so wait until the first update to do it.
+      self.frames_to_impact = self.env.PredictImpact(self.Hitbox(), self.movement)
+      if self.frames_to_impact is None:
+        self.frames_to_impact = float('inf')
+    if self.frames_to_impact <= 0:
       # Only checks if this hits walls, not other sprites.
       self.kill()
+    self.frames_to_impact -= 1
     self.rect = self.rect.move(self.movement)
 
 
-class SeedBullet(Projectile):
+class SeedBullet(Projectile, pooling.PooledSprite):
+  """The player's projectile.  Create these with SeedBullet.Spawn()."""
   
   DAMAGE = 4
   SPEED = 12
@@ -85,6 +107,11 @@ class SeedBullet(Projectile):
   
   def __init__(self, env, direction, position):
     Projectile.__init__(self, env, self.DAMAGE, self.SPEED, direction, position)
+
+  def Reset(self, env, direction, position):
+    self.animation.Reset()
+    self.image = self.animation.NextFrame()
+    self.Launch(env, self.DAMAGE, self.SPEED, direction, position)
     
   def InitImage(self):
     if SeedBullet.IMAGES is None:
@@ -97,7 +124,8 @@ class SeedBullet(Projectile):
     self.image = self.animation.NextFrame()
 
 
-class SporeCloud(Projectile):
+class SporeCloud(Projectile, pooling.PooledSprite):
+  """The Shooter's projectile.  Create these with SporeCloud.Spawn()."""
   
   DAMAGE = 2
   SPEED = 3
@@ -105,6 +133,12 @@ class SporeCloud(Projectile):
 
   def __init__(self, env, direction, position):
     Projectile.__init__(self, env, self.DAMAGE, self.SPEED, direction, position)
+
+  def Reset(self, env, direction, position):
+    self.Launch(env, self.DAMAGE, self.SPEED, direction, position)
+
+  def Launch(self, env, damage, speed, direction, position):
+    Projectile.Launch(self, env, damage, speed, direction, position)
     # Adjust position away from the center of the shooter.
     self.rect.left += (self.movement[0] * 5)
     self.rect.top += (self.movement[1] * 15)
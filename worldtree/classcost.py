@@ -0,0 +1,209 @@
+"""
+Accounting of the CPU time spent on each class of sprite, room by room.
+
+While ENABLED is set, the game's update, sensing and drawing loops time every call they make
+on a sprite and charge it to the sprite's class: Slug, BoomBug, SeedBullet, HealthRestore and
+so on.  At the end of each frame the accountant adds the frame's totals to the current room,
+along with how many instances of each class there were, so the report can show which classes
+dominate the frame time and how each one's cost grows with its number of instances.  That is
+fitted as a straight line over every frame the class was seen in: a fixed cost per frame
+plus a cost per instance.
+
+Turn it on with "python worldtree.py --class-costs FILE", which writes the report to FILE
+when the game ends.  It works with --headless too, where there's no drawing.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import time
+
+ENABLED = False
+
+# Kinds of work charged to a class.
+UPDATE = 'update'
+SENSE = 'sense'
+DRAW = 'draw'
+KINDS = (UPDATE, SENSE, DRAW)
+
+
+class ClassCost(object):
+  """The time spent on one class of sprite in one room.
+
+  Attributes:
+    ms: dict of kind to total milliseconds.
+    calls: dict of kind to number of calls.
+    frames: int number of frames with at least one instance of the class.
+    instances: int instances summed over those frames.
+    fit: [sum of count, sum of ms, sum of count * ms, sum of count ** 2] over those frames,
+      for fitting ms per frame against instance count.
+  """
+
+  def __init__(self):
+    self.ms = dict((kind, 0.0) for kind in KINDS)
+    self.calls = dict((kind, 0) for kind in KINDS)
+    self.frames = 0
+    self.instances = 0
+    self.fit = [0, 0.0, 0.0, 0]
+
+  def Total(self):
+    return sum(self.ms.values())
+
+  def AddFrame(self, count, ms):
+    self.frames += 1
+    self.instances += count
+    self.fit[0] += count
+    self.fit[1] += ms
+    self.fit[2] += count * ms
+    self.fit[3] += count * count
+
+  def Add(self, other):
+    """Add another ClassCost's totals to this one's."""
+    for kind in KINDS:
+      self.ms[kind] += other.ms[kind]
+      self.calls[kind] += other.calls[kind]
+    self.frames += other.frames
+    self.instances += other.instances
+    self.fit = [mine + theirs for mine, theirs in zip(self.fit, other.fit)]
+
+  def Scaling(self):
+    """Fit the class's milliseconds per frame to its instance count.
+
+    Returns:
+      (fixed_ms, ms_per_instance) tuple.  If the instance count never changed, everything is
+      per instance.
+    """
+    n = self.frames
+    sum_x, sum_y, sum_xy, sum_xx = self.fit
+    if not n:
+      return 0.0, 0.0
+    denominator = n * sum_xx - sum_x * sum_x
+    if not denominator:
+      return 0.0, sum_y / sum_x if sum_x else 0.0
+    slope = (n * sum_xy - sum_x * sum_y) / denominator
+    return (sum_y - slope * sum_x) / n, slope
+
+
+class CostAccountant(object):
+  """Collects the time spent on each class of sprite.
+
+  Attributes:
+    rooms: dict of (region, room) to a dict of class name to its ClassCost there.
+    frames: dict of (region, room) to the number of frames accounted in it.
+    frame: dict of class name to [ClassCost for the frame in progress, set of instances].
+  """
+
+  def __init__(self):
+    self.rooms = {}
+    self.frames = {}
+    self.frame = {}
+
+  def Record(self, kind, sprite, ms):
+    """Charge some time to the class of a sprite."""
+    name = type(sprite).__name__
+    entry = self.frame.get(name)
+    if entry is None:
+      entry = self.frame[name] = [ClassCost(), set()]
+    entry[0].ms[kind] += ms
+    entry[0].calls[kind] += 1
+    entry[1].add(id(sprite))
+
+  def EndFrame(self, region, room):
+    """Add the frame in progress to a room's totals."""
+    if not ENABLED:
+      return
+    key = (region, room)
+    costs = self.rooms.setdefault(key, {})
+    self.frames[key] = self.frames.get(key, 0) + 1
+    for name, (cost, instances) in self.frame.items():
+      cost.AddFrame(len(instances), cost.Total())
+      costs.setdefault(name, ClassCost()).Add(cost)
+    self.frame = {}
+
+  def Totals(self):
+    """Returns a dict of class name to its ClassCost summed over every room."""
+    totals = {}
+    for costs in self.rooms.values():
+      for name, cost in costs.items():
+        totals.setdefault(name, ClassCost()).Add(cost)
+    return totals
+
+  def Report(self):
+    """Returns a table of where the time went, for every room and then for the whole game."""
+    lines = []
+    for (region, room), costs in sorted(self.rooms.items()):
+      lines.append('Region {} {} ({} frames)'.format(region, room, self.frames[(region, room)]))
+      lines.extend(_Table(costs, self.frames[(region, room)]))
+      lines.append('')
+    frames = sum(self.frames.values())
+    lines.append('All rooms ({} frames)'.format(frames))
+    lines.extend(_Table(self.Totals(), frames))
+    return '\n'.join(lines) + '\n'
+
+  def Save(self, path):
+    with open(path, 'w') as output:
+      output.write(self.Report())
+
+
+def _Table(costs, frames):
+  """Returns the lines of a report table for a dict of class name to ClassCost."""
+  total = sum(cost.Total() for cost in costs.values()) or 1.0
+  lines = ['  {:16} {:>9} {:>9} {:>9} {:>9} {:>9} {:>6} {:>10} {:>10}'.format(
+      'class', 'instances', 'update', 'sense', 'draw', 'ms/frame', 'share', 'fixed ms',
+      'us/inst')]
+  for name, cost in sorted(costs.items(), key=lambda item: -item[1].Total()):
+    fixed, per_instance = cost.Scaling()
+    lines.append('  {:16} {:9.1f} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:6.1%} {:10.4f} {:10.2f}'.format(
+        name, cost.instances / float(frames), cost.ms[UPDATE] / frames, cost.ms[SENSE] / frames,
+        cost.ms[DRAW] / frames, cost.Total() / frames, cost.Total() / total, fixed,
+        per_instance * 1000))
+  return lines
+
+
+accountant = CostAccountant()
+
+
+def Update(sprite):
+  """Call sprite.update(), charging the time to its class if accounting is on."""
+  if not ENABLED:
+    sprite.update()
+    return
+  start = time.perf_counter()
+  try:
+    sprite.update()
+  finally:
+    accountant.Record(UPDATE, sprite, (time.perf_counter() - start) * 1000)
+
+
+def UpdateGroup(group):
+  """Update every sprite in a group, as group.update() does."""
+  if not ENABLED:
+    group.update()
+    return
+  for sprite in group.sprites():
+    Update(sprite)
+
+
+def Sense(sprite, player, distance_sq):
+  """Call sprite.Sense(), charging the time to its class if accounting is on."""
+  if not ENABLED:
+    sprite.Sense(player, distance_sq)
+    return
+  start = time.perf_counter()
+  sprite.Sense(player, distance_sq)
+  accountant.Record(SENSE, sprite, (time.perf_counter() - start) * 1000)
+
+
+def Draw(surface, sprite, position):
+  """Blit a sprite's image to a surface, charging the time to its class if accounting is on.
+
+  Returns:
+    The Rect that was drawn to.
+  """
+  if not ENABLED:
+    return surface.blit(sprite.image, position)
+  start = time.perf_counter()
+  rect = surface.blit(sprite.image, position)
+  accountant.Record(DRAW, sprite, (time.perf_counter() - start) * 1000)
+  return rect
@@ -41,7 +41,15 @@ KEY_MAP = {
   pygame.K_d : RIGHT
 }
 
-def GetInput():
-  """Returns a list of the currently active active_keys signals."""
+def KeyboardInput():
+  """Returns a list of the actions whose keys are currently held down."""
   active_keys = pygame.key.get_pressed()
   return [action for (key, action) in list(KEY_MAP.items()) if active_keys[key]]
+
+# Function that returns the list of actions for the current frame.  Swapped out by the
+# recorder and player in replay.py.
+input_source = KeyboardInput
+
+def GetInput():
+  """Returns a list of the currently active active_keys signals."""
+  return input_source()
@@ -0,0 +1,248 @@
+"""
+Component storage for the characters in a room, and the systems that process it in bulk.
+
+Every enemy in an Environment is an entity in its EntityStore.  The state that the game's
+per-frame passes need is kept in parallel typed arrays, one group of arrays per component:
+
+  Position:  x, y - the centre of the entity's hitbox, relative to the map.
+  Hitbox:    left, top, right, bottom - the entity's map hitbox.
+  Velocity:  vx, vy - the movement vector from the entity's last update.
+  Health:    hp, invulnerable.
+  Animation: alpha - the alpha the entity's current image is drawn with.
+  Sensing:   sense_radius - the entity's SENSE_RADIUS.
+  Lifetime:  despawns - whether the entity is removed when it leaves the area around the screen.
+  Activity:  activity - how often the entity is updated, given how far it is from the camera.
+
+The system functions below iterate over those arrays rather than dispatching through each
+sprite's methods.  Physics for walking enemies is done by the walkers.WalkerBatch, and the
+rest of the movement and AI still lives in the classes in characters/, which act as façades
+over the store: Character.hp and Character.invulnerable read and write the Health arrays while
+the character is in a store.  Characters that aren't in a store (the Hero) keep their own.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+from array import array
+
+import classcost
+import profiling
+
+# Alpha values for AnimationSystem's invulnerability flicker.
+OPAQUE = 255
+FLICKER = 128
+
+# Values for EntityStore.activity, as set by ActivationSystem.
+AWAKE = 0  # Updated every frame.
+DROWSY = 1  # Updated at a reduced rate.
+ASLEEP = 2  # Not updated at all.
+
+
+class EntityStore(object):
+  """Structure-of-arrays storage for every character in a room.
+
+  Slots are kept in the order entities were added, which is also the order of the
+  Environment's enemy_group, so bulk queries return results in the same order as iterating
+  the group would.  Entities that have been killed are dropped by the next TransformSystem().
+
+  Attributes:
+    sprites: list of the Character in each slot.
+    x, y: arrays of the centre of each entity's hitbox.
+    left, top, right, bottom: arrays of each entity's hitbox edges.
+    vx, vy: arrays of each entity's movement.
+    hp, invulnerable: arrays of each entity's health.
+    alpha: array of the alpha each entity's image was last drawn with.
+    sense_radius: array of each entity's SENSE_RADIUS.
+    despawns: array of 1 for each entity that should be despawned off screen, else 0.
+    activity: array of AWAKE, DROWSY or ASLEEP for each entity.
+  """
+
+  def __init__(self):
+    self.sprites = []
+    self.x = array('i')
+    self.y = array('i')
+    self.left = array('i')
+    self.top = array('i')
+    self.right = array('i')
+    self.bottom = array('i')
+    self.vx = array('d')
+    self.vy = array('d')
+    self.hp = array('q')
+    self.invulnerable = array('q')
+    self.alpha = array('i')
+    self.sense_radius = array('d')
+    self.despawns = array('b')
+    self.activity = array('b')
+    self._columns = (self.x, self.y, self.left, self.top, self.right, self.bottom, self.vx,
+                     self.vy, self.hp, self.invulnerable, self.alpha, self.sense_radius,
+                     self.despawns, self.activity)
+
+  def __len__(self):
+    return len(self.sprites)
+
+  def Add(self, sprite):
+    """Start storing a character's components.  Sets sprite.entity_store and entity_slot."""
+    # Read the health the character was constructed with before the façade switches over.
+    hp, invulnerable = sprite.hp, sprite.invulnerable
+    slot = len(self.sprites)
+    self.sprites.append(sprite)
+    for column in self._columns:
+      column.append(0)
+    self.hp[slot] = hp
+    self.invulnerable[slot] = invulnerable
+    self.alpha[slot] = OPAQUE
+    self.sense_radius[slot] = sprite.SENSE_RADIUS
+    self.despawns[slot] = 1 if sprite.despawns else 0
+    sprite.entity_store = self
+    sprite.entity_slot = slot
+    self.SyncTransform(slot)
+
+  def SyncTransform(self, slot):
+    """Copy a single entity's hitbox and movement into the arrays."""
+    sprite = self.sprites[slot]
+    hitbox = sprite.Hitbox()
+    self.left[slot] = hitbox.left
+    self.top[slot] = hitbox.top
+    self.right[slot] = hitbox.right
+    self.bottom[slot] = hitbox.bottom
+    self.x[slot] = hitbox.centerx
+    self.y[slot] = hitbox.centery
+    self.vx[slot] = sprite.movement[0]
+    self.vy[slot] = sprite.movement[1]
+
+  def RemoveDead(self):
+    """Drop every entity that has been killed, keeping the rest in order.
+
+    The removed characters get their health back as plain attributes, so anything still
+    holding on to one can read it.
+    """
+    keep = []
+    for slot, sprite in enumerate(self.sprites):
+      if sprite.alive():
+        keep.append(slot)
+      else:
+        hp, invulnerable = self.hp[slot], self.invulnerable[slot]
+        sprite.entity_store = None
+        sprite.entity_slot = None
+        sprite.hp = hp
+        sprite.invulnerable = invulnerable
+    if len(keep) == len(self.sprites):
+      return
+    for column in self._columns:
+      column[:] = array(column.typecode, [column[slot] for slot in keep])
+    self.sprites = [self.sprites[slot] for slot in keep]
+    for slot, sprite in enumerate(self.sprites):
+      sprite.entity_slot = slot
+
+  def Overlapping(self, rect):
+    """Return the live entities whose hitbox overlaps a map rect, in slot order.
+
+    Uses the same rule as pygame.Rect.colliderect(), so empty hitboxes never overlap.
+    """
+    left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+    if left == right or top == bottom:
+      return []
+    results = []
+    lefts, tops, rights, bottoms = self.left, self.top, self.right, self.bottom
+    for slot in range(len(self.sprites)):
+      if (lefts[slot] < right and left < rights[slot] and tops[slot] < bottom
+          and top < bottoms[slot] and lefts[slot] != rights[slot]
+          and tops[slot] != bottoms[slot]):
+        sprite = self.sprites[slot]
+        if sprite.alive():
+          results.append(sprite)
+    return results
+
+
+def TransformSystem(store):
+  """Refresh the Position, Hitbox and Velocity components after everything has moved."""
+  store.RemoveDead()
+  for slot in range(len(store.sprites)):
+    store.SyncTransform(slot)
+
+
+def SenseSystem(store, player, index):
+  """Call Sense() on every entity within its sense radius of the player.
+
+  Args:
+    store: EntityStore of the room's enemies.
+    player: the Hero.
+    index: spatial.SpatialHash to file the entities in.  It's cleared first.
+  """
+  index.Clear()
+  max_radius = 0
+  radii, xs, ys = store.sense_radius, store.x, store.y
+  for slot in range(len(store.sprites)):
+    radius = radii[slot]
+    if radius:
+      index.Insert(slot, xs[slot], ys[slot])
+      max_radius = max(max_radius, radius)
+  if not max_radius:
+    return
+  player_box = player.Hitbox()
+  for slot, distance_sq in index.Query(player_box.centerx, player_box.centery, max_radius):
+    if distance_sq < radii[slot] ** 2:
+      classcost.Sense(store.sprites[slot], player, distance_sq)
+      profiling.counters.Increment('enemies_sensed')
+
+
+def ActivationSystem(store, awake_area, drowsy_area):
+  """Decide how often each entity is updated from where its hitbox is.
+
+  Entities whose hitbox overlaps awake_area are AWAKE, those that overlap drowsy_area are
+  DROWSY, and the rest are ASLEEP.  Entities with ALWAYS_AWAKE set are always AWAKE.
+
+  Args:
+    store: EntityStore of the room's enemies.
+    awake_area: pygame.Rect in map coordinates, normally the visible map plus a margin.
+    drowsy_area: pygame.Rect in map coordinates containing awake_area.
+  """
+  activity = store.activity
+  lefts, tops, rights, bottoms = store.left, store.top, store.right, store.bottom
+  for slot, sprite in enumerate(store.sprites):
+    left, top, right, bottom = lefts[slot], tops[slot], rights[slot], bottoms[slot]
+    if (sprite.ALWAYS_AWAKE
+        or (left < awake_area.right and right > awake_area.left
+            and top < awake_area.bottom and bottom > awake_area.top)):
+      activity[slot] = AWAKE
+    elif (left < drowsy_area.right and right > drowsy_area.left
+          and top < drowsy_area.bottom and bottom > drowsy_area.top):
+      activity[slot] = DROWSY
+    else:
+      activity[slot] = ASLEEP
+
+
+def DespawnSystem(store, area):
+  """Remove despawnable entities whose hitbox is entirely outside a map rect.
+
+  Despawned entities are simply killed: they don't die, so there's no animation or item drop.
+  """
+  despawned = 0
+  for slot in range(len(store.sprites)):
+    if store.despawns[slot] and (store.right[slot] <= area.left
+                                 or store.left[slot] >= area.right
+                                 or store.bottom[slot] <= area.top
+                                 or store.top[slot] >= area.bottom):
+      store.sprites[slot].kill()
+      despawned += 1
+  if despawned:
+    store.RemoveDead()
+    profiling.counters.Increment('despawned', despawned)
+
+
+def DamageSystem(store):
+  """Count down every entity's invulnerability.  Negative values are permanent."""
+  invulnerable = store.invulnerable
+  for slot in range(len(store.sprites)):
+    if invulnerable[slot] > 0:
+      invulnerable[slot] -= 1
+
+
+def AnimationSystem(store):
+  """Make every invulnerable entity flicker.  Run after the entities have set their image."""
+  invulnerable, alpha = store.invulnerable, store.alpha
+  for slot, sprite in enumerate(store.sprites):
+    frames = invulnerable[slot]
+    alpha[slot] = FLICKER if frames > 0 and frames % 4 > 0 else OPAQUE
+    sprite.image.set_alpha(alpha[slot])
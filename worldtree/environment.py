@@ -14,14 +14,44 @@ import pygame
 
 from characters import enemies
 from characters import powerup
+import classcost
 from game_constants import *
 import map_data
 import map_data2
+import entities
+import profiling
+import spatial
 import tile
+import walkers
 import importlib
 
 MAPS_PATH = os.path.join('media', 'maps')
 
+# Cell size of the per-frame index used to find enemies near the player.
+SENSE_CELL_SIZE = 4 * TILE_WIDTH
+# Cell size of the static index of hazard areas.
+HAZARD_CELL_SIZE = 4 * TILE_WIDTH
+
+# If True, enemies with WALKER set are moved together by a walkers.WalkerBatch rather than
+# each moving itself in its update().
+BATCH_WALKERS = False
+
+# Most enemies created by spawners (e.g. BugPipe) that can be alive in a room at once.
+ROOM_SPAWN_BUDGET = 12
+# If True, spawned enemies are removed once they are DESPAWN_MARGIN pixels outside the visible
+# map.  Off by default, since it changes the game: bugs that wander off screen never come back.
+DESPAWN_SPAWNED = False
+DESPAWN_MARGIN = 2 * TILE_WIDTH
+
+# Simulation level of detail.  Enemies within ACTIVATION_MARGIN pixels of the visible map are
+# updated every frame, enemies within DROWSY_MARGIN every DROWSY_INTERVAL frames, and the rest
+# are frozen until the camera comes near them.  If False, every enemy updates every frame.
+# Off by default, since it changes the game: distant enemies stop moving.
+SIMULATION_LOD = False
+ACTIVATION_MARGIN = 4 * TILE_WIDTH
+DROWSY_MARGIN = 12 * TILE_WIDTH
+DROWSY_INTERVAL = 4
+
 # TODO: Add images here as the second argument.
 EMPTY_TILE = tile.Tile()
 
@@ -48,8 +78,8 @@ ITEMS = {
   131: powerup.MoreSeeds,
 }
 
-# These are mapcodes that will be merged with any adjacent tiles of the same code to form a
-# single object.
+# These are mapcodes that will be merged with any adjacent tiles of the same code to form as
+# few rectangular powerup.Hazard objects as possible.
 AREAS = {
   254: powerup.Spike,
   255: powerup.Lava,
@@ -105,12 +135,39 @@ for region, bg_dict in BG_COLORS.items():
       BG_COLORS_BY_ROOM[region][room] = color
 
 
+# (region, room, col, row) of every item that has been collected for good.  These are left out
+# when their room is loaded.
+COLLECTED = set()
+
+# Tile images shared by every Environment, keyed by file name.
+TILE_IMAGES = {}
+
+
+def TileImageName(map_info, col, row):
+  """Returns the file name of the image for a tile, or None if the tile is empty."""
+  layout = map_info['layout'][row][col]
+  if layout == 0:
+    return None
+  return '{}-{}.png'.format(map_info['tileset'], layout)
+
+
+def LoadTileImage(image_name):
+  """Returns a tile image, loading it the first time it's needed."""
+  image = TILE_IMAGES.get(image_name)
+  if image is None:
+    image_path = os.path.join(TILE_DIR, image_name)
+    image = pygame.transform.scale(pygame.image.load(image_path), TILE_SIZE).convert_alpha()
+    TILE_IMAGES[image_name] = image
+  return image
+
+
 def ReloadMaps():
-  """Force reload of the map data from modules."""
+  """Force reload of the map data from modules, and forget every collected item."""
   importlib.reload(map_data)
   importlib.reload(map_data2)
   REGIONS[1] = map_data.map_data
   REGIONS[2] = map_data2.map_data
+  COLLECTED.clear()
 
 
 class Environment(object):
@@ -133,6 +190,22 @@ class Environment(object):
       can only hit enemies, not the character.
     enemy_projectile_group: RendererUpdates object containing enemy bullets.  These only
       hit the player.
+    sense_index: spatial.SpatialHash of the entity slots that want to sense the player, rebuilt
+      each frame by SenseEnemies().
+    entities: entities.EntityStore holding the components of every enemy in enemy_group.
+      Enemies must be added with AddEnemy() so they're in both.
+    spawned: list of enemies added by AddSpawnedEnemy().  May include dead ones.
+    fanfare: audio.Sound of an item jingle for the main loop to play with the game
+      paused, or None.  Set by Powerup.PickUp().
+    frame: int number of times UpdateEnemies() has run, which schedules drowsy enemies.
+    sleeping_walkers: set of the walker slots of the batched walkers that didn't update this
+      frame, which AdvanceWalkers() leaves where they are.
+    hazard_index: spatial.RectIndex of the powerup.Hazard areas in the room.  These are not
+      sprites, so they are never updated or drawn.
+    walkers: walkers.WalkerBatch moving the room's walking enemies, or None if BATCH_WALKERS
+      is off.
+    patrol_spans: navigation table of walkable floor spans, as built by BuildPatrolSpans().
+      Dict of (top_row, feet_row) to a (left_limits, right_limits) pair of per-column lists.
   """
   
   def __init__(self, map_name, region, offset=None):
@@ -158,84 +231,278 @@ class Environment(object):
     else:
       self.screen_offset = list(offset)
     self.surface = pygame.Surface(MAP_SIZE)
+    self.surface_offset = None  # The screen offset the surface was last drawn at.
     self.dirty = True  # Whether the surface needs to be refreshed.
+    self.fanfare = None
     self.enemy_group = pygame.sprite.RenderUpdates()
     self.dying_animation_group = pygame.sprite.RenderUpdates()
     self.item_group = pygame.sprite.RenderUpdates()
     self.hero_projectile_group = pygame.sprite.RenderUpdates()
     self.enemy_projectile_group = pygame.sprite.RenderUpdates()
-    image_cache = {}  # Only create one Surface for each image.
+    self.sense_index = spatial.SpatialHash(SENSE_CELL_SIZE)
+    self.hazard_index = spatial.RectIndex(HAZARD_CELL_SIZE)
+    self.walkers = None
+    self.patrol_spans = {}
+    self.entities = entities.EntityStore()
+    self.spawned = []
+    self.frame = 0
+    self.sleeping_walkers = set()
     areas = {}  # Store codes that get merged into areas for the end.
     for row in range(self.height):
       for col in range(self.width):
         if row == 0:
           # Extend the grid to width = col.
           self.grid.append([])
-        if map_info['layout'][row][col] == 0:
+        image_name = TileImageName(map_info, col, row)
+        if image_name is None:
           self.grid[col].append(EMPTY_TILE)
         else:
-          image_name = '{}-{}.png'.format(map_info['tileset'], map_info['layout'][row][col])
-          if image_name not in image_cache:
-            image_path = os.path.join(TILE_DIR, image_name)
-            image = pygame.transform.scale(pygame.image.load(image_path), TILE_SIZE).convert_alpha()
-            image_cache[image_name] = image
-          self.grid[col].append(tile.Tile(image=image_cache[image_name],
+          self.grid[col].append(tile.Tile(image=LoadTileImage(image_name),
                                           bound_byte=map_info['bounds'][row][col],
                                           bg_color=self.bg_color))
 
         mapcode = map_info['mapcodes'][row][col]
         if mapcode != 0:
           if mapcode in ENEMIES:
-            self.enemy_group.add(ENEMIES[mapcode](self, (col, row)))
+            self.AddEnemy(ENEMIES[mapcode](self, (col, row)))
           elif mapcode in ITEMS:
-            self.item_group.add(ITEMS[mapcode](self, (col, row)))
+            if (region, map_name, col, row) not in COLLECTED:
+              self.item_group.add(ITEMS[mapcode](self, (col, row)))
           elif mapcode in AREAS:
             areas.setdefault(mapcode, []).append((col, row))
           else:
             raise Exception("Unknown mapcode: {}".format(mapcode))
     # TODO: Prevent enemies from walking into items.
     self.CreateAreas(areas)
+    # Platforms never change, so work out where each walker can patrol up front.
+    for enemy in self.enemy_group:
+      if enemy.WALKER:
+        hitbox = enemy.Hitbox()
+        self.PatrolLimits(hitbox.left, hitbox.top, hitbox.right, hitbox.bottom)
+    if BATCH_WALKERS:
+      self.walkers = walkers.WalkerBatch(self)
+      for enemy in self.enemy_group:
+        if enemy.WALKER:
+          self.walkers.Add(enemy)
     
   def CreateAreas(self, area_dict):
-    """Create objects for special map "areas", merging adjacent tiles into a single object.
+    """Create hazards for special map "areas", merging adjacent tiles into rectangles.
     
+    Tiles are claimed greedily in row order: each rectangle is extended right as far as the
+    run of matching tiles goes, then down for as long as the next row's run covers exactly the
+    same columns.  Rows are never split, so each row of a hazard touches the player just as a
+    single row's run always has.  The resulting hazards go into hazard_index, once for each
+    row, rather than a sprite group.
+
     Args:
-      area_dict: map of mapcode string to list of (row, col) tile coordinates.
+      area_dict: map of mapcode to list of (col, row) tile coordinates.
     """
     for mapcode, coordinates in area_dict.items():
-      i = 0
-      while (i < len(coordinates)):
-        start = coordinates[i]
+      tiles = set(coordinates)
+      remaining = set(coordinates)
+      for start in sorted(coordinates, key=lambda c: (c[1], c[0])):
+        if start not in remaining:
+          continue
+        col, row = start
         width = 1
-        while (i + width < len(coordinates)
-               and coordinates[i+width][1] == start[1]
-               and coordinates[i+width][0] == start[0] + width):
+        while (col + width, row) in tiles:
           width += 1
-        # TODO: Consider calculating lava areas more than one row deep.
-        area = AREAS[mapcode](self, start, (width, 0))
-        print('Area created! Coordinates: {} Size: {}'.format(start, width))
-        self.item_group.add(area)
-        i += width
+        height = 1
+        while ((col - 1, row + height) not in tiles
+               and (col + width, row + height) not in tiles
+               and all((x, row + height) in tiles for x in range(col, col + width))):
+          height += 1
+        for y in range(row, row + height):
+          for x in range(col, col + width):
+            remaining.discard((x, y))
+        hazard = AREAS[mapcode](self, start, (width, height))
+        for strip in hazard.strips:
+          self.hazard_index.Insert(hazard, strip)
+
+  def HazardsForRect(self, rect):
+    """Returns the hazards whose hitboxes overlap a map-relative rect."""
+    return self.hazard_index.Query(rect)
+
+  def SenseEnemies(self, player):
+    """Tell every enemy within its SENSE_RADIUS of the player where the player is.
+
+    This is the once-per-frame sensing phase, and should run before collisions are checked.
+    Enemies are indexed by the center of their hitbox and distances are compared squared.
+    """
+    entities.SenseSystem(self.entities, player, self.sense_index)
+
+  def Collect(self, col, row):
+    """Record that the item at a tile has been collected, so it won't appear again."""
+    COLLECTED.add((self.region, self.name, col, row))
+
+  def AddEnemy(self, enemy):
+    """Add an enemy to the room, both to enemy_group and to the entity store."""
+    self.enemy_group.add(enemy)
+    self.entities.Add(enemy)
+
+  def AddSpawnedEnemy(self, enemy):
+    """Add an enemy created by a spawner.  It counts against ROOM_SPAWN_BUDGET, and if
+    DESPAWN_SPAWNED is set it despawns when it leaves the area around the screen."""
+    enemy.despawns = DESPAWN_SPAWNED
+    self.spawned.append(enemy)
+    self.AddEnemy(enemy)
+
+  def LiveSpawnedCount(self):
+    """Return how many spawned enemies are still alive."""
+    self.spawned = [enemy for enemy in self.spawned if enemy.alive()]
+    return len(self.spawned)
+
+  def CanSpawn(self):
+    """Return True if the room's spawn budget allows another enemy to be spawned."""
+    return self.LiveSpawnedCount() < ROOM_SPAWN_BUDGET
+
+  def ViewArea(self, margin):
+    """Returns the map rect of the visible map grown by margin pixels on every side."""
+    return pygame.Rect(self.screen_offset, MAP_SIZE).inflate(2 * margin, 2 * margin)
+
+  def DespawnArea(self):
+    """Returns the map rect outside which spawned enemies are removed."""
+    return self.ViewArea(DESPAWN_MARGIN)
+
+  def UpdateEnemies(self):
+    """Update the enemies near the camera.  Call once per frame instead of enemy_group.update().
+
+    Which enemies update is decided up front from where they were at the end of the last
+    frame, so the same inputs always wake the same enemies on the same frame.  Enemies that
+    don't update are left exactly as they were, including walkers in the WalkerBatch.
+    """
+    self.frame += 1
+    if not SIMULATION_LOD:
+      classcost.UpdateGroup(self.enemy_group)
+      return
+    store = self.entities
+    self.sleeping_walkers.clear()
+    entities.ActivationSystem(store, self.ViewArea(ACTIVATION_MARGIN),
+                              self.ViewArea(DROWSY_MARGIN))
+    drowsy_turn = self.frame % DROWSY_INTERVAL == 0
+    updated = 0
+    # Enemies spawned during the loop are added to the store, and wait for the next frame.
+    for enemy, level in zip(list(store.sprites), store.activity[:]):
+      if level == entities.AWAKE or (level == entities.DROWSY and drowsy_turn):
+        if enemy.alive():
+          classcost.Update(enemy)
+          updated += 1
+      elif enemy.walker_slot is not None:
+        self.sleeping_walkers.add(enemy.walker_slot)
+    profiling.counters.Increment('enemies_updated', updated)
+    profiling.counters.Increment('enemies_asleep', len(store) - updated)
+
+  def EnemiesTouching(self, rect):
+    """Return the enemies whose hitboxes overlap a map rect, in enemy_group order."""
+    return self.entities.Overlapping(rect)
+
+  def UpdateEntities(self):
+    """Run the bulk entity systems.  Call once per frame after every enemy has moved."""
+    entities.TransformSystem(self.entities)
+    entities.DespawnSystem(self.entities, self.DespawnArea())
+    entities.DamageSystem(self.entities)
+    entities.AnimationSystem(self.entities)
+    profiling.counters.Increment('live_enemies', len(self.entities))
+    profiling.counters.Increment('live_spawned', self.LiveSpawnedCount())
+
+  def BuildPatrolSpans(self, top_row, feet_row):
+    """Work out the walkable floor spans for anything occupying rows top_row to feet_row.
+
+    A span is a run of columns that have solid ground under feet_row and no wall in any of
+    the rows from top_row to feet_row blocking movement from one column to the next.  Walls
+    can be one-way, so the limits are recorded separately for each direction.
 
-  def VisibleTiles(self):
+    Returns:
+      (left_limits, right_limits) lists indexed by column.  A box whose left edge is in column
+      c can move left as long as its left edge stays >= left_limits[c].  A box whose right edge
+      is in column c can move right as long as its right edge stays < right_limits[c].  These
+      are the same conditions Environment.IsMoveLegal() and IsTileSupported() would check.
+    """
+    rows = range(top_row, feet_row + 1)
+    inside = 0 <= top_row and feet_row < self.height
+    supported = []
+    blocks_left = []
+    blocks_right = []
+    for col in range(self.width):
+      if feet_row + 1 >= self.height:
+        supported.append(True)
+      else:
+        supported.append(feet_row + 1 >= 0 and self.grid[col][feet_row + 1].solid_top)
+      # Tiles outside the room are solid.
+      blocks_left.append(not inside or any(self.grid[col][row].solid_right for row in rows))
+      blocks_right.append(not inside or any(self.grid[col][row].solid_left for row in rows))
+
+    left_limits = [0] * self.width
+    bound = 0
+    for col in range(self.width):
+      if not supported[col]:
+        bound = (col + 1) * TILE_WIDTH
+      left_limits[col] = bound
+      if blocks_left[col]:
+        bound = (col + 1) * TILE_WIDTH
+    right_limits = [0] * self.width
+    bound = self.width * TILE_WIDTH
+    for col in reversed(range(self.width)):
+      if not supported[col]:
+        bound = col * TILE_WIDTH
+      right_limits[col] = bound
+      if blocks_right[col]:
+        bound = col * TILE_WIDTH
+    return left_limits, right_limits
+
+  def PatrolLimits(self, left, top, right, bottom):
+    """Returns (min_left, max_right) pixel limits for a grounded box walking on its platform.
+
+    The box should turn around rather than move its left edge below min_left or its right edge
+    to max_right or beyond.  Returns None if the box is partly outside the room, in which case
+    the caller has to check the move against the tiles itself.
+    """
+    left_col = math.floor(left / TILE_WIDTH)
+    right_col = math.floor(right / TILE_WIDTH)
+    if left_col < 0 or right_col >= self.width:
+      return None
+    key = (math.floor(top / TILE_HEIGHT), math.floor(bottom / TILE_HEIGHT))
+    spans = self.patrol_spans.get(key)
+    if spans is None:
+      spans = self.BuildPatrolSpans(*key)
+      self.patrol_spans[key] = spans
+    return spans[0][left_col], spans[1][right_col]
+
+  def AdvanceWalkers(self):
+    """Move every batched walking enemy.  Call once per frame, after updating enemy_group."""
+    if self.walkers is not None:
+      self.walkers.Advance(skip=self.sleeping_walkers)
+
+  def VisibleTiles(self, offset=None):
     """Returns the indexes of the currently visible tiles.
 
+    Args:
+      offset: (x, y) screen offset to use instead of screen_offset.
+
     Return tuple is ((first_column, last_column), (first_row, last_row)) for the visible area.
     """
-    first_x = int(self.screen_offset[0] / TILE_WIDTH)
+    if offset is None:
+      offset = self.screen_offset
+    first_x = int(offset[0] / TILE_WIDTH)
     last_x = first_x + int(MAP_WIDTH / TILE_WIDTH)
-    first_y = int(self.screen_offset[1] / TILE_HEIGHT)
+    first_y = int(offset[1] / TILE_HEIGHT)
     last_y = first_y + int(MAP_HEIGHT / TILE_HEIGHT)
     return ((first_x, last_x), (first_y, last_y))
 
-  def GetImage(self):
-    """Get the pygame.Surface for the portion of the environment currently in the game window."""
-    if self.dirty:
+  def GetImage(self, offset=None):
+    """Get the pygame.Surface for the portion of the environment currently in the game window.
+
+    Args:
+      offset: (x, y) screen offset to draw the window at instead of screen_offset, e.g. when
+        the camera is being interpolated between two simulation steps.
+    """
+    offset = tuple(self.screen_offset if offset is None else offset)
+    if self.dirty or offset != self.surface_offset:
       self.surface.fill(self.bg_color)
       # Figure out which tiles fit in the current window
-      (first_x, last_x), (first_y, last_y) = self.VisibleTiles()
-      x_pixel_start = self.screen_offset[0] % TILE_WIDTH
-      y_pixel_start = self.screen_offset[1] % TILE_HEIGHT
+      (first_x, last_x), (first_y, last_y) = self.VisibleTiles(offset)
+      x_pixel_start = offset[0] % TILE_WIDTH
+      y_pixel_start = offset[1] % TILE_HEIGHT
 
       for col in range(first_x, last_x + 1):
         if col >= len(self.grid):
@@ -254,6 +521,7 @@ class Environment(object):
               print(col, row, type(self.grid[col][row]))
 
       self.dirty = False
+      self.surface_offset = offset
     return self.surface
 
   def AttemptMove(self, sprite, vector):
@@ -311,7 +579,10 @@ class Environment(object):
     This is a simplified version of AttemptMove() for projectiles, and moving off the screen
     is illegal.  This shouldn't be used for the player.
     """
-    hitbox = sprite.Hitbox()
+    return self.IsRectMoveLegal(sprite.Hitbox(), vector)
+
+  def IsRectMoveLegal(self, hitbox, vector):
+    """IsMoveLegal() for a map rect rather than a sprite."""
     dest = hitbox.move(vector)
     # Figure out which tiles contain the old and new position.
     old_tiles = self.TilesForRect(hitbox)
@@ -343,6 +614,110 @@ class Environment(object):
       
     return True
     
+  def PredictImpact(self, hitbox, vector):
+    """Find how long a rect moving in a straight line can go before it hits a wall.
+
+    The rect only enters new tiles when one of its leading edges crosses a tile boundary, so
+    this steps from one crossing to the next (a DDA traversal of the grid) rather than checking
+    every frame.  Tiles outside the room are solid, so anything that moves hits eventually.
+
+    Args:
+      hitbox: pygame.Rect map position of the moving rect at frame 0.
+      vector: (x, y) movement per frame.
+
+    Returns:
+      The int number of frames k such that moving by vector from hitbox.move(k * vector) is
+      the first illegal move, the same as IsRectMoveLegal() would find checking every frame.
+      Returns None if vector is (0, 0).
+    """
+    vx, vy = vector
+    if vx == 0 and vy == 0:
+      return None
+    lead_x = hitbox.right if vx > 0 else hitbox.left
+    lead_y = hitbox.bottom if vy > 0 else hitbox.top
+    frame = 0
+    while True:
+      profiling.counters.Increment('raycast_steps')
+      frame = min(self._NextCrossing(lead_x, vx, TILE_WIDTH, frame),
+                  self._NextCrossing(lead_y, vy, TILE_HEIGHT, frame))
+      if not self.IsRectMoveLegal(hitbox.move(frame * vx, frame * vy), vector):
+        return frame
+      frame += 1
+
+  @staticmethod
+  def _NextCrossing(lead, speed, tile_size, frame):
+    """Returns the first frame >= frame on which an edge moving at speed enters a new tile."""
+    if speed == 0:
+      return float('inf')
+    position = lead + frame * speed
+    if speed > 0:
+      boundary = (position // tile_size + 1) * tile_size
+      return frame - (-(boundary - position) // speed) - 1
+    boundary = (position // tile_size) * tile_size
+    return frame + (position - boundary) // -speed
+
+  def CastRay(self, start, end):
+    """Walk the tiles on the line from start to end and find the first one that blocks it.
+
+    A tile blocks the ray if it is solid on the side the ray enters it from, the same rule
+    used for movement, so one-way platforms only block from one side.  The tile containing
+    start is ignored.
+
+    Args:
+      start: (x, y) map coordinate the ray starts from.
+      end: (x, y) map coordinate the ray ends at.
+
+    Returns:
+      The (col, row) of the blocking tile, or None if nothing is in the way.
+    """
+    profiling.counters.Increment('raycasts')
+    x, y = start
+    dx = end[0] - x
+    dy = end[1] - y
+    col = math.floor(x / TILE_WIDTH)
+    row = math.floor(y / TILE_HEIGHT)
+    # Fraction of the way along the ray at which it next crosses a column or row boundary,
+    # and how far along it has to go to cross a whole tile.
+    if dx > 0:
+      next_x = ((col + 1) * TILE_WIDTH - x) / dx
+      delta_x = TILE_WIDTH / dx
+    elif dx < 0:
+      next_x = (x - col * TILE_WIDTH) / -dx
+      delta_x = TILE_WIDTH / -dx
+    else:
+      next_x = delta_x = float('inf')
+    if dy > 0:
+      next_y = ((row + 1) * TILE_HEIGHT - y) / dy
+      delta_y = TILE_HEIGHT / dy
+    elif dy < 0:
+      next_y = (y - row * TILE_HEIGHT) / -dy
+      delta_y = TILE_HEIGHT / -dy
+    else:
+      next_y = delta_y = float('inf')
+
+    while min(next_x, next_y) <= 1:
+      crossed_column = next_x < next_y
+      if crossed_column:
+        col += 1 if dx > 0 else -1
+        next_x += delta_x
+      else:
+        row += 1 if dy > 0 else -1
+        next_y += delta_y
+      if col < 0 or col >= self.width or row < 0 or row >= self.height:
+        return (col, row)
+      square = self.grid[col][row]
+      if crossed_column:
+        blocked = square.solid_left if dx > 0 else square.solid_right
+      else:
+        blocked = square.solid_top if dy > 0 else square.solid_bottom
+      if blocked:
+        return (col, row)
+    return None
+
+  def HasLineOfSight(self, start, end):
+    """Return True if no wall blocks the straight line between two map coordinates."""
+    return self.CastRay(start, end) is None
+
   def TilesForRect(self, rect):
     """Returns a set of tiles that a rect falls in.
 
@@ -0,0 +1,214 @@
+"""
+An in-game profiler that times each phase of every frame.
+
+The main loop calls profiler.BeginFrame() at the start of a frame and profiler.Mark(phase)
+after each phase of it, which charges the time since the previous mark to that phase.  When
+the frame has been shown, profiler.EndFrame() saves the phase times, with the number of
+sprites in each group and the dirty rects that were updated, to a ring buffer holding the
+last HISTORY frames.  None of this happens unless the profiler is recording, so the marks
+cost next to nothing normally.
+
+Pressing OVERLAY_KEY during the game shows an overlay with the averages over the last
+AVERAGE_FRAMES frames, and starts recording if it wasn't already.  The ring buffer can also
+be saved to a JSON file with "python worldtree.py --frame-profile FILE", which records the
+whole game.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import collections
+import json
+import os
+import time
+
+import pygame
+
+from game_constants import *
+
+# Phases of a frame, in the order they're shown.  Each simulation step in a frame adds to the
+# input, collision, update and bookkeeping phases.
+INPUT = 'input'
+COLLISIONS = 'collisions'
+UPDATE_PLAYER = 'update player'
+UPDATE_ENEMIES = 'update enemies'
+UPDATE_WALKERS = 'update walkers'
+UPDATE_ENTITIES = 'update entities'
+UPDATE_ITEMS = 'update items'
+UPDATE_DYING = 'update dying'
+UPDATE_HERO_SHOTS = 'update hero shots'
+UPDATE_ENEMY_SHOTS = 'update enemy shots'
+BOOKKEEPING = 'bookkeeping'  # Saving positions for interpolation, counters and transitions.
+GET_IMAGE = 'GetImage'
+DRAW = 'draw'
+STATUS = 'status bar'
+OVERLAY = 'overlay'
+DISPLAY = 'display.update'
+PHASES = (INPUT, COLLISIONS, UPDATE_PLAYER, UPDATE_ENEMIES, UPDATE_WALKERS, UPDATE_ENTITIES,
+          UPDATE_ITEMS, UPDATE_DYING, UPDATE_HERO_SHOTS, UPDATE_ENEMY_SHOTS, BOOKKEEPING,
+          GET_IMAGE, DRAW, STATUS, OVERLAY, DISPLAY)
+
+# Frames kept in the ring buffer.
+HISTORY = 600
+# Frames the overlay averages over, and how often it's redrawn.
+AVERAGE_FRAMES = 30
+OVERLAY_REFRESH = 10
+OVERLAY_KEY = pygame.K_F3
+OVERLAY_FONT_SIZE = 8
+OVERLAY_LINE_HEIGHT = 11
+OVERLAY_ALPHA = 192
+COUNTS_PER_LINE = 3
+SCREEN_AREA = SCREEN_WIDTH * SCREEN_HEIGHT
+
+
+class FrameRecord(object):
+  """Where the time went in one frame.
+
+  Attributes:
+    phases: dict of phase name to milliseconds spent in it.
+    steps: int number of simulation steps run in the frame.
+    counts: dict of sprite group name to the number of sprites in it at the end of the frame.
+    dirty_rects: int number of rects updated on the display.
+    dirty_area: int pixels in the updated rects.  Pixels in more than one rect are counted
+      more than once, as the display counts them.
+  """
+
+  def __init__(self):
+    self.phases = {}
+    self.steps = 0
+    self.counts = {}
+    self.dirty_rects = 0
+    self.dirty_area = 0
+
+  def Total(self):
+    """Returns the milliseconds spent in every phase together."""
+    return sum(self.phases.values())
+
+  def ToDict(self):
+    return {'phases': self.phases, 'steps': self.steps, 'counts': self.counts,
+            'dirty_rects': self.dirty_rects, 'dirty_area': self.dirty_area}
+
+
+class FrameProfiler(object):
+  """Times the phases of frames and keeps the last HISTORY of them.
+
+  Attributes:
+    recording: bool, whether frames are being timed.
+    visible: bool, whether the overlay is being drawn.
+    history: collections.deque of the last HISTORY FrameRecords, oldest first.
+    current: FrameRecord of the frame in progress, or None if no frame is being timed.
+    last_mark: float time.perf_counter() of the last BeginFrame() or Mark().
+    panel: pygame.Surface of the overlay, or None if it needs to be drawn.
+    font: pygame.font.Font for the overlay, loaded the first time it's drawn.
+  """
+
+  def __init__(self):
+    self.recording = False
+    self.visible = False
+    self.history = collections.deque(maxlen=HISTORY)
+    self.current = None
+    self.last_mark = 0.0
+    self.panel = None
+    self.font = None
+
+  def BeginFrame(self):
+    """Start timing a frame, if recording."""
+    if self.recording:
+      self.current = FrameRecord()
+      self.last_mark = time.perf_counter()
+
+  def Mark(self, phase):
+    """Charge the time since the last mark to a phase of the current frame."""
+    if self.current is None:
+      return
+    now = time.perf_counter()
+    phases = self.current.phases
+    phases[phase] = phases.get(phase, 0.0) + (now - self.last_mark) * 1000
+    self.last_mark = now
+
+  def EndFrame(self, steps, counts, dirty_rects):
+    """Finish timing a frame and add it to the history.
+
+    Args:
+      steps: int number of simulation steps run in the frame.
+      counts: iterable of (group name, number of sprites) pairs.
+      dirty_rects: list of the screen Rects updated on the display this frame.
+    """
+    record = self.current
+    if record is None:
+      return
+    self.current = None
+    record.steps = steps
+    record.counts = dict(counts)
+    record.dirty_rects = len(dirty_rects)
+    screen = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+    for rect in dirty_rects:
+      clipped = screen.clip(rect)
+      record.dirty_area += clipped.width * clipped.height
+    self.history.append(record)
+    if len(self.history) % OVERLAY_REFRESH == 0:
+      self.panel = None
+
+  def Toggle(self):
+    """Show or hide the overlay.  Showing it starts recording."""
+    self.visible = not self.visible
+    if self.visible:
+      self.recording = True
+    self.panel = None
+
+  def Averages(self, frames=AVERAGE_FRAMES):
+    """Returns a FrameRecord of the averages over the last few frames."""
+    records = list(self.history)[-frames:]
+    average = FrameRecord()
+    if not records:
+      return average
+    for record in records:
+      for phase, ms in record.phases.items():
+        average.phases[phase] = average.phases.get(phase, 0.0) + ms / len(records)
+      for name, count in record.counts.items():
+        average.counts[name] = average.counts.get(name, 0) + count / float(len(records))
+      average.steps += record.steps / float(len(records))
+      average.dirty_rects += record.dirty_rects / float(len(records))
+      average.dirty_area += record.dirty_area / float(len(records))
+    return average
+
+  def Lines(self):
+    """Returns the overlay's text, as a list of lines."""
+    average = self.Averages()
+    lines = ['frame {:6.2f}ms  steps {:.1f}'.format(average.Total(), average.steps)]
+    for phase in PHASES:
+      if phase in average.phases:
+        lines.append('{:18} {:6.2f}ms'.format(phase, average.phases[phase]))
+    counts = ['{} {:.0f}'.format(name, count) for name, count in average.counts.items()]
+    for i in range(0, len(counts), COUNTS_PER_LINE):
+      lines.append('  '.join(counts[i:i + COUNTS_PER_LINE]))
+    lines.append('dirty rects {:.0f}  area {:.0%}'.format(average.dirty_rects,
+                                                        average.dirty_area / SCREEN_AREA))
+    return lines
+
+  def Draw(self, surface):
+    """Draw the overlay in the top left corner of the map.
+
+    Returns:
+      The Rect of the surface that was drawn to.
+    """
+    if self.panel is None:
+      if self.font is None:
+        self.font = pygame.font.Font(os.path.join('media', 'font', FONT), OVERLAY_FONT_SIZE)
+      lines = [self.font.render(line, False, WHITE) for line in self.Lines()]
+      width = max(line.get_width() for line in lines) + 8
+      self.panel = pygame.Surface((width, len(lines) * OVERLAY_LINE_HEIGHT + 6))
+      self.panel.set_alpha(OVERLAY_ALPHA)
+      for i, line in enumerate(lines):
+        self.panel.blit(line, (4, 4 + i * OVERLAY_LINE_HEIGHT))
+    return surface.blit(self.panel, MAP_POSITION)
+
+  def Save(self, path):
+    """Write the frames in the ring buffer to a JSON file, oldest first."""
+    with open(path, 'w') as output:
+      json.dump({'phases': PHASES, 'frames': [record.ToDict() for record in self.history]},
+                output, indent=1)
+
+
+profiler = FrameProfiler()
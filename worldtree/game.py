@@ -0,0 +1,533 @@
+"""
+The main game loop, with the simulation run at a fixed rate independent of rendering.
+
+Game.Run() keeps an accumulator of real time.  Each pass through the loop it runs as many
+simulation steps of STEP_SECONDS as have built up (but no more than MAX_CATCH_UP_STEPS), then
+draws one frame with every sprite and the camera interpolated between where they were before
+and after the last step.  A slow frame, a room load or a blocking sound therefore no longer
+slows the game down, and rendering can run at whatever rate the display wants.
+
+Run() paces frames with a pygame Clock.  RunAsync() runs the same frames as an asyncio task, and
+spends the time left over before the next frame is due on background tasks (see background.py).
+
+Item jingles and the end of the game pause the simulation while a sound plays.  These are
+states of the Game rather than waits: the loop keeps handling events and drawing frames, and
+counts down the pause one step at a time.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import asyncio
+import math
+import os
+import time
+
+import pygame
+
+import allocations
+import audio
+from characters import character
+from characters import hero
+from characters import powerup
+import classcost
+import environment
+import frameprofiler
+from frameprofiler import profiler
+from game_constants import *
+import gcpolicy
+import map_transitions
+import profiling
+import snapshot
+import spikes
+import statusbar
+import surfacememory
+import titlescreen
+
+# Simulation steps per second.  All of the game's movement constants are per step.
+SIMULATION_RATE = 60
+STEP_SECONDS = 1.0 / SIMULATION_RATE
+# Most steps to run before drawing a frame.  If the game falls further behind than this, the
+# extra time is dropped rather than spiralling into ever longer catch-up frames.
+MAX_CATCH_UP_STEPS = 5
+# Frames per second to draw at.  0 draws as fast as possible.
+RENDER_RATE = 60
+# Sprites that move further than this in one step (e.g. a recycled projectile) are drawn
+# where they are rather than interpolated.
+MAX_INTERPOLATION_DISTANCE = TILE_WIDTH
+
+# If True, dying restarts the game from the snapshot taken when the player entered the room,
+# rather than going back to the title screen.  Off by default, so death ends the game as it
+# always has; the benchmark harnesses turn it on so a death doesn't cut a run short.
+RESTART_FROM_CHECKPOINT = False
+
+# Values for Game.state.
+PLAYING = 0  # The simulation is running.
+FANFARE = 1  # Paused while an item jingle plays.
+GAME_OVER = 2  # The player has died.  The game ends once the death sound finishes.
+VICTORY = 3  # The boss has died.  The credits roll once the victory music finishes.
+
+
+def Lerp(start, end, alpha):
+  return start + (end - start) * alpha
+
+
+def StepsToPlay(channel):
+  """Returns the most simulation steps the sound playing on a channel can take to finish."""
+  if channel is None or channel.get_sound() is None:
+    return 0
+  return int(math.ceil(channel.get_sound().get_length() * SIMULATION_RATE))
+
+
+class Game(object):
+  """A game in progress: the current room, the player and the loop that runs them.
+
+  Attributes:
+    screen: pygame.Surface for the display.
+    env: Environment for the current room.
+    region: int region of the current room.
+    room: str name of the current room.
+    player: hero.Hero controlled by the player.
+    player_group: pygame.sprite.RenderUpdates holding the player while he's alive.
+    status: statusbar.Statusbar drawn above the map.
+    song: str filename of the music playing, or None.
+    previous_offset: tuple of env.screen_offset before the last simulation step.
+    previous_positions: dict of sprite to its (x, y) map position before the last simulation
+      step, for interpolating.
+    drawn_rects: list of screen Rects sprites were drawn to in the last frame.
+    steps: int number of simulation steps run so far.
+    state: PLAYING, FANFARE, GAME_OVER or VICTORY.
+    channel: pygame.mixer.Channel playing the sound the current pause is waiting for, or None.
+    pause_steps: int steps left before the current pause ends even if the sound hasn't.
+    checkpoint: bytes snapshot from when the player entered the current room, or None.
+    accumulator: float seconds of real time that haven't been simulated yet.
+    last_time: float time.perf_counter() when the last frame started.
+  """
+
+  # Names of the groups returned by Groups(), for the frame profiler.
+  GROUP_NAMES = ('player', 'items', 'enemies', 'hero shots', 'enemy shots', 'dying')
+
+  def __init__(self, screen, room='Map1', region=1, position=(2, 10)):
+    gcpolicy.manager.GameStarting()
+    self.screen = screen
+    self.room = room
+    self.region = region
+    self.env = environment.Environment(room, region)
+    self.player = hero.Hero(self.env, position=position)
+    self.player_group = pygame.sprite.RenderUpdates(self.player)
+    self.status = statusbar.Statusbar(self.player)
+    self.song = None
+    self.previous_offset = tuple(self.env.screen_offset)
+    self.previous_positions = {}
+    self.drawn_rects = []
+    self.steps = 0
+    self.state = PLAYING
+    self.channel = None
+    self.pause_steps = 0
+    self.accumulator = 0.0
+    self.last_time = None
+    self.checkpoint = None
+
+  def Groups(self):
+    """Returns the sprite groups to draw, in drawing order."""
+    return (self.player_group, self.env.item_group, self.env.enemy_group,
+            self.env.hero_projectile_group, self.env.enemy_projectile_group,
+            self.env.dying_animation_group)
+
+  def Start(self):
+    """Draw the first frame and start the music."""
+    self.screen.blit(self.env.GetImage(), MAP_POSITION)
+    self.env.item_group.draw(self.screen)
+    self.player_group.draw(self.screen)
+    self.env.enemy_group.draw(self.screen)
+    self.screen.blit(self.status.GetImage(), (0, 0))
+    pygame.display.flip()
+    self.PlayMusic()
+    self.accumulator = 0.0
+    self.last_time = time.perf_counter()
+    self.checkpoint = snapshot.Capture(self)
+    gcpolicy.manager.RoomLoaded()
+    if surfacememory.CHECK_ON_ROOM_CHANGE:
+      surfacememory.registry.Check(self)
+
+  def PlayMusic(self):
+    """Start the current room's song, unless it's already playing."""
+    if self.room in environment.SONGS_BY_ROOM[self.region]:
+      new_song = environment.SONGS_BY_ROOM[self.region][self.room]
+      if new_song != self.song:
+        if self.song is not None:
+          audio.music.fadeout(250)
+        self.song = new_song
+        audio.music.load(os.path.join('media', 'music', self.song))
+        audio.music.play(-1)
+    else:
+      audio.music.stop()
+
+  def Run(self):
+    """Run the game until the window is closed."""
+    self.Start()
+    clock = pygame.time.Clock()
+    while self.Frame():
+      if RENDER_RATE:
+        gcpolicy.manager.Idle(1.0 / RENDER_RATE - (time.perf_counter() - self.last_time))
+      clock.tick(RENDER_RATE)
+
+  async def RunAsync(self, background=()):
+    """Run the game until the window is closed, from inside an asyncio event loop.
+
+    Frames are run exactly as by Run(), so the simulation is just as deterministic.  Instead of
+    sleeping until the next frame is due, the loop awaits, which lets background tasks run.
+    Background tasks must only read the game's state, and should await often.
+
+    Args:
+      background: list of coroutine functions taking the Game, run as tasks until the game ends.
+    """
+    self.Start()
+    tasks = [asyncio.ensure_future(task(self)) for task in background]
+    try:
+      next_frame = time.perf_counter()
+      while self.Frame():
+        now = time.perf_counter()
+        if RENDER_RATE:
+          # Don't try to make up for frames that ran long.
+          next_frame = max(next_frame + 1.0 / RENDER_RATE, now)
+        else:
+          next_frame = now
+        gcpolicy.manager.Idle(next_frame - now)
+        await asyncio.sleep(next_frame - time.perf_counter())
+    finally:
+      for task in tasks:
+        task.cancel()
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+  def Frame(self):
+    """Run the simulation steps that are due, then draw a frame.
+
+    Returns:
+      False if the window has been closed, otherwise True.
+    """
+    gcpolicy.manager.BeginFrame()
+    spikes.catcher.BeginFrame()
+    allocations.tracker.BeginFrame()
+    profiler.BeginFrame()
+    try:
+      for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+          return False
+        if event.type == pygame.KEYDOWN and event.key == frameprofiler.OVERLAY_KEY:
+          profiler.Toggle()
+          # Redraw the whole map to clear the overlay away.
+          self.env.dirty = True
+      profiler.Mark(frameprofiler.INPUT)
+      now = time.perf_counter()
+      self.accumulator += now - self.last_time
+      self.last_time = now
+      steps = 0
+      while self.accumulator >= STEP_SECONDS and steps < MAX_CATCH_UP_STEPS:
+        self.Tick()
+        self.accumulator -= STEP_SECONDS
+        steps += 1
+      if self.accumulator >= STEP_SECONDS:
+        profiling.counters.Increment('dropped_steps', int(self.accumulator / STEP_SECONDS))
+        self.accumulator %= STEP_SECONDS
+      profiler.Mark(frameprofiler.BOOKKEEPING)
+      dirty_rects = self.Render(self.accumulator / STEP_SECONDS)
+      if profiler.visible:
+        dirty_rects.append(profiler.Draw(self.screen))
+        profiler.Mark(frameprofiler.OVERLAY)
+      self.Present(dirty_rects)
+      profiler.Mark(frameprofiler.DISPLAY)
+      if profiler.recording:
+        profiler.EndFrame(steps, zip(self.GROUP_NAMES, map(len, self.Groups())), dirty_rects)
+    finally:
+      # Tick() ends the game by raising GameOverException or GameWonException, and the frame
+      # has to be closed then too, or its profile, allocation trace and gc pauses would carry
+      # on into whatever runs next.
+      spikes.catcher.EndFrame(self)
+      allocations.EndFrame()
+      gcpolicy.manager.EndFrame()
+    classcost.accountant.EndFrame(self.region, self.room)
+    return True
+
+  def SavePositions(self):
+    """Remember where everything is, so frames can be drawn between this step and the next."""
+    offset_x, offset_y = self.env.screen_offset
+    self.previous_offset = (offset_x, offset_y)
+    self.previous_positions = dict(
+        (sprite, (sprite.rect.x + offset_x, sprite.rect.y + offset_y))
+        for group in self.Groups() for sprite in group)
+
+  def Tick(self):
+    """Advance the game by one fixed step: a simulation step, or a step of the current pause."""
+    if self.state == PLAYING:
+      self.Step()
+      return
+    # Nothing moves, so draw everything where it is.
+    self.SavePositions()
+    self.pause_steps -= 1
+    profiling.counters.Increment('paused_steps')
+    if self.pause_steps > 0 and self.channel is not None and self.channel.get_busy():
+      return
+    state = self.state
+    self.state = PLAYING
+    self.channel = None
+    if state == FANFARE:
+      audio.music.unpause()
+    elif state == GAME_OVER:
+      if not RESTART_FROM_CHECKPOINT or self.checkpoint is None:
+        raise GameOverException()
+      self.Restore(self.checkpoint)
+    elif state == VICTORY:
+      print('You won!')
+      titlescreen.ShowCredits(self.screen)
+      raise GameOverException()
+
+  def Pause(self, state, channel):
+    """Stop the simulation until the sound on a channel finishes.
+
+    Args:
+      state: FANFARE, GAME_OVER or VICTORY.
+      channel: pygame.mixer.Channel playing the sound, or None to pause for one step.
+    """
+    self.state = state
+    self.channel = channel
+    self.pause_steps = max(StepsToPlay(channel), 1)
+
+  def PlayFanfare(self, sound):
+    """Play an item jingle with the music and the game paused."""
+    audio.music.pause()
+    self.Pause(FANFARE, sound.play())
+
+  def Step(self):
+    """Advance the simulation by one fixed step.
+
+    Records the collision_ms and update_ms frame counters, and marks the frame profiler's
+    simulation phases.
+    """
+    self.SavePositions()
+    profiler.Mark(frameprofiler.BOOKKEEPING)
+    env = self.env
+    player = self.player
+    start = time.perf_counter()
+    env.SenseEnemies(player)
+    if character.PRECISE_COLLISIONS:
+      collisions = pygame.sprite.spritecollide(player, env.enemy_group, False,
+                                               collided=character.CollideCharacters)
+    else:
+      collisions = env.EnemiesTouching(player.Hitbox())
+    for enemy in collisions:
+      player.CollideWith(enemy)
+    item_pickups = pygame.sprite.spritecollide(player, env.item_group, False,
+                                               collided=powerup.CollideSprites)
+    for item in item_pickups:
+      item.PickUp(player)
+    for hazard in env.HazardsForRect(player.Hitbox()):
+      hazard.Use(player)
+    for bullet in env.hero_projectile_group:
+      hit_enemies = pygame.sprite.spritecollide(bullet, env.enemy_group, False)
+      for enemy in hit_enemies:
+        bullet.CollideWith(enemy)
+        bullet.kill()
+    bullets = pygame.sprite.spritecollide(player, env.enemy_projectile_group, False)
+    for bullet in bullets:
+      bullet.CollideWith(player)
+      bullet.kill()
+    collided = time.perf_counter()
+    profiler.Mark(frameprofiler.COLLISIONS)
+    player.HandleInput()
+    profiler.Mark(frameprofiler.INPUT)
+    classcost.UpdateGroup(self.player_group)
+    profiler.Mark(frameprofiler.UPDATE_PLAYER)
+    env.UpdateEnemies()
+    profiler.Mark(frameprofiler.UPDATE_ENEMIES)
+    env.AdvanceWalkers()
+    profiler.Mark(frameprofiler.UPDATE_WALKERS)
+    env.UpdateEntities()
+    profiler.Mark(frameprofiler.UPDATE_ENTITIES)
+    classcost.UpdateGroup(env.item_group)
+    profiler.Mark(frameprofiler.UPDATE_ITEMS)
+    try:
+      classcost.UpdateGroup(env.dying_animation_group)
+    except GameOverException as e:
+      self.Pause(GAME_OVER, e.channel)
+    except GameWonException as e:
+      self.Pause(VICTORY, e.channel)
+    profiler.Mark(frameprofiler.UPDATE_DYING)
+    classcost.UpdateGroup(env.hero_projectile_group)
+    profiler.Mark(frameprofiler.UPDATE_HERO_SHOTS)
+    classcost.UpdateGroup(env.enemy_projectile_group)
+    profiler.Mark(frameprofiler.UPDATE_ENEMY_SHOTS)
+    updated = time.perf_counter()
+    profiling.counters.Increment('collision_ms', (collided - start) * 1000)
+    profiling.counters.Increment('update_ms', (updated - collided) * 1000)
+    self.steps += 1
+    profiling.counters.EndFrame()
+    if (profiling.REPORT_INTERVAL
+        and profiling.counters.frames % profiling.REPORT_INTERVAL == 0):
+      print(profiling.counters.Report())
+    if env.fanfare is not None:
+      if self.state == PLAYING:
+        self.PlayFanfare(env.fanfare)
+      env.fanfare = None
+    self.CheckTransition()
+
+  def Render(self, alpha):
+    """Draw a frame to the screen without showing it.
+
+    Args:
+      alpha: float from 0 to 1, how far to draw things between their positions before and
+        after the last simulation step.
+
+    Returns:
+      A list of the screen Rects that need to be updated on the display.
+    """
+    env = self.env
+    camera = (round(Lerp(self.previous_offset[0], env.screen_offset[0], alpha)),
+              round(Lerp(self.previous_offset[1], env.screen_offset[1], alpha)))
+    refresh_map = env.dirty or camera != env.surface_offset
+    self.screen.fill(BLACK)
+    self.screen.blit(env.GetImage(camera), MAP_POSITION)
+    profiler.Mark(frameprofiler.GET_IMAGE)
+    drawn_rects = []
+    for group in self.Groups():
+      for sprite in group:
+        x = sprite.rect.x + env.screen_offset[0]
+        y = sprite.rect.y + env.screen_offset[1]
+        previous = self.previous_positions.get(sprite)
+        if (previous is not None and abs(x - previous[0]) <= MAX_INTERPOLATION_DISTANCE
+            and abs(y - previous[1]) <= MAX_INTERPOLATION_DISTANCE):
+          x = round(Lerp(previous[0], x, alpha))
+          y = round(Lerp(previous[1], y, alpha))
+        drawn_rects.append(classcost.Draw(self.screen, sprite, (x - camera[0], y - camera[1])))
+    if refresh_map:
+      dirty_rects = [pygame.Rect(MAP_POSITION[0], MAP_POSITION[1], MAP_WIDTH, MAP_HEIGHT)]
+    else:
+      # Cover where sprites were last frame as well as where they are now.  The extra margin
+      # is because the drawn rects don't always cover the whole sprite for the main character
+      # when moving.
+      dirty_rects = [rect.inflate(6, 6) for rect in self.drawn_rects + drawn_rects]
+    self.drawn_rects = drawn_rects
+    profiler.Mark(frameprofiler.DRAW)
+    self.screen.blit(self.status.GetImage(), (0, 0))
+    if self.status.dirty:
+      dirty_rects.append(pygame.Rect(0, 0, SCREEN_WIDTH, MAP_Y))
+      self.status.dirty = False
+    profiler.Mark(frameprofiler.STATUS)
+    if len(self.player_group) == 0:
+      # Player is dead
+      font = pygame.font.Font(os.path.join('media', 'font', FONT), 24)
+      game_over_text = font.render('Game Over', False, WHITE)
+      game_over_text_box = game_over_text.get_rect()
+      game_over_text_box.centerx = SCREEN_WIDTH / 2
+      game_over_text_box.centery = SCREEN_HEIGHT / 2
+      self.screen.blit(game_over_text, game_over_text_box)
+      dirty_rects.append(game_over_text_box)
+      profiler.Mark(frameprofiler.DRAW)
+    return dirty_rects
+
+  def Present(self, dirty_rects):
+    """Show the parts of the rendered frame that changed."""
+    pygame.display.update(dirty_rects)
+
+  def CheckTransition(self):
+    """Check if the player is leaving the room, and if so move him to the next one."""
+    env = self.env
+    if not env.IsOutsideMap(self.player.Fallbox()):
+      return
+    # Use the character's center to determine when they leave the map, but for all other
+    # positioning use their upper left corner for precision.
+    hitbox = self.player.Hitbox()
+    tile_x, tile_y = env.TileIndexForPoint(hitbox.centerx, hitbox.centery)
+    ul_x, ul_y = env.TileIndexForPoint(hitbox.left, hitbox.top)
+    transitions = map_transitions.transitions[self.region][self.room]
+    new_room = None
+    new_region = None
+    if tile_x < 0:
+      for trans in transitions.get(LEFT, []):
+        if ul_y >= trans.first and ul_y <= trans.last:
+          new_room = trans.dest
+          new_region = trans.region
+          new_map = environment.REGIONS[new_region][new_room]
+          x_pos = new_map['width'] - 1
+          y_pos = ul_y + trans.offset
+          screen_offset_x = new_map['width'] * TILE_WIDTH - MAP_WIDTH
+          screen_offset_y = min(new_map['height'] * TILE_HEIGHT - MAP_HEIGHT,
+                                max(env.screen_offset[1] + trans.offset * TILE_HEIGHT, 0))
+    elif tile_x >= env.width:
+      for trans in transitions.get(RIGHT, []):
+        if ul_y >= trans.first and ul_y <= trans.last:
+          new_room = trans.dest
+          new_region = trans.region
+          new_map = environment.REGIONS[new_region][new_room]
+          x_pos = 0
+          y_pos = ul_y + trans.offset
+          screen_offset_x = 0
+          screen_offset_y = min(new_map['height'] * TILE_HEIGHT - MAP_HEIGHT,
+                                max(env.screen_offset[1] + trans.offset * TILE_HEIGHT, 0))
+    elif tile_y < 0:
+      for trans in transitions.get(UP, []):
+        if ul_x >= trans.first and ul_x <= trans.last:
+          new_room = trans.dest
+          new_region = trans.region
+          new_map = environment.REGIONS[new_region][new_room]
+          x_pos = ul_x + trans.offset
+          y_pos = new_map['height'] - 1
+          screen_offset_x = min(new_map['width'] * TILE_WIDTH - MAP_WIDTH,
+                                max(env.screen_offset[0] + trans.offset * TILE_WIDTH, 0))
+          screen_offset_y = new_map['height'] * TILE_HEIGHT - MAP_HEIGHT
+    elif tile_y >= env.height:
+      for trans in transitions.get(DOWN, []):
+        if ul_x >= trans.first and ul_x <= trans.last:
+          new_room = trans.dest
+          new_region = trans.region
+          new_map = environment.REGIONS[new_region][new_room]
+          x_pos = ul_x + trans.offset
+          y_pos = 0
+          screen_offset_x = min(new_map['width'] * TILE_WIDTH - MAP_WIDTH,
+                                max(env.screen_offset[0] + trans.offset * TILE_WIDTH, 0))
+          screen_offset_y = 0
+
+    if new_room is not None:
+      self.ChangeRooms(new_room, new_region, (x_pos, y_pos),
+                       (screen_offset_x, screen_offset_y))
+      self.checkpoint = snapshot.Capture(self)
+
+  def ChangeRooms(self, room, region, position, screen_offset):
+    """Load a new room and put the player in it.
+
+    Args:
+      room: str name of the room to load.
+      region: int region the room is in.
+      position: (col, row) tile position for the player.
+      screen_offset: (x, y) initial screen offset for the new room.
+    """
+    self.LoadRoom(room, region, position, screen_offset)
+    gcpolicy.manager.RoomLoaded()
+    if surfacememory.CHECK_ON_ROOM_CHANGE:
+      surfacememory.registry.Check(self)
+
+  def LoadRoom(self, room, region, position, screen_offset):
+    """Load a new room and put the player in it, without the upkeep ChangeRooms() does after.
+
+    Takes the same arguments as ChangeRooms().
+    """
+    self.region = region
+    self.room = room
+    self.env = environment.Environment(room, region, offset=screen_offset)
+    self.player.ChangeRooms(self.env, position)
+    self.PlayMusic()
+    # Nothing from the old room should be interpolated into the new one.
+    self.SavePositions()
+
+  def Restore(self, data):
+    """Carry on from a snapshot returned by snapshot.Capture()."""
+    snapshot.Restore(self, data)
+    self.state = PLAYING
+    self.channel = None
+    # The music faded out if the player died, so start it again even in the same room.
+    self.song = None
+    self.PlayMusic()
+    gcpolicy.manager.RoomLoaded()
+    if surfacememory.CHECK_ON_ROOM_CHANGE:
+      surfacememory.registry.Check(self)
@@ -48,8 +48,24 @@ SHOOT = 8
 
 
 class GameOverException(Exception):
-  """Thrown to let the main loop know the player has died."""
+  """Thrown to let the main loop know the player has died.
+
+  Attributes:
+    channel: pygame.mixer.Channel playing the sound to finish before the game ends, or None.
+  """
+
+  def __init__(self, channel=None):
+    Exception.__init__(self)
+    self.channel = channel
 
 
 class GameWonException(Exception):
-  """Thrown when you win the game!"""
+  """Thrown when you win the game!
+
+  Attributes:
+    channel: pygame.mixer.Channel playing the sound to finish before the credits, or None.
+  """
+
+  def __init__(self, channel=None):
+    Exception.__init__(self)
+    self.channel = channel
@@ -0,0 +1,236 @@
+"""
+Control over when the garbage collector runs, and a log of every collection.
+
+Every frame allocates plenty of short-lived rects, lists and tuples, so the cyclic garbage
+collector's automatic passes can land anywhere in a frame, and a pass over the oldest
+generation has to look at every object the game has loaded.  The GcManager moves that work
+to where a pause doesn't matter:
+
+  - When the game starts, everything loaded so far - the modules, the map data and the images
+    - is collected once and moved to the permanent generation with gc.freeze(), so no pass
+    ever looks at it again.  That is most of the objects in the game.
+  - When a room has been built, the collector runs over everything else, which is little
+    more than the new room and the garbage left by the old one.  A room change already stalls
+    the game, so the collection goes unnoticed.
+  - When a frame finishes early, the time left over before the next frame is used to collect
+    the young generations, so there is less left for an automatic pass to do mid-frame.
+
+Every collection, automatic or not, is timed with a gc callback.  The pauses go into a ring
+buffer and into a GcFrame record for the rendered frame they happened in, with idle collections
+and any others between frames counted in the frame they followed.  The records are per rendered
+frame rather than in the profiling counters, which are per simulation step, so a frame that
+catches up several steps is seen whole.  With "python worldtree.py --gc-log FILE" each frame
+that had any pauses is written to FILE, with the frame's time and each pause's generation,
+duration, the number of objects it collected and why it ran.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import collections
+import gc
+import time
+
+# Freeze everything that has been loaded when the game starts.
+FREEZE_AT_START = True
+# Collect every generation after building each room.
+COLLECT_ON_ROOM_CHANGE = True
+# Collect the young generations in the time left over at the end of a frame.
+IDLE_COLLECT = True
+# Only collect in idle time if there are at least this many milliseconds until the next frame,
+# and at least this many allocations have built up.
+IDLE_COLLECT_MS = 2.0
+IDLE_MIN_ALLOCATIONS = 200
+# Pauses, and frames, kept in the ring buffers.
+HISTORY = 1000
+
+# Reasons for a collection.
+AUTOMATIC = 'automatic'
+TRANSITION = 'transition'
+IDLE = 'idle'
+
+
+class GcPause(object):
+  """One garbage collection.
+
+  Attributes:
+    frame: int number of the frame it happened in or after, counting from when the manager
+      started, or None if it was before the first frame.
+    generation: int oldest generation collected.
+    ms: float milliseconds it took.
+    collected: int number of unreachable objects it found.
+    reason: AUTOMATIC, TRANSITION or IDLE.
+  """
+
+  def __init__(self, frame, generation, ms, collected, reason):
+    self.frame = frame
+    self.generation = generation
+    self.ms = ms
+    self.collected = collected
+    self.reason = reason
+
+  def Description(self):
+    return 'gen{} {:.3f}ms collected {} ({})'.format(self.generation, self.ms,
+                                                     self.collected, self.reason)
+
+
+class GcFrame(object):
+  """The garbage collections in one rendered frame.
+
+  Attributes:
+    frame: int number of the frame, counting from when the manager started.
+    ms: float milliseconds the frame took, from the start of Game.Frame() to the end, not
+      counting any wait for the next one.
+    pauses: list of GcPauses in the frame, then any idle collections in the wait after it.
+  """
+
+  def __init__(self, frame, ms, pauses):
+    self.frame = frame
+    self.ms = ms
+    self.pauses = pauses
+
+  @property
+  def gc_ms(self):
+    """Milliseconds spent in the frame's collections, idle ones included."""
+    return sum(pause.ms for pause in self.pauses)
+
+  def Description(self):
+    return 'frame {} {:.3f}ms: {}'.format(
+        self.frame, self.ms, '; '.join(pause.Description() for pause in self.pauses))
+
+
+class GcManager(object):
+  """Decides when the garbage collector runs and records every time it does.
+
+  Attributes:
+    installed: bool, whether the gc callback has been added.
+    pauses: collections.deque of the last HISTORY GcPauses.
+    frames: collections.deque of the GcFrames of the last HISTORY frames.
+    frame_pauses: list of the GcPauses in the frame in progress.
+    frame: int number of frames finished.
+    in_frame: bool, whether a frame is in progress.
+    frame_start: float time.perf_counter() when the frame in progress started.
+    reason: the reason the next collection is running for.
+    start: float time.perf_counter() when the collection in progress started.
+    log: file the pauses are written to, or None.
+  """
+
+  def __init__(self):
+    self.installed = False
+    self.pauses = collections.deque(maxlen=HISTORY)
+    self.frames = collections.deque(maxlen=HISTORY)
+    self.frame_pauses = []
+    self.frame = 0
+    self.in_frame = False
+    self.frame_start = time.perf_counter()
+    self.reason = AUTOMATIC
+    self.start = 0.0
+    self.log = None
+
+  def Install(self):
+    """Start timing collections."""
+    if not self.installed:
+      gc.callbacks.append(self.Callback)
+      self.installed = True
+
+  def GameStarting(self):
+    """Freeze everything loaded so far.  Called before the first room is built.
+
+    Rooms aren't frozen themselves: their sprites and Environment refer to each other, so the
+    only way to reclaim a frozen room would be to unfreeze everything, making every room change
+    a pass over the whole game again.
+    """
+    self.Install()
+    if FREEZE_AT_START and not gc.get_freeze_count():
+      self.Collect(2, TRANSITION)
+      gc.freeze()
+
+  def OpenLog(self, path):
+    """Write each frame's pauses to a file from now on."""
+    self.log = open(path, 'w')
+
+  def CloseLog(self):
+    """Stop writing pauses, and close the file so everything written is flushed."""
+    if self.log is not None:
+      self.log.close()
+      self.log = None
+
+  def Callback(self, phase, info):
+    """Called by the gc module before and after every collection."""
+    if phase == 'start':
+      self.start = time.perf_counter()
+      return
+    ms = (time.perf_counter() - self.start) * 1000
+    if self.in_frame:
+      pause = GcPause(self.frame, info['generation'], ms, info['collected'], self.reason)
+      self.frame_pauses.append(pause)
+    elif self.frames:
+      # Collections between frames, idle ones in particular, belong to the frame before.  It
+      # has already been logged, so they get a line of their own.
+      record = self.frames[-1]
+      pause = GcPause(record.frame, info['generation'], ms, info['collected'], self.reason)
+      record.pauses.append(pause)
+      if self.log is not None:
+        self.log.write('frame {} after: {}\n'.format(record.frame, pause.Description()))
+    else:
+      # Before the first frame, e.g. while the game is starting.
+      pause = GcPause(None, info['generation'], ms, info['collected'], self.reason)
+    self.pauses.append(pause)
+
+  def Collect(self, generation, reason):
+    """Run a collection on purpose, recording why."""
+    self.reason = reason
+    try:
+      gc.collect(generation)
+    finally:
+      self.reason = AUTOMATIC
+
+  def RoomLoaded(self):
+    """Collect the garbage from the last room, while the game is stalled anyway."""
+    self.Install()
+    if COLLECT_ON_ROOM_CHANGE:
+      self.Collect(2, TRANSITION)
+
+  def Idle(self, seconds):
+    """Use some of the time before the next frame to collect the young generations.
+
+    Args:
+      seconds: float time until the next frame is due.
+    """
+    if not IDLE_COLLECT or seconds * 1000 < IDLE_COLLECT_MS:
+      return
+    counts = gc.get_count()
+    if counts[0] < IDLE_MIN_ALLOCATIONS:
+      return
+    # Take generation 1 along with it if an automatic pass would have collected it next.
+    generation = 1 if counts[1] + 1 >= gc.get_threshold()[1] else 0
+    self.Collect(generation, IDLE)
+
+  def BeginFrame(self):
+    """Start timing a frame.  Called first thing in Game.Frame()."""
+    self.frame_start = time.perf_counter()
+    self.in_frame = True
+
+  def EndFrame(self):
+    """Finish a frame, recording and logging its pauses along with how long it took."""
+    record = GcFrame(self.frame, (time.perf_counter() - self.frame_start) * 1000,
+                     self.frame_pauses)
+    self.frames.append(record)
+    if record.pauses and self.log is not None:
+      self.log.write(record.Description() + '\n')
+    self.frame_pauses = []
+    self.frame += 1
+    self.in_frame = False
+
+  def Summary(self):
+    """Returns a line per generation and reason of the pauses in the ring buffer."""
+    groups = collections.OrderedDict()
+    for pause in sorted(self.pauses, key=lambda pause: (pause.generation, pause.reason)):
+      groups.setdefault((pause.generation, pause.reason), []).append(pause.ms)
+    return ['gen{} {:10}: {} passes, mean {:.3f}ms, max {:.3f}ms'.format(
+        generation, reason, len(times), sum(times) / len(times), max(times))
+            for (generation, reason), times in groups.items()]
+
+
+manager = GcManager()
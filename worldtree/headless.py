@@ -0,0 +1,71 @@
+"""
+Running the game's simulation with no display and no audio.
+
+Init() starts pygame with SDL's dummy video driver and audio turned off, so the game can run
+on machines with neither, such as CI servers.  Run() then steps a Game as fast as it will go,
+skipping the rendering entirely, and reports the simulation's throughput.
+
+From the worldtree directory:
+  python worldtree.py --headless [--steps N] [--replay FILE]
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import os
+import time
+
+import pygame
+
+import audio
+import classcost
+from game_constants import GameOverException
+from game_constants import SCREEN_SIZE
+import snapshot
+
+# Steps to run when no recording is given.
+DEFAULT_STEPS = 3600
+
+
+def Init():
+  """Start pygame without a window or sound.  Returns the screen Surface, which is never shown.
+
+  Must be called before any images are loaded.
+  """
+  os.environ['SDL_VIDEODRIVER'] = 'dummy'
+  os.environ['SDL_AUDIODRIVER'] = 'dummy'
+  audio.Disable()
+  pygame.init()
+  return pygame.display.set_mode(SCREEN_SIZE)
+
+
+def Run(game, steps):
+  """Run a game's simulation for a number of ticks, or until the game ends.
+
+  Args:
+    game: game.Game to run.  It's used as is, so this continues wherever the game is.
+    steps: int number of Game.Tick() calls to make.
+
+  Returns:
+    (ticks, seconds) tuple of how many ticks were run and how long they took.
+  """
+  if game.checkpoint is None:
+    game.checkpoint = snapshot.Capture(game)
+  ticks = 0
+  start = time.perf_counter()
+  try:
+    while ticks < steps:
+      game.Tick()
+      classcost.accountant.EndFrame(game.region, game.room)
+      ticks += 1
+  except GameOverException:
+    pass
+  return ticks, time.perf_counter() - start
+
+
+def Report(ticks, seconds):
+  """Returns a line describing the simulation's throughput."""
+  return '{} steps in {:.3f}s: {:.1f} steps/s ({:.3f} ms/step)'.format(
+      ticks, seconds, ticks / seconds if seconds else 0.0,
+      1000.0 * seconds / ticks if ticks else 0.0)
@@ -0,0 +1,117 @@
+"""
+Object pools for short-lived sprites.
+
+Projectiles, death animations and item drops are created constantly and usually die within a
+second.  Rather than building a new sprite (and its Animation and rect) every time, classes
+that mix in PooledSprite are created with Spawn() instead of their constructor.  When one is
+killed it goes back on its class's free list, and the next Spawn() resets it in place.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import pygame
+
+import profiling
+
+# If False, Spawn() always builds a new sprite.  Useful for comparing against the pools.
+ENABLED = True
+
+# Most sprites kept on each free list.  Anything killed beyond this is left to be collected.
+MAX_FREE = 64
+
+
+class Pool(object):
+  """A free list of killed sprites of one class, along with usage statistics.
+
+  Attributes:
+    cls: the PooledSprite subclass this pool holds.
+    free: list of killed sprites that can be reused.
+    hits: int number of Acquire() calls that reused a sprite.
+    misses: int number of Acquire() calls that had to build a new one.
+    releases: int number of sprites returned to the free list.
+  """
+
+  def __init__(self, cls):
+    self.cls = cls
+    self.free = []
+    self.hits = 0
+    self.misses = 0
+    self.releases = 0
+
+  def Acquire(self, *args, **kwargs):
+    """Return a sprite set up as if it had been constructed with these arguments."""
+    if ENABLED and self.free:
+      sprite = self.free.pop()
+      sprite.Reset(*args, **kwargs)
+      self.hits += 1
+      profiling.counters.Increment('pool_hits')
+    else:
+      sprite = self.cls(*args, **kwargs)
+      self.misses += 1
+      profiling.counters.Increment('pool_misses')
+    return sprite
+
+  def Release(self, sprite):
+    """Put a killed sprite back on the free list."""
+    if ENABLED and len(self.free) < MAX_FREE:
+      self.free.append(sprite)
+      self.releases += 1
+
+  def HitRate(self):
+    """Return the fraction of Acquire() calls that reused a sprite."""
+    total = self.hits + self.misses
+    if total == 0:
+      return 0.0
+    return self.hits / float(total)
+
+
+# Dict of class to its Pool.  Each subclass gets its own, since Reset() arguments differ.
+_POOLS = {}
+
+
+def PoolFor(cls):
+  """Return the Pool for a class, creating it if needed."""
+  pool = _POOLS.get(cls)
+  if pool is None:
+    pool = Pool(cls)
+    _POOLS[cls] = pool
+  return pool
+
+
+def Stats():
+  """Returns a dict of class name to (hits, misses, free) for every pool."""
+  return dict((cls.__name__, (pool.hits, pool.misses, len(pool.free)))
+              for cls, pool in _POOLS.items())
+
+
+def Clear():
+  """Empty every pool and reset its statistics."""
+  _POOLS.clear()
+
+
+class PooledSprite(pygame.sprite.Sprite):
+  """Mixin for sprites that are recycled through a Pool.
+
+  Subclasses must define Reset(), taking the same arguments as the constructor and putting
+  the sprite back in the state the constructor would leave it in.  Create them with
+  cls.Spawn(...) rather than cls(...).
+  """
+
+  @classmethod
+  def Spawn(cls, *args, **kwargs):
+    return PoolFor(cls).Acquire(*args, **kwargs)
+
+  def Reset(self, *args, **kwargs):
+    raise NotImplementedError('Pooled sprites must be able to reset themselves.')
+
+  def kill(self):
+    """Remove the sprite from its groups and return it to the pool.
+
+    Killing a sprite that is already dead doesn't release it twice.
+    """
+    was_alive = self.alive()
+    pygame.sprite.Sprite.kill(self)
+    if was_alive:
+      PoolFor(type(self)).Release(self)
@@ -0,0 +1,62 @@
+"""
+Lightweight per-frame counters for finding out where the game spends its time.
+
+Code anywhere in the game can call counters.Increment('name') and the main loop calls
+counters.EndFrame() once per frame, which moves the current totals into last_frame so they
+can be reported while the next frame is being counted.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+# Print counters.Report() from the main loop every this many frames.  0 disables reporting.
+REPORT_INTERVAL = 0
+# Count the hitboxes built and reused each frame as hitbox_built and hitbox_saved.  Off by
+# default, since counting a reused hitbox costs more than reusing it saves.
+COUNT_HITBOXES = False
+
+
+class FrameCounters(object):
+  """A set of named counters that are reset at the end of every frame.
+
+  Attributes:
+    current: dict of counter name to value for the frame in progress.
+    last_frame: dict of counter name to value for the most recently completed frame.
+    totals: dict of counter name to value summed over every completed frame.
+    frames: int number of frames completed.
+  """
+
+  def __init__(self):
+    self.current = {}
+    self.last_frame = {}
+    self.totals = {}
+    self.frames = 0
+
+  def Increment(self, name, amount=1):
+    self.current[name] = self.current.get(name, 0) + amount
+
+  def EndFrame(self):
+    """Finish the current frame and start counting a new one."""
+    for name, value in self.current.items():
+      self.totals[name] = self.totals.get(name, 0) + value
+    self.last_frame = self.current
+    self.current = {}
+    self.frames += 1
+
+  def Average(self, name):
+    """Return the average per-frame value of a counter over every completed frame."""
+    if self.frames == 0:
+      return 0
+    return self.totals.get(name, 0) / float(self.frames)
+
+  def Report(self):
+    """Return a one-line summary of the last frame's counters."""
+    return ' '.join(('{}={:.3f}' if isinstance(value, float) else '{}={}').format(name, value)
+                    for name, value in sorted(self.last_frame.items()))
+
+  def Reset(self):
+    self.__init__()
+
+
+counters = FrameCounters()
@@ -0,0 +1,184 @@
+"""
+Recording a game's input so the game can be played back exactly.
+
+Given the same starting state, the same seed for rng and the same actions on every simulation
+step, the game always plays out the same way.  A Recorder captures those three things as the
+game is played, and a Player feeds the actions back in through controller.GetInput() in place
+of the keyboard.  Playback needs no display timing, so benchmarks/play_replay.py runs it as
+fast as the simulation can go.
+
+The starting state is a snapshot.Capture(), which holds every character's timers and
+animation frames but not projectiles in flight, dropped items or dying enemies.  A recording
+only plays back exactly if it starts when there are none of those, as there aren't when the
+game starts or the player enters a room.
+
+Recordings are saved as:
+
+  header:   magic, version, seed, number of steps, length of the snapshot
+  snapshot: the state the recording starts from, from snapshot.Capture()
+  actions:  zlib compressed, one byte per step with a bit for each of controller.ALL_ACTIONS
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import struct
+import zlib
+
+import classcost
+import controller
+from game_constants import GameOverException
+import rng
+import snapshot
+
+MAGIC = b'WTR'
+VERSION = 1
+
+_HEADER = struct.Struct('<3sBIII')
+_BITS = dict((action, 1 << index) for index, action in enumerate(controller.ALL_ACTIONS))
+
+
+class ReplayError(Exception):
+  """Raised for a file that isn't a recording this version can play."""
+
+
+def PackActions(actions):
+  """Returns the one byte bitmask for a list of actions."""
+  mask = 0
+  for action in actions:
+    mask |= _BITS[action]
+  return mask
+
+
+def UnpackActions(mask):
+  """Returns the list of actions in a bitmask, in the order of controller.ALL_ACTIONS."""
+  return [action for action in controller.ALL_ACTIONS if mask & _BITS[action]]
+
+
+class Recording(object):
+  """The input for a stretch of play, and everything needed to play it back.
+
+  Attributes:
+    seed: int the rng was seeded with when the recording started.
+    start: bytes snapshot of the game when the recording started.
+    steps: bytearray of the PackActions() mask read on each simulation step.
+  """
+
+  def __init__(self, seed, start, steps=None):
+    self.seed = seed
+    self.start = start
+    self.steps = bytearray() if steps is None else bytearray(steps)
+
+  def Save(self, path):
+    with open(path, 'wb') as recording_file:
+      recording_file.write(_HEADER.pack(MAGIC, VERSION, self.seed, len(self.steps),
+                                        len(self.start)))
+      recording_file.write(self.start)
+      recording_file.write(zlib.compress(bytes(self.steps), 9))
+
+  @classmethod
+  def Load(cls, path):
+    """Read a recording saved by Save().
+
+    Raises:
+      ReplayError: if the file isn't a recording.
+    """
+    with open(path, 'rb') as recording_file:
+      data = recording_file.read()
+    if data[:len(MAGIC)] != MAGIC:
+      raise ReplayError('{} is not a recording'.format(path))
+    _, version, seed, step_count, start_length = _HEADER.unpack_from(data)
+    if version != VERSION:
+      raise ReplayError('Unsupported recording version {}'.format(version))
+    start = data[_HEADER.size:_HEADER.size + start_length]
+    steps = zlib.decompress(data[_HEADER.size + start_length:])
+    if len(steps) != step_count:
+      raise ReplayError('{} is truncated'.format(path))
+    return cls(seed, start, steps)
+
+
+class Recorder(object):
+  """Records the actions read from the normal input source on every simulation step.
+
+  Creating a Recorder reseeds the rng and snapshots the game, so it should be created just as
+  the game starts or enters a room.
+
+  Attributes:
+    recording: the Recording being made.
+    source: the input function the actions are read from.
+  """
+
+  def __init__(self, game, seed=None):
+    self.recording = Recording(rng.Seed(seed), snapshot.Capture(game))
+    self.source = controller.input_source
+    controller.input_source = self.GetInput
+
+  def GetInput(self):
+    actions = self.source()
+    self.recording.steps.append(PackActions(actions))
+    return actions
+
+  def Stop(self):
+    """Stop recording and give the input back to the original source."""
+    controller.input_source = self.source
+
+
+class Player(object):
+  """Plays back a Recording's actions in place of the normal input source.
+
+  Attributes:
+    recording: the Recording being played.
+    step: int index of the next step to play.
+    source: the input function to restore when the recording is done.
+  """
+
+  def __init__(self, recording):
+    self.recording = recording
+    self.step = 0
+    self.source = controller.input_source
+    controller.input_source = self.GetInput
+
+  @property
+  def finished(self):
+    return self.step >= len(self.recording.steps)
+
+  def GetInput(self):
+    if self.finished:
+      return []
+    mask = self.recording.steps[self.step]
+    self.step += 1
+    return UnpackActions(mask)
+
+  def Stop(self):
+    controller.input_source = self.source
+
+
+def Play(game, recording):
+  """Play a recording back through a game, without drawing anything or waiting for timing.
+
+  Args:
+    game: game.Game to play it in.  It's restored to the recording's starting state first.
+    recording: Recording to play.
+
+  Returns:
+    The number of Game.Tick() calls it took, including any paused ones.
+  """
+  game.Restore(recording.start)
+  # Recordings start when the game does, so if game.RESTART_FROM_CHECKPOINT is on dying goes
+  # back to the start as it did then.
+  game.checkpoint = recording.start
+  rng.Seed(recording.seed)
+  player = Player(recording)
+  ticks = 0
+  try:
+    while not player.finished:
+      game.Tick()
+      classcost.accountant.EndFrame(game.region, game.room)
+      ticks += 1
+  except GameOverException:
+    # The game ended here when it was recorded, too.
+    pass
+  finally:
+    player.Stop()
+  return ticks
@@ -0,0 +1,34 @@
+"""
+The random number generator for everything random in the simulation.
+
+Enemy AI and item drops draw from the single seeded generator here, instead of the global
+random module, so that a game started from the same seed with the same input plays out the
+same way.  See replay.py.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import os
+import random
+
+generator = random.Random()
+# The seed the generator was last seeded with.
+seed = None
+
+randint = generator.randint
+choice = generator.choice
+
+
+def Seed(value=None):
+  """Reseed the generator, with a fresh random seed if none is given.  Returns the seed."""
+  global seed
+  if value is None:
+    value = int.from_bytes(os.urandom(4), 'little')
+  seed = value
+  generator.seed(value)
+  return value
+
+
+Seed()
@@ -0,0 +1,191 @@
+"""
+Compact binary snapshots of a game in progress, for restarting at a checkpoint.
+
+A snapshot records the current room and camera, the hero's position and stats, every item
+collected so far and the enemies alive in the room, packed with struct:
+
+  header:    magic, version, region, camera x and y, room name
+  hero:      map x and y, direction, hp, max hp, invulnerability, ammo, max ammo, max jumps,
+             then its state
+  collected: count, then region, col, row and room name of each item
+  enemies:   count, then class, map x and y, direction, hp, invulnerability, movement and
+             spawner of each enemy, where the spawner is the index of the BugPipe that spawned
+             it in this list, or NO_SPAWNER, then its state
+
+where a character's state is a count and then that many ints from its SnapshotState(): its
+jump and attack counters, AI timers, animation frames and the like.
+
+Restoring loads the room fresh and then puts the recorded enemies in it in place of the
+map's, so it costs about as much as walking into the room.  Anything else in the room isn't
+recorded: projectiles in flight, items dropped by enemies and dying enemies are gone after a
+restore, and the game is always playing, never paused for a jingle or over.  That's nothing
+at the moments the game takes its snapshots, when the player walks into a room, but it means
+a snapshot taken in the middle of a fight doesn't carry on exactly as the fight would have.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import struct
+
+from characters import enemies
+import environment
+
+MAGIC = b'WTS'
+VERSION = 3
+NO_SPAWNER = 0xFFFF
+
+# Every class of enemy a snapshot can hold, in the order of their index in the snapshot.
+ENEMY_CLASSES = [environment.ENEMIES[code] for code in sorted(environment.ENEMIES)]
+ENEMY_INDEXES = dict((cls, index) for index, cls in enumerate(ENEMY_CLASSES))
+
+_HEADER = struct.Struct('<3sBBii')
+_HERO = struct.Struct('<iiBhhqhhB')
+_COUNT = struct.Struct('<H')
+_ITEM = struct.Struct('<BHH')
+_ENEMY = struct.Struct('<BiiBhqhhH')
+_STATE_VALUE = 'q'
+
+
+class SnapshotError(Exception):
+  """Raised for data that isn't a snapshot this version can restore."""
+
+
+def _PackName(name):
+  encoded = name.encode('utf-8')
+  return struct.pack('<B', len(encoded)) + encoded
+
+
+def _UnpackName(data, offset):
+  length = data[offset]
+  return data[offset + 1:offset + 1 + length].decode('utf-8'), offset + 1 + length
+
+
+def _PackState(character):
+  values = character.SnapshotState()
+  return _COUNT.pack(len(values)) + struct.pack('<' + _STATE_VALUE * len(values), *values)
+
+
+def _UnpackState(data, offset):
+  (count,) = _COUNT.unpack_from(data, offset)
+  offset += _COUNT.size
+  values = struct.unpack_from('<' + _STATE_VALUE * count, data, offset)
+  return values, offset + struct.calcsize('<' + _STATE_VALUE * count)
+
+
+def Capture(game):
+  """Returns a snapshot of a game as bytes.
+
+  Args:
+    game: game.Game to snapshot.
+  """
+  env = game.env
+  player = game.player
+  parts = [_HEADER.pack(MAGIC, VERSION, game.region, env.screen_offset[0],
+                        env.screen_offset[1]),
+           _PackName(game.room)]
+  x, y = env.MapCoordinateForScreenPoint(player.rect.left, player.rect.top)
+  parts.append(_HERO.pack(x, y, player.direction, player.hp, player.max_hp,
+                          player.invulnerable, player.ammo, player.max_ammo, player.max_jumps))
+  parts.append(_PackState(player))
+  collected = sorted(environment.COLLECTED)
+  parts.append(_COUNT.pack(len(collected)))
+  for region, room, col, row in collected:
+    parts.append(_ITEM.pack(region, col, row))
+    parts.append(_PackName(room))
+  live_enemies = [enemy for enemy in env.enemy_group if type(enemy) in ENEMY_INDEXES]
+  spawners = {}
+  for index, enemy in enumerate(live_enemies):
+    if isinstance(enemy, enemies.BugPipe):
+      for bug in enemy.bugs:
+        spawners[id(bug)] = index
+  parts.append(_COUNT.pack(len(live_enemies)))
+  for enemy in live_enemies:
+    x, y = env.MapCoordinateForScreenPoint(enemy.rect.left, enemy.rect.top)
+    parts.append(_ENEMY.pack(ENEMY_INDEXES[type(enemy)], x, y, enemy.direction, enemy.hp,
+                             enemy.invulnerable, enemy.movement[0], enemy.movement[1],
+                             spawners.get(id(enemy), NO_SPAWNER)))
+    parts.append(_PackState(enemy))
+  return b''.join(parts)
+
+
+def Restore(game, data):
+  """Put a game back in the state recorded in a snapshot.
+
+  This loads the room without the upkeep that follows a room change; Game.Restore() does that
+  once the enemies are in place.
+
+  Args:
+    game: game.Game to restore into.  It can be in any room, and the hero can be dead.
+    data: bytes returned by Capture().
+
+  Raises:
+    SnapshotError: if data isn't a snapshot.
+  """
+  if data[:len(MAGIC)] != MAGIC:
+    raise SnapshotError('Not a snapshot')
+  _, version, region, offset_x, offset_y = _HEADER.unpack_from(data)
+  if version != VERSION:
+    raise SnapshotError('Unsupported snapshot version {}'.format(version))
+  room, offset = _UnpackName(data, _HEADER.size)
+  hero_fields = _HERO.unpack_from(data, offset)
+  offset += _HERO.size
+  hero_state, offset = _UnpackState(data, offset)
+  (count,) = _COUNT.unpack_from(data, offset)
+  offset += _COUNT.size
+  collected = set()
+  for _ in range(count):
+    item_region, col, row = _ITEM.unpack_from(data, offset)
+    item_room, offset = _UnpackName(data, offset + _ITEM.size)
+    collected.add((item_region, item_room, col, row))
+  environment.COLLECTED.clear()
+  environment.COLLECTED.update(collected)
+
+  game.LoadRoom(room, region, (0, 0), (offset_x, offset_y))
+  env = game.env
+  player = game.player
+  (x, y, player.direction, player.hp, player.max_hp, player.invulnerable, player.ammo,
+   player.max_ammo, player.max_jumps) = hero_fields
+  player.RestoreSnapshotState(hero_state)
+  player.rect.topleft = env.ScreenCoordinateForMapPoint(x, y)
+  game.player_group.add(player)
+
+  # Swap the enemies the room was loaded with for the recorded ones.
+  for enemy in env.enemy_group:
+    enemy.kill()
+  env.entities.RemoveDead()
+  (count,) = _COUNT.unpack_from(data, offset)
+  offset += _COUNT.size
+  restored = []
+  spawned = []
+  for _ in range(count):
+    (index, x, y, direction, hp, invulnerable, move_x, move_y,
+     spawner) = _ENEMY.unpack_from(data, offset)
+    offset += _ENEMY.size
+    state, offset = _UnpackState(data, offset)
+    cls = ENEMY_CLASSES[index]
+    # Build the enemy on the tile it was standing on, as the map would have, and then put it
+    # exactly where it was.
+    enemy = cls(env, env.TileIndexForPoint(x, y + cls.HEIGHT - 1))
+    enemy.rect.topleft = env.ScreenCoordinateForMapPoint(x, y)
+    enemy.direction = direction
+    enemy.hp = hp
+    enemy.invulnerable = invulnerable
+    # In place, since some enemies keep other references to their movement list.
+    enemy.movement[0] = move_x
+    enemy.movement[1] = move_y
+    if spawner != NO_SPAWNER:
+      spawned.append((enemy, spawner))
+      env.AddSpawnedEnemy(enemy)
+    else:
+      env.AddEnemy(enemy)
+    if env.walkers is not None and enemy.WALKER:
+      env.walkers.Add(enemy)
+    # Last, since some enemies hand parts of their state to the walker batch.
+    enemy.RestoreSnapshotState(state)
+    restored.append(enemy)
+  # Give spawners back their bugs, so they count against the spawners' budgets again.
+  for enemy, spawner in spawned:
+    restored[spawner].bugs.append(enemy)
+  game.SavePositions()
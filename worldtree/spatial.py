@@ -0,0 +1,113 @@
+"""
+Simple spatial indexes for answering "what is near this point" without checking every sprite.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import math
+
+
+class SpatialHash(object):
+  """Buckets points into square cells so radius queries only visit nearby cells.
+
+  The index is cheap to clear and refill, so it's intended to be rebuilt every frame for
+  things that move.
+
+  Attributes:
+    cell_size: int width and height in pixels of each cell.
+    cells: dict of (cell_x, cell_y) to a list of (item, x, y) tuples in that cell.
+  """
+
+  def __init__(self, cell_size):
+    self.cell_size = cell_size
+    self.cells = {}
+
+  def __len__(self):
+    return sum(len(bucket) for bucket in self.cells.values())
+
+  def Clear(self):
+    self.cells.clear()
+
+  def Insert(self, item, x, y):
+    """Add an item at map coordinate (x, y)."""
+    key = (int(x // self.cell_size), int(y // self.cell_size))
+    bucket = self.cells.get(key)
+    if bucket is None:
+      self.cells[key] = [(item, x, y)]
+    else:
+      bucket.append((item, x, y))
+
+  def Query(self, x, y, radius):
+    """Returns a list of (item, distance_squared) for every item strictly within radius.
+
+    Distances are never square rooted - compare them against radius ** 2.
+    """
+    radius_sq = radius * radius
+    results = []
+    if math.isinf(radius):
+      buckets = self.cells.values()
+    else:
+      first_x = int((x - radius) // self.cell_size)
+      last_x = int((x + radius) // self.cell_size)
+      first_y = int((y - radius) // self.cell_size)
+      last_y = int((y + radius) // self.cell_size)
+      if (last_x - first_x + 1) * (last_y - first_y + 1) > len(self.cells):
+        # Cheaper to look at every occupied cell than every cell in range.
+        buckets = self.cells.values()
+      else:
+        buckets = [self.cells[(cx, cy)] for cx in range(first_x, last_x + 1)
+                   for cy in range(first_y, last_y + 1) if (cx, cy) in self.cells]
+    for bucket in buckets:
+      for item, item_x, item_y in bucket:
+        distance_sq = (item_x - x) ** 2 + (item_y - y) ** 2
+        if distance_sq < radius_sq:
+          results.append((item, distance_sq))
+    return results
+
+
+class RectIndex(object):
+  """Static index of rectangles for finding which ones overlap a query rect.
+
+  Each rect is filed under every cell it overlaps, so build it once when the items are created
+  and don't move them afterwards.
+
+  Attributes:
+    cell_size: int width and height in pixels of each cell.
+    cells: dict of (cell_x, cell_y) to a list of (item, rect) tuples overlapping that cell.
+    items: list of every (item, rect) tuple in the index.
+  """
+
+  def __init__(self, cell_size):
+    self.cell_size = cell_size
+    self.cells = {}
+    self.items = []
+
+  def __len__(self):
+    return len(self.items)
+
+  def _CellRange(self, rect):
+    return (range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1),
+            range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1))
+
+  def Insert(self, item, rect):
+    """Add an item covering rect.  The rect must not be changed afterwards."""
+    self.items.append((item, rect))
+    columns, rows = self._CellRange(rect)
+    for cx in columns:
+      for cy in rows:
+        self.cells.setdefault((cx, cy), []).append((item, rect))
+
+  def Query(self, rect):
+    """Returns a list of the items whose rects overlap rect, each listed once."""
+    if not self.items:
+      return []
+    columns, rows = self._CellRange(rect)
+    results = []
+    for cx in columns:
+      for cy in rows:
+        for item, item_rect in self.cells.get((cx, cy), ()):
+          if item not in results and item_rect.colliderect(rect):
+            results.append(item)
+    return results
@@ -0,0 +1,164 @@
+"""
+Catches frames that run over budget and saves a profile of them.
+
+Hitches in the game are sporadic - loading a room, picking up an item, an explosion that
+redraws the map - so they're hard to catch with a profiler started by hand.  While the
+catcher is enabled, every frame is run under its own cProfile.Profile, and the profiles of
+the last few frames are kept.  When a frame takes longer than BUDGET_MS, the catcher waits
+FRAMES_AFTER more frames, then merges the profiles of the frames around the spike and writes
+them to SPIKE_DIR:
+
+  spike-<time>-<n>-<region>-<room>.prof: the merged profile, for pstats or a viewer like snakeviz.
+  spike-<time>-<n>-<region>-<room>.txt: each frame's time, room and sprite counts, then the
+    slowest functions in the spike frame and in the whole window.
+
+cProfile makes the game run noticeably slower, so the catcher is off unless it's turned on
+with "python worldtree.py --spike-budget MS", and the budget is measured against profiled
+frames.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import collections
+import cProfile
+import io
+import os
+import pstats
+import time
+
+import profiling
+
+ENABLED = False
+# A frame that takes longer than this many milliseconds is a spike.
+BUDGET_MS = 1000.0 / 60
+# Frames either side of a spike to include in its profile.
+FRAMES_BEFORE = 3
+FRAMES_AFTER = 2
+SPIKE_DIR = 'spike_profiles'
+# Stop saving spikes after this many, so a slow machine doesn't fill the disk.
+MAX_DUMPS = 50
+# Functions listed in each section of the text report.
+REPORT_LINES = 25
+
+
+class ProfiledFrame(object):
+  """One frame run under the profiler.
+
+  Attributes:
+    profile: the frame's disabled cProfile.Profile.
+    ms: float milliseconds the frame took.
+    region: int region the frame ended in.
+    room: str name of the room the frame ended in.
+    counts: list of (sprite group name, number of sprites) pairs at the end of the frame.
+  """
+
+  def __init__(self, profile, ms, region, room, counts):
+    self.profile = profile
+    self.ms = ms
+    self.region = region
+    self.room = room
+    self.counts = counts
+
+  def Description(self):
+    return '{:8.2f}ms  region {} {}  {}'.format(
+        self.ms, self.region, self.room,
+        '  '.join('{} {}'.format(name, count) for name, count in self.counts))
+
+
+class SpikeCatcher(object):
+  """Profiles every frame and saves the profiles around the ones that run over budget.
+
+  Attributes:
+    budget_ms: float frame time that counts as a spike.
+    directory: str directory the profiles are saved to.
+    window: collections.deque of the last ProfiledFrames.
+    profile: cProfile.Profile of the frame in progress, or None.
+    start: float time.perf_counter() when the frame in progress started.
+    spike: the ProfiledFrame of a spike waiting for the frames after it, or None.
+    frames_left: int frames to wait before saving the spike.
+    dumps: int number of spikes saved.
+  """
+
+  def __init__(self, budget_ms=BUDGET_MS, directory=SPIKE_DIR):
+    self.budget_ms = budget_ms
+    self.directory = directory
+    self.window = collections.deque(maxlen=FRAMES_BEFORE + 1 + FRAMES_AFTER)
+    self.profile = None
+    self.start = 0.0
+    self.spike = None
+    self.frames_left = 0
+    self.dumps = 0
+
+  def BeginFrame(self):
+    """Start profiling a frame, if the catcher is enabled."""
+    if not ENABLED or self.dumps >= MAX_DUMPS:
+      return
+    self.profile = cProfile.Profile()
+    self.start = time.perf_counter()
+    self.profile.enable()
+
+  def EndFrame(self, game):
+    """Stop profiling a frame, and save a profile if a spike's window is complete.
+
+    Args:
+      game: the game.Game the frame was run for, which the frame is tagged with.
+    """
+    profile = self.profile
+    if profile is None:
+      return
+    profile.disable()
+    ms = (time.perf_counter() - self.start) * 1000
+    self.profile = None
+    frame = ProfiledFrame(profile, ms, game.region, game.room,
+                          list(zip(game.GROUP_NAMES, map(len, game.Groups()))))
+    self.window.append(frame)
+    if self.spike is not None:
+      self.frames_left -= 1
+      if self.frames_left <= 0:
+        self.Dump()
+    elif ms > self.budget_ms:
+      profiling.counters.Increment('frame_spikes')
+      self.spike = frame
+      self.frames_left = FRAMES_AFTER
+      if not FRAMES_AFTER:
+        self.Dump()
+
+  def Dump(self):
+    """Save the profile of the frames around the current spike.
+
+    Returns:
+      The str path of the merged profile.
+    """
+    spike = self.spike
+    frames = list(self.window)
+    self.spike = None
+    self.window.clear()
+    self.dumps += 1
+    os.makedirs(self.directory, exist_ok=True)
+    name = 'spike-{}-{:03d}-{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), self.dumps,
+                                          spike.region, spike.room)
+    path = os.path.join(self.directory, name)
+    report = io.StringIO()
+    report.write('Frame over the {:.2f}ms budget, with the frames around it:\n'.format(
+        self.budget_ms))
+    for frame in frames:
+      report.write('{} {}\n'.format('>' if frame is spike else ' ', frame.Description()))
+    report.write('\nSpike frame:\n')
+    pstats.Stats(spike.profile, stream=report).sort_stats('cumulative').print_stats(
+        REPORT_LINES)
+    report.write('All {} frames:\n'.format(len(frames)))
+    stats = pstats.Stats(frames[0].profile, stream=report)
+    for frame in frames[1:]:
+      stats.add(frame.profile)
+    stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+    stats.dump_stats(path + '.prof')
+    with open(path + '.txt', 'w') as output:
+      output.write(report.getvalue())
+    print('Frame spike of {:.2f}ms in {}: profile saved to {}.prof'.format(
+        spike.ms, spike.room, path))
+    return path + '.prof'
+
+
+catcher = SpikeCatcher()
@@ -0,0 +1,201 @@
+"""
+Accounting of the memory held by the game's pygame surfaces.
+
+Surfaces are cached all over the game: the image lists each sprite class loads the first time
+it's used, per-instance flipped copies, the tile images shared by every room, the Baron's
+scaled-up frames, the Environment's map surface and the status bar.  A SurfaceRegistry finds
+them by walking the places they're kept and records each surface once, against its owner -
+usually a class name - with its size in bytes.  It can then report the totals per owner, and
+what each room needs: the tile images its map uses and the images of the classes placed in
+it.
+
+Game.Start() and every room change call Check(), which prints a warning when the total goes
+over BUDGET_BYTES.  To see the whole game's surfaces, run from the worldtree directory:
+  python -m benchmarks.surface_memory
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import inspect
+
+import pygame
+
+from characters import animation
+from characters import character
+from characters import enemies
+from characters import hero
+from characters import powerup
+from characters import projectile
+import environment
+import pooling
+
+# Warn when the registered surfaces take more than this many bytes.
+BUDGET_BYTES = 128 * 1024 * 1024
+# Whether Check() is called on every room change.
+CHECK_ON_ROOM_CHANGE = True
+# Modules whose sprite classes keep surfaces in class attributes.
+SPRITE_MODULES = (character, enemies, hero, powerup, projectile)
+TILES = 'tiles'
+# Owners listed in a warning.
+WARNING_OWNERS = 5
+MB = 1024.0 * 1024.0
+
+
+def SurfaceBytes(surface):
+  """Returns the bytes of pixel data in a surface."""
+  return surface.get_pitch() * surface.get_height()
+
+
+def SpriteClasses():
+  """Returns every sprite class in SPRITE_MODULES."""
+  classes = []
+  for module in SPRITE_MODULES:
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+      if (cls.__module__ == module.__name__ and issubclass(cls, pygame.sprite.Sprite)
+          and cls not in classes):
+        classes.append(cls)
+  return classes
+
+
+class SurfaceRegistry(object):
+  """Every surface that has been found, by owner.
+
+  Attributes:
+    owners: dict of owner name to a dict of id(surface) to its bytes.
+    surfaces: dict of id(surface) to the surface, which keeps the ids valid.
+    over_budget: bool, whether the last Check() found the total over budget.
+  """
+
+  def __init__(self):
+    self.owners = {}
+    self.surfaces = {}
+    self.over_budget = False
+
+  def Clear(self):
+    self.owners = {}
+    self.surfaces = {}
+
+  def Register(self, owner, value):
+    """Record the surfaces in a value against an owner.
+
+    Args:
+      owner: str name of what is keeping the surfaces.
+      value: a pygame.Surface, an animation.Animation, or a list, tuple or dict of them.
+        Surfaces that have already been recorded, for this owner or another, are skipped.
+    """
+    if isinstance(value, pygame.Surface):
+      if id(value) not in self.surfaces:
+        self.surfaces[id(value)] = value
+        self.owners.setdefault(owner, {})[id(value)] = SurfaceBytes(value)
+    elif isinstance(value, animation.Animation):
+      self.Register(owner, value.images)
+    elif isinstance(value, (list, tuple)):
+      for item in value:
+        self.Register(owner, item)
+    elif isinstance(value, dict):
+      for item in value.values():
+        self.Register(owner, item)
+
+  def Scan(self, game):
+    """Find every surface the game is keeping.
+
+    Class attributes are scanned before the sprites themselves, so images shared by a class
+    belong to the class, and only the copies made for a single sprite are listed under
+    "<class> (instances)".
+
+    Args:
+      game: the game.Game to scan, or None to scan only the caches.
+    """
+    self.Clear()
+    self.Register(TILES, environment.TILE_IMAGES)
+    for cls in SpriteClasses():
+      self.Register(cls.__name__, list(vars(cls).values()))
+    sprites = []
+    if game is not None:
+      self.Register('Environment.surface', game.env.surface)
+      self.Register('Statusbar.image', game.status.image)
+      for group in game.Groups():
+        sprites.extend(group.sprites())
+    for pool in pooling._POOLS.values():
+      sprites.extend(pool.free)
+    for sprite in sprites:
+      self.Register(type(sprite).__name__ + ' (instances)', list(vars(sprite).values()))
+
+  def Total(self):
+    return sum(sum(surfaces.values()) for surfaces in self.owners.values())
+
+  def OwnerTotals(self):
+    """Returns a list of (owner, surfaces, bytes) tuples, largest first."""
+    totals = [(owner, len(surfaces), sum(surfaces.values()))
+              for owner, surfaces in self.owners.items()]
+    return sorted(totals, key=lambda total: -total[2])
+
+  def RoomTotals(self):
+    """Work out what the surfaces each room uses take, from what's been loaded.
+
+    A room uses the tile images on its map and the class images of the enemies and items
+    placed in it.  Tiles and classes that haven't been loaded yet count as nothing, so scan
+    after loading every room for a complete picture.
+
+    Returns:
+      A list of (region, room, tile bytes, class bytes) tuples.
+    """
+    class_bytes = dict((owner, sum(surfaces.values()))
+                       for owner, surfaces in self.owners.items())
+    tile_bytes = dict((name, SurfaceBytes(image))
+                      for name, image in environment.TILE_IMAGES.items())
+    placed = dict(environment.ENEMIES)
+    placed.update(environment.ITEMS)
+    totals = []
+    for region in sorted(environment.REGIONS):
+      for room in sorted(environment.REGIONS[region], key=lambda name: int(name[3:])):
+        map_info = environment.REGIONS[region][room]
+        tiles = set()
+        classes = set()
+        for row in range(map_info['height']):
+          for col in range(map_info['width']):
+            tiles.add(environment.TileImageName(map_info, col, row))
+            mapcode = map_info['mapcodes'][row][col]
+            if mapcode in placed:
+              classes.add(placed[mapcode].__name__)
+        totals.append((region, room, sum(tile_bytes.get(name, 0) for name in tiles),
+                       sum(class_bytes.get(name, 0) for name in classes)))
+    return totals
+
+  def Report(self):
+    """Returns a table of the surfaces by owner, and then by room."""
+    lines = ['Surfaces: {:.2f} MB in {} surfaces (budget {:.0f} MB)'.format(
+        self.Total() / MB, len(self.surfaces), BUDGET_BYTES / MB)]
+    lines.append('  {:32} {:>8} {:>10}'.format('owner', 'surfaces', 'KB'))
+    for owner, count, size in self.OwnerTotals():
+      lines.append('  {:32} {:8} {:10.1f}'.format(owner, count, size / 1024.0))
+    lines.append('')
+    lines.append('  {:6} {:6} {:>10} {:>10}'.format('region', 'room', 'tiles KB', 'classes KB'))
+    for region, room, tiles, classes in self.RoomTotals():
+      lines.append('  {:6} {:6} {:10.1f} {:10.1f}'.format(region, room, tiles / 1024.0,
+                                                         classes / 1024.0))
+    return '\n'.join(lines) + '\n'
+
+  def Check(self, game):
+    """Scan the game, and print a warning if the surfaces are over budget.
+
+    Only warns when the total goes over the budget, not again until it has come back under.
+
+    Returns:
+      True if the surfaces are within the budget.
+    """
+    self.Scan(game)
+    total = self.Total()
+    over_budget = total > BUDGET_BYTES
+    if over_budget and not self.over_budget:
+      print('Warning: surfaces take {:.1f} MB, over the {:.0f} MB budget.  Largest: {}'.format(
+          total / MB, BUDGET_BYTES / MB, ', '.join(
+              '{} {:.1f} MB'.format(owner, size / MB)
+              for owner, _, size in self.OwnerTotals()[:WARNING_OWNERS])))
+    self.over_budget = over_budget
+    return not over_budget
+
+
+registry = SurfaceRegistry()
@@ -0,0 +1,11 @@
+"""
+Tests for the game's engine, run with pytest from the worldtree directory:
+  python -m pytest tests
+
+Most of them check an optimized piece of the engine against a straightforward version of
+what it replaced, over every room in the game.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
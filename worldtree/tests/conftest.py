@@ -0,0 +1,18 @@
+"""
+pytest setup for the tests.
+
+The game loads its images and sounds by paths relative to the worldtree directory, some of
+them as soon as their modules are imported, so this runs from there and starts pygame
+headless before any test module is imported.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import os
+
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import headless
+headless.Init()
@@ -0,0 +1,16 @@
+"""
+The rooms the tests go through.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import environment
+
+
+def AllRooms():
+  """Yields (region, room name) for every room in the game."""
+  for region in sorted(environment.REGIONS):
+    for room in sorted(environment.REGIONS[region]):
+      yield region, room
@@ -0,0 +1,81 @@
+"""
+Tests for counting a frame's allocations with allocations.AllocationTracker.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import cProfile
+import inspect
+import sys
+import unittest
+from unittest import mock
+
+import allocations
+import environment
+
+
+def LineOf(function, text):
+  """Returns the (filename, lineno) of the line in a function that contains text."""
+  lines, first = inspect.getsourcelines(function)
+  for offset, line in enumerate(lines):
+    if text in line:
+      return inspect.getsourcefile(function), first + offset
+  raise ValueError(text)
+
+
+class AllocationTrackerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.env = environment.Environment('Map1', 1)
+    self.tracker = allocations.AllocationTracker()
+    patcher = mock.patch.multiple(allocations, ENABLED=True, TEMPORARIES=True)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.addCleanup(self.tracker.Stop)
+
+  def Frame(self):
+    """Traces a frame that uses some tiles and keeps one rect, and returns its record."""
+    self.tracker.BeginFrame()
+    for col in range(10):
+      for tile in self.env.TilesForRect(self.env.RectForTile(col, 3)):
+        self.assertEqual(2, len(tile))
+    self.kept = self.env.RectForTile(0, 0)
+    return self.tracker.EndFrame()
+
+  def testShortLivedObjectsByLine(self):
+    record = self.Frame()
+    lines = dict(((filename, lineno), (blocks, size))
+                 for filename, lineno, blocks, size in record.temporaries)
+    rect_line = LineOf(environment.Environment.RectForTile, 'return pygame.Rect')
+    tiles_line = LineOf(environment.Environment.TilesForRect, 'return [')
+    # The rect that was kept isn't short-lived.
+    self.assertEqual(10, lines[rect_line][0])
+    # Lists and tuples may come off the interpreter's free lists, so their counts vary.
+    self.assertGreater(lines[tiles_line][1], 0)
+    self.assertIsNone(sys.getprofile())
+    self.assertIsNone(self.tracker.returned)
+
+  def testRetainedObjectsByLine(self):
+    record = self.Frame()
+    rect_line = LineOf(environment.Environment.RectForTile, 'return pygame.Rect')
+    self.assertIn(rect_line + (1,), [line[:3] for line in record.lines])
+
+  def testLeavesOtherProfilersAlone(self):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+      record = self.Frame()
+      self.assertIs(profile, sys.getprofile())
+    finally:
+      profile.disable()
+    self.assertIsNone(record.temporaries)
+    self.assertIsNotNone(record.lines)
+    self.assertEqual(0, self.tracker.temporary_frames)
+
+  def testReport(self):
+    self.Frame()
+    report = self.tracker.Report()
+    self.assertIn('short-lived (1 frames)', report)
+    self.assertIn('return pygame.Rect', report)
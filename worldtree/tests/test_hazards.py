@@ -0,0 +1,106 @@
+"""
+Tests for merging hazard tiles into rectangles in Environment.CreateAreas().
+
+Before the merge, each horizontal run of hazard tiles in a row was its own sprite, with a
+hitbox from the Powerup base class.  The merged hazards must touch the player in exactly the
+same places.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import random
+import unittest
+
+import pygame
+
+import environment
+from game_constants import TILE_WIDTH
+from tests import rooms
+
+
+def RowRunHitboxes(region, room):
+  """Returns (mapcode, hitbox) for every run of hazard tiles in a row, as they used to be.
+
+  Each run was a sprite the width of its tiles and 0 tall, and Powerup.Hitbox() inset that by
+  3 pixels on every side, which leaves a rect with a height of -6.
+  """
+  env = environment.Environment(room, region)
+  mapcodes = environment.REGIONS[region][room]['mapcodes']
+  hitboxes = []
+  for row in range(env.height):
+    col = 0
+    while col < env.width:
+      mapcode = mapcodes[row][col]
+      if mapcode not in environment.AREAS:
+        col += 1
+        continue
+      width = 1
+      while col + width < env.width and mapcodes[row][col + width] == mapcode:
+        width += 1
+      tile_rect = env.RectForTile(col, row)
+      hitboxes.append((mapcode, pygame.Rect(tile_rect.left + 3, tile_rect.top + 3,
+                                            width * TILE_WIDTH - 6, -6)))
+      col += width
+  return hitboxes
+
+
+def Normalized(rect):
+  """Returns a copy of a rect with any negative size flipped, as the strips have."""
+  rect = pygame.Rect(rect)
+  rect.normalize()
+  return rect
+
+
+def MapcodeFor(hazard):
+  for mapcode, cls in environment.AREAS.items():
+    if type(hazard) is cls:
+      return mapcode
+
+
+class CreateAreasTest(unittest.TestCase):
+
+  def testStripsAreTheRowRunHitboxes(self):
+    for region, room in rooms.AllRooms():
+      env = environment.Environment(room, region)
+      expected = sorted((mapcode, tuple(Normalized(hitbox)))
+                        for mapcode, hitbox in RowRunHitboxes(region, room))
+      strips = sorted((MapcodeFor(hazard), tuple(strip))
+                      for hazard, strip in env.hazard_index.items)
+      self.assertEqual(expected, strips, (region, room))
+
+  def testRectanglesCoverEachTileOnce(self):
+    for region, room in rooms.AllRooms():
+      env = environment.Environment(room, region)
+      mapcodes = environment.REGIONS[region][room]['mapcodes']
+      expected = sorted((mapcodes[row][col], (col, row)) for row in range(env.height)
+                        for col in range(env.width) if mapcodes[row][col] in environment.AREAS)
+      covered = []
+      for hazard in set(hazard for hazard, _ in env.hazard_index.items):
+        left, top = env.TileIndexForPoint(hazard.area.left, hazard.area.top)
+        for row in range(top, top + hazard.area.height // TILE_WIDTH):
+          for col in range(left, left + hazard.area.width // TILE_WIDTH):
+            covered.append((MapcodeFor(hazard), (col, row)))
+      self.assertEqual(expected, sorted(covered), (region, room))
+
+  def testTouchesTheSameRowsAsBefore(self):
+    """Player-sized boxes all over each room touch the same hazard rows as they used to."""
+    rnd = random.Random(1)
+    for region, room in rooms.AllRooms():
+      old_hitboxes = RowRunHitboxes(region, room)
+      if not old_hitboxes:
+        continue
+      env = environment.Environment(room, region)
+      for _ in range(200):
+        # Mostly near a hazard, since most of the room has none.
+        _, near = rnd.choice(old_hitboxes)
+        box = pygame.Rect(near.left + rnd.randint(-80, near.width + 20),
+                          near.top + rnd.randint(-110, 20), rnd.choice((12, 47, 52)), 94)
+        # The old hitboxes are checked as they were, with their negative heights.
+        old = sorted((mapcode, tuple(Normalized(hitbox))) for mapcode, hitbox in old_hitboxes
+                     if hitbox.colliderect(box))
+        new = sorted((MapcodeFor(hazard), tuple(strip))
+                     for hazard in env.HazardsForRect(box)
+                     for strip in hazard.strips if strip.colliderect(box))
+        self.assertEqual(old, new, (region, room, box))
@@ -0,0 +1,115 @@
+"""
+Tests for the patrol spans walking enemies use to find the ends of their platforms.
+
+Walkers used to check every step against the tiles, turning around when the move was
+illegal or the tile their leading edge moved into had nothing under it.
+Environment.PatrolLimits() has to make the same decisions.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import unittest
+from unittest import mock
+
+import pygame
+
+from characters import character
+import environment
+from game_constants import LEFT, RIGHT, TILE_HEIGHT, TILE_WIDTH
+import rng
+from tests import rooms
+
+# Hitbox sizes to try: about a Slug's, a Beaver's and the Baron's.
+BOX_SIZES = ((46, 46), (94, 58), (380, 238))
+SPEEDS = (1, 6, 16)
+# Pixels between the boxes tried along each row.
+STRIDE = 23
+
+
+def OldTurn(env, hitbox, dx):
+  """Returns whether a walker moving by dx turned around, by checking against the tiles."""
+  lead_x = hitbox.left + dx if dx < 0 else hitbox.right + dx
+  dest_tile = env.TileIndexForPoint(lead_x, hitbox.bottom)
+  return not env.IsRectMoveLegal(hitbox, (dx, 0)) or not env.IsTileSupported(*dest_tile)
+
+
+def OldWalkBackAndForth(self):
+  """Character.WalkBackAndForth() as it was before patrol spans."""
+  if self.direction == LEFT:
+    self.Walk(LEFT)
+    dest_tile = self.env.TileIndexForPoint(
+        self.Hitbox().left + self.movement[0], self.Hitbox().bottom)
+  elif self.direction == RIGHT:
+    self.Walk(RIGHT)
+    dest_tile = self.env.TileIndexForPoint(
+        self.Hitbox().right + self.movement[0], self.Hitbox().bottom)
+  if not self.env.IsMoveLegal(self, self.movement) or not self.env.IsTileSupported(*dest_tile):
+    if self.direction == LEFT:
+      self.Walk(RIGHT)
+    else:
+      self.Walk(LEFT)
+  return self.movement
+
+
+def IsOpen(env, rect):
+  """Returns True if every tile a rect overlaps is inside the room and passable every way."""
+  for col, row in env.TilesForRect(rect):
+    if col < 0 or row < 0 or col >= env.width or row >= env.height:
+      return False
+    square = env.grid[col][row]
+    if square.solid_top or square.solid_bottom or square.solid_left or square.solid_right:
+      return False
+  return True
+
+
+def CanStandAt(env, hitbox):
+  """Returns True if a walker could have walked to hitbox: it's in open space on the ground,
+  with ground under both of its edges."""
+  return (IsOpen(env, hitbox) and env.IsRectSupported(hitbox)
+          and env.IsTileSupported(*env.TileIndexForPoint(hitbox.left, hitbox.bottom))
+          and env.IsTileSupported(*env.TileIndexForPoint(hitbox.right, hitbox.bottom)))
+
+
+class PatrolLimitsTest(unittest.TestCase):
+
+  def testTurnsWhereTheTilesSay(self):
+    for region, room in rooms.AllRooms():
+      env = environment.Environment(room, region)
+      for width, height in BOX_SIZES:
+        for row in range(env.height - 1):
+          # Standing on the top of the next row down.
+          bottom = (row + 1) * TILE_HEIGHT - 1
+          floor = [env.grid[col][row + 1].solid_top for col in range(env.width)]
+          if not any(floor):
+            continue
+          for left in range(0, env.width * TILE_WIDTH - width, STRIDE):
+            hitbox = pygame.Rect(left, bottom - height, width, height)
+            # Checking the floor first skips most of the room quickly.
+            if (not floor[hitbox.left // TILE_WIDTH] or not floor[hitbox.right // TILE_WIDTH]
+                or not CanStandAt(env, hitbox)):
+              continue
+            limits = env.PatrolLimits(hitbox.left, hitbox.top, hitbox.right, hitbox.bottom)
+            self.assertIsNotNone(limits)
+            for speed in SPEEDS:
+              self.assertEqual(OldTurn(env, hitbox, -speed), hitbox.left - speed < limits[0],
+                               (region, room, hitbox, -speed))
+              self.assertEqual(OldTurn(env, hitbox, speed), hitbox.right + speed >= limits[1],
+                               (region, room, hitbox, speed))
+
+  def testEnemiesWalkTheSamePaths(self):
+    """Every enemy in every room goes the same way for a while as it did before."""
+    for region, room in rooms.AllRooms():
+      paths = []
+      for walk in (OldWalkBackAndForth, character.Character.WalkBackAndForth):
+        with mock.patch.object(character.Character, 'WalkBackAndForth', walk):
+          rng.Seed(1)
+          env = environment.Environment(room, region)
+          path = []
+          for _ in range(120):
+            env.enemy_group.update()
+            path.append(sorted((type(enemy).__name__, tuple(enemy.rect), enemy.direction)
+                               for enemy in env.enemy_group))
+          paths.append(path)
+      self.assertEqual(paths[0], paths[1], (region, room))
@@ -0,0 +1,152 @@
+"""
+Tests for recycling sprites through pooling.Pool.
+
+A sprite that comes out of a pool has been used and killed before, so Reset() has to leave
+it exactly as its constructor would have.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import unittest
+
+import pygame
+
+from benchmarks import scenarios
+from characters import animation
+from characters import character
+from characters import powerup
+from characters import projectile
+import controller
+import environment
+import game
+from game_constants import GameOverException
+import pooling
+import rng
+import snapshot
+
+
+def State(sprite):
+  """Returns a dict of a sprite's attributes that can be compared between two sprites."""
+  state = {}
+  for name, value in vars(sprite).items():
+    # Group membership, and a memo that is checked before it's used.
+    if name.startswith('_Sprite__') or name == '_hitbox_cache':
+      continue
+    if isinstance(value, pygame.Rect):
+      value = tuple(value)
+    elif isinstance(value, animation.Animation):
+      value = (value.current, value.framecount, value.framedelay, value.looping,
+               id(value.images))
+    elif isinstance(value, (pygame.Surface, environment.Environment)):
+      value = id(value)
+    elif isinstance(value, list):
+      value = list(value)
+    state[name] = value
+  return state
+
+
+def GroupState(group):
+  return sorted((type(sprite).__name__, tuple(sprite.rect)) for sprite in group)
+
+
+class PoolTest(unittest.TestCase):
+
+  def setUp(self):
+    pooling.Clear()
+    self.env = environment.Environment('Map1', 1)
+
+  def tearDown(self):
+    pooling.Clear()
+    pooling.ENABLED = True
+
+  def assertResetLikeNew(self, cls, first_args, args, frames=10):
+    """Checks a sprite used with first_args and then reused with args matches a new one."""
+    group = pygame.sprite.Group()
+    used = cls.Spawn(*first_args)
+    group.add(used)
+    for _ in range(frames):
+      used.update()
+    used.kill()
+    reused = cls.Spawn(*args)
+    self.assertIs(used, reused)
+    self.assertEqual(State(cls(*args)), State(reused))
+
+  def testProjectilesResetLikeNew(self):
+    for cls in (projectile.SeedBullet, projectile.SporeCloud):
+      self.assertResetLikeNew(cls, (self.env, (1, 0), (300, 300)),
+                              (self.env, (-2, 1), (120, 480)))
+
+  def testDropsResetLikeNew(self):
+    for cls in (powerup.HealthRestore, powerup.AmmoRestore):
+      self.assertResetLikeNew(cls, (self.env, (3, 4)), (self.env, (7, 2)))
+
+  def testDyingResetsLikeNew(self):
+    boss_images = character.LoadImages('regularexplode1*.png', scaled=True)
+    self.assertResetLikeNew(character.Dying, (pygame.Rect(10, 10, 300, 200), False, False, None,
+                                              boss_images),
+                            (pygame.Rect(200, 50, 48, 48),), frames=30)
+
+  def testReleasedOnce(self):
+    group = pygame.sprite.Group()
+    bullet = projectile.SeedBullet.Spawn(self.env, (1, 0), (300, 300))
+    group.add(bullet)
+    bullet.kill()
+    bullet.kill()
+    pool = pooling.PoolFor(projectile.SeedBullet)
+    self.assertEqual([bullet], pool.free)
+    self.assertEqual(1, pool.releases)
+
+  def testFreeListIsCapped(self):
+    group = pygame.sprite.Group()
+    bullets = [projectile.SeedBullet.Spawn(self.env, (1, 0), (300, 300))
+               for _ in range(pooling.MAX_FREE + 5)]
+    group.add(*bullets)
+    for bullet in bullets:
+      bullet.kill()
+    self.assertEqual(pooling.MAX_FREE, len(pooling.PoolFor(projectile.SeedBullet).free))
+
+  def testDisabledBuildsNewSprites(self):
+    pooling.ENABLED = False
+    group = pygame.sprite.Group()
+    bullet = projectile.SeedBullet.Spawn(self.env, (1, 0), (300, 300))
+    group.add(bullet)
+    bullet.kill()
+    self.assertIsNot(bullet, projectile.SeedBullet.Spawn(self.env, (1, 0), (300, 300)))
+
+  def testGamePlaysTheSameWithoutPools(self):
+    """Games full of shooting and drops go exactly the same way with pooling off."""
+    for name in ('cave', 'spawners'):
+      runs = self.PlayWithAndWithoutPools(name)
+      self.assertEqual(runs[0], runs[1], name)
+      self.assertTrue(any(state[1] for state in runs[0]), name)
+
+  def PlayWithAndWithoutPools(self, name):
+    """Returns the state after every step of a scenario, with pooling on and then off."""
+    region, room, position, _ = scenarios.SCENARIOS[name]
+    runs = []
+    source = controller.input_source
+    try:
+      for enabled in (True, False):
+        pooling.Clear()
+        pooling.ENABLED = enabled
+        rng.Seed(1)
+        controller.input_source = scenarios.ScriptedInput()
+        scenario_game = game.Game(scenarios.screen, room=room, region=region, position=position)
+        scenario_game.player.ammo = scenario_game.player.max_ammo = 50
+        states = []
+        try:
+          for _ in range(600):
+            scenario_game.Tick()
+            env = scenario_game.env
+            states.append((snapshot.Capture(scenario_game),
+                           GroupState(env.hero_projectile_group),
+                           GroupState(env.enemy_projectile_group),
+                           GroupState(env.item_group), GroupState(env.dying_animation_group)))
+        except GameOverException:
+          pass
+        runs.append(states)
+    finally:
+      controller.input_source = source
+    return runs
@@ -0,0 +1,96 @@
+"""
+Tests for predicting when a projectile hits a wall, in Environment.PredictImpact().
+
+Projectiles used to check IsMoveLegal() on every frame and die on the first illegal move.
+PredictImpact() has to find that same frame without stepping through all of them.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import random
+import unittest
+from unittest import mock
+
+import pygame
+
+from characters import projectile
+import environment
+from game_constants import TILE_HEIGHT, TILE_WIDTH
+from tests import rooms
+
+# Rect sizes to try: a single pixel, about a seed bullet, a spore cloud and a whole tile.
+BOX_SIZES = ((1, 1), (12, 12), (24, 10), (48, 48))
+# Speeds along each axis, including 0 and ones either side of a tile.
+SPEEDS = (0, 1, 3, 7, 16, 47, 48, 50, 97)
+CASES_PER_ROOM = 60
+
+
+def FramesToImpact(env, hitbox, vector):
+  """Returns the first frame whose move is illegal, by checking each frame in turn."""
+  frame = 0
+  while env.IsRectMoveLegal(hitbox.move(frame * vector[0], frame * vector[1]), vector):
+    frame += 1
+  return frame
+
+
+def OldUpdate(self):
+  """Projectile.update() as it was before impacts were predicted."""
+  self.SetCurrentImage()
+  if not self.env.IsMoveLegal(self, self.movement):
+    self.kill()
+  self.rect = self.rect.move(self.movement)
+
+
+class PredictImpactTest(unittest.TestCase):
+
+  def testNextCrossing(self):
+    for tile_size in (TILE_WIDTH, TILE_HEIGHT):
+      for lead in range(-100, 200, 3):
+        for speed in (-97, -48, -13, -1, 1, 5, 48, 50):
+          for start in (0, 2, 7):
+            frame = start
+            while (lead + frame * speed) // tile_size == (lead + (frame + 1) * speed) // tile_size:
+              frame += 1
+            self.assertEqual(
+                frame, environment.Environment._NextCrossing(lead, speed, tile_size, start),
+                (lead, speed, tile_size, start))
+
+  def testMatchesCheckingEveryFrame(self):
+    rnd = random.Random(1)
+    for region, room in rooms.AllRooms():
+      env = environment.Environment(room, region)
+      for _ in range(CASES_PER_ROOM):
+        width, height = rnd.choice(BOX_SIZES)
+        hitbox = pygame.Rect(rnd.randrange(env.width * TILE_WIDTH - width),
+                             rnd.randrange(env.height * TILE_HEIGHT - height), width, height)
+        vector = (rnd.choice((-1, 1)) * rnd.choice(SPEEDS),
+                  rnd.choice((-1, 1)) * rnd.choice(SPEEDS))
+        if vector == (0, 0):
+          self.assertIsNone(env.PredictImpact(hitbox, vector))
+          continue
+        self.assertEqual(FramesToImpact(env, hitbox, vector), env.PredictImpact(hitbox, vector),
+                         (region, room, hitbox, vector))
+
+  def testProjectilesDieOnTheSameFrame(self):
+    """Seed bullets fired all over each room fly the same path as they used to."""
+    rnd = random.Random(2)
+    directions = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-3, 1), (2, -5))
+    for region, room in rooms.AllRooms():
+      env = environment.Environment(room, region)
+      for _ in range(10):
+        position = env.ScreenCoordinateForMapPoint(rnd.randrange(env.width * TILE_WIDTH),
+                                                   rnd.randrange(env.height * TILE_HEIGHT))
+        direction = rnd.choice(directions)
+        paths = []
+        for update in (OldUpdate, projectile.Projectile.update):
+          with mock.patch.object(projectile.Projectile, 'update', update):
+            bullet = projectile.SeedBullet.Spawn(env, direction, position)
+            env.hero_projectile_group.add(bullet)
+            path = []
+            while bullet.alive():
+              bullet.update()
+              path.append(tuple(bullet.rect))
+            paths.append(path)
+        self.assertEqual(paths[0], paths[1], (region, room, position, direction))
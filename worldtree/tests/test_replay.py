@@ -0,0 +1,103 @@
+"""
+Tests for recording a game's input with replay.Recorder and playing it back.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import os
+import tempfile
+import unittest
+
+from benchmarks import scenarios
+from characters import powerup
+import controller
+import game
+from game_constants import GameOverException
+import replay
+import rng
+import snapshot
+
+STEPS = 600
+# Recordings start this far into a scenario, once nothing unrecorded is on screen.
+WARMUP = 300
+# Items enemies can drop, which unlike the map's items aren't put back by loading the room.
+DROPS = (powerup.HealthRestore, powerup.AmmoRestore)
+
+
+def Quiet(scenario_game):
+  """Returns whether a game has nothing in it that a snapshot leaves out."""
+  env = scenario_game.env
+  return (scenario_game.state == game.PLAYING and not env.hero_projectile_group
+          and not env.enemy_projectile_group and not env.dying_animation_group
+          and not any(type(item) in DROPS for item in env.item_group))
+
+
+class ReplayTest(unittest.TestCase):
+
+  def setUp(self):
+    self.source = controller.input_source
+
+  def tearDown(self):
+    controller.input_source = self.source
+
+  def Record(self, name, warmup=WARMUP):
+    """Returns a recording of a scenario played with scripted input, and the game at its end.
+
+    The recording starts at the first quiet step after warmup, or is None if there isn't one.
+    """
+    region, room, position, _ = scenarios.SCENARIOS[name]
+    rng.Seed(scenarios.SEED)
+    controller.input_source = scenarios.ScriptedInput()
+    scenario_game = game.Game(scenarios.screen, room=room, region=region, position=position)
+    try:
+      for step in range(warmup + STEPS):
+        if step >= warmup and Quiet(scenario_game):
+          break
+        scenario_game.Tick()
+      else:
+        return None, None
+    except GameOverException:
+      return None, None
+    recorder = replay.Recorder(scenario_game, seed=scenarios.SEED + 1)
+    try:
+      for _ in range(STEPS):
+        scenario_game.Tick()
+    except GameOverException:
+      pass
+    finally:
+      recorder.Stop()
+    return recorder.recording, snapshot.Capture(scenario_game)
+
+  def testPlaysBackTheSameGame(self):
+    """Every character's timers and animations carry on from the start as they did live."""
+    recorded = 0
+    for name in sorted(scenarios.SCENARIOS):
+      recording, end = self.Record(name)
+      if recording is None:
+        continue
+      recorded += 1
+      played = game.Game(scenarios.screen)
+      ticks = replay.Play(played, recording)
+      self.assertEqual(len(recording.steps), ticks, name)
+      self.assertEqual(end, snapshot.Capture(played), name)
+    self.assertGreaterEqual(recorded, 3)
+
+  def testSaveAndLoad(self):
+    recording, _ = self.Record('start', warmup=0)
+    handle, path = tempfile.mkstemp(suffix='.wtr')
+    os.close(handle)
+    try:
+      recording.Save(path)
+      loaded = replay.Recording.Load(path)
+    finally:
+      os.remove(path)
+    self.assertEqual(recording.seed, loaded.seed)
+    self.assertEqual(recording.start, loaded.start)
+    self.assertEqual(recording.steps, loaded.steps)
+
+  def testActionsRoundTrip(self):
+    for count in range(len(controller.ALL_ACTIONS) + 1):
+      actions = list(controller.ALL_ACTIONS[:count])
+      self.assertEqual(actions, replay.UnpackActions(replay.PackActions(actions)))
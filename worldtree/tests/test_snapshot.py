@@ -0,0 +1,133 @@
+"""
+Tests for capturing a game with snapshot.Capture() and putting it back with Restore().
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import unittest
+from unittest import mock
+
+from benchmarks import scenarios
+from characters import enemies
+import controller
+import environment
+import game
+from game_constants import GameOverException
+import gcpolicy
+import rng
+import snapshot
+
+# Long enough for the spawners to have bugs out and the Baron to be on the move.
+STEPS = 400
+
+
+def Pipes(scenario_game):
+  """Returns where each BugPipe in a game is and how many of its bugs are alive."""
+  return sorted((tuple(pipe.rect), len([bug for bug in pipe.bugs if bug.alive()]))
+                for pipe in scenario_game.env.enemy_group if isinstance(pipe, enemies.BugPipe))
+
+
+class SnapshotTest(unittest.TestCase):
+
+  def setUp(self):
+    self.source = controller.input_source
+    self.collected = set(environment.COLLECTED)
+
+  def tearDown(self):
+    controller.input_source = self.source
+    environment.COLLECTED.clear()
+    environment.COLLECTED.update(self.collected)
+
+  def Play(self, name, steps=STEPS):
+    """Returns a game of a scenario after it has been played with scripted input for a while."""
+    region, room, position, _ = scenarios.SCENARIOS[name]
+    rng.Seed(scenarios.SEED)
+    controller.input_source = scenarios.ScriptedInput()
+    scenario_game = game.Game(scenarios.screen, room=room, region=region, position=position)
+    for _ in range(steps):
+      scenario_game.Tick()
+    return scenario_game
+
+  def testRoundTrip(self):
+    """A game restored from a snapshot snapshots the same way, whichever room it was in."""
+    for name in ('start', 'spawners', 'wide', 'lair'):
+      data = snapshot.Capture(self.Play(name))
+      restored = game.Game(scenarios.screen)
+      restored.Restore(data)
+      self.assertEqual(data, snapshot.Capture(restored), name)
+
+  def testEnemiesAreWhereTheyWere(self):
+    played = self.Play('wide')
+    restored = game.Game(scenarios.screen)
+    restored.Restore(snapshot.Capture(played))
+    def Enemies(scenario_game):
+      return sorted((type(enemy).__name__, tuple(enemy.rect), enemy.hp, tuple(enemy.movement))
+                    for enemy in scenario_game.env.enemy_group)
+    self.assertEqual(Enemies(played), Enemies(restored))
+
+  def testSpawnersGetTheirBugsBack(self):
+    played = self.Play('spawners')
+    restored = game.Game(scenarios.screen)
+    restored.Restore(snapshot.Capture(played))
+    self.assertTrue(any(bugs for _, bugs in Pipes(played)))
+    self.assertEqual(Pipes(played), Pipes(restored))
+
+  def testBaronKeepsSharingItsMovement(self):
+    played = self.Play('lair')
+    restored = game.Game(scenarios.screen)
+    restored.Restore(snapshot.Capture(played))
+    barons = [enemy for enemy in restored.env.enemy_group if isinstance(enemy, enemies.Baron)]
+    self.assertEqual(1, len(barons))
+    self.assertIs(barons[0].movement, barons[0].last_movement)
+
+  def testRoomLoadedOnce(self):
+    data = snapshot.Capture(self.Play('spawners', steps=10))
+    restored = game.Game(scenarios.screen)
+    with mock.patch.object(gcpolicy.manager, 'RoomLoaded') as room_loaded:
+      restored.Restore(data)
+    self.assertEqual(1, room_loaded.call_count)
+
+  def testCollectedItemsAreReplaced(self):
+    scenario_game = game.Game(scenarios.screen)
+    environment.COLLECTED.clear()
+    environment.COLLECTED.add((1, 'Map3', 4, 5))
+    data = snapshot.Capture(scenario_game)
+    environment.COLLECTED.add((2, 'Map8', 6, 7))
+    scenario_game.Restore(data)
+    self.assertEqual({(1, 'Map3', 4, 5)}, environment.COLLECTED)
+
+  def testRejectsOtherData(self):
+    data = snapshot.Capture(game.Game(scenarios.screen))
+    scenario_game = game.Game(scenarios.screen)
+    with self.assertRaises(snapshot.SnapshotError):
+      snapshot.Restore(scenario_game, b'WTR' + data[3:])
+    with self.assertRaises(snapshot.SnapshotError):
+      snapshot.Restore(scenario_game, data[:3] + bytes([snapshot.VERSION + 1]) + data[4:])
+
+  def testDyingEndsTheGameByDefault(self):
+    self.assertFalse(game.RESTART_FROM_CHECKPOINT)
+    scenario_game = game.Game(scenarios.screen)
+    scenario_game.checkpoint = snapshot.Capture(scenario_game)
+    controller.input_source = lambda: []
+    scenario_game.player.Die()
+    with self.assertRaises(GameOverException):
+      for _ in range(1000):
+        scenario_game.Tick()
+
+  def testDyingCanRestartFromTheCheckpoint(self):
+    scenario_game = game.Game(scenarios.screen)
+    scenario_game.checkpoint = snapshot.Capture(scenario_game)
+    controller.input_source = lambda: []
+    scenario_game.player.Die()
+    with mock.patch.object(game, 'RESTART_FROM_CHECKPOINT', True):
+      for _ in range(1000):
+        scenario_game.Tick()
+        if scenario_game.state == game.GAME_OVER:
+          break
+      while scenario_game.state != game.PLAYING:
+        scenario_game.Tick()
+    self.assertTrue(scenario_game.player.alive())
+    self.assertEqual(scenario_game.checkpoint, snapshot.Capture(scenario_game))
+
@@ -0,0 +1,76 @@
+"""
+Tests for moving walking enemies with a walkers.WalkerBatch.
+
+The batch has to move every walker exactly as the walker's own update() does without it, so
+a game plays out the same way with environment.BATCH_WALKERS on or off.
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+import unittest
+from unittest import mock
+
+from benchmarks import scenarios
+import controller
+import environment
+import game
+from game_constants import GameOverException
+import rng
+import snapshot
+from tests import rooms
+
+STEPS = 400
+
+
+def Walkers(env):
+  return sorted((type(enemy).__name__, tuple(enemy.rect), enemy.direction, tuple(enemy.movement))
+                for enemy in env.enemy_group if enemy.WALKER)
+
+
+class WalkerBatchTest(unittest.TestCase):
+
+  def testEnemiesWalkTheSamePaths(self):
+    """Every walker in every room goes the same way for a while with the batch as without."""
+    for region, room in rooms.AllRooms():
+      paths = []
+      for batch in (False, True):
+        with mock.patch.object(environment, 'BATCH_WALKERS', batch):
+          rng.Seed(1)
+          env = environment.Environment(room, region)
+          self.assertEqual(batch, env.walkers is not None)
+          path = []
+          for _ in range(120):
+            env.enemy_group.update()
+            env.AdvanceWalkers()
+            path.append(Walkers(env))
+          paths.append(path)
+      self.assertEqual(paths[0], paths[1], (region, room))
+
+  def testGamesPlayTheSame(self):
+    """Each scenario snapshots the same after every step with the batch as without."""
+    source = controller.input_source
+    try:
+      for name in sorted(scenarios.SCENARIOS):
+        region, room, position, _ = scenarios.SCENARIOS[name]
+        runs = []
+        for batch in (False, True):
+          with mock.patch.object(environment, 'BATCH_WALKERS', batch):
+            rng.Seed(scenarios.SEED)
+            controller.input_source = scenarios.ScriptedInput()
+            scenario_game = game.Game(scenarios.screen, room=room, region=region,
+                                      position=position)
+            states = []
+            try:
+              for _ in range(STEPS):
+                scenario_game.Tick()
+                states.append(snapshot.Capture(scenario_game))
+            except GameOverException:
+              pass
+            runs.append(states)
+        self.assertEqual(len(runs[0]), len(runs[1]), name)
+        for step, (unbatched, batched) in enumerate(zip(*runs)):
+          self.assertEqual(unbatched, batched, (name, step))
+    finally:
+      controller.input_source = source
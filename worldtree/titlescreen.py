@@ -11,6 +11,7 @@ import sys
 
 import pygame
 
+import audio
 import controller
 import game_constants
 
@@ -175,8 +176,8 @@ class Title(object):
     pygame.display.flip()
     clock = pygame.time.Clock()
     if self.music is not None:
-      pygame.mixer.music.load(os.path.join('media', 'music', self.music))
-      pygame.mixer.music.play(-1)
+      audio.music.load(os.path.join('media', 'music', self.music))
+      audio.music.play(-1)
   
     frame = -self.frame_delay
     # Controls how long before the text scroll begins.  Mostly obsolete with text intro on
@@ -217,7 +218,7 @@ class Title(object):
       frame += 1
       pygame.display.update(text_area_rect)
 
-    pygame.mixer.music.stop()
+    audio.music.stop()
     fade_frame = 0
     while (self.background.get_alpha() or 255) > 4:
       fade_frame +=1
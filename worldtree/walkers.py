@@ -0,0 +1,303 @@
+"""
+Batched simulation of ground-walking enemies.
+
+Walking enemies normally move themselves one at a time through a chain of method calls on the
+character and the Environment (WalkBackAndForth, Walk, IsMoveLegal, IsTileSupported,
+AttemptMove, IsRectSupported).  A WalkerBatch instead keeps the position and velocity of every
+walker in a room in parallel arrays and advances all of them in a single loop over a flattened
+copy of the room's solidity grid.  It is still a plain Python loop, so what it saves is the
+method calls and Rect objects of the per-sprite path, not the work per walker.  The character
+objects are still responsible for deciding whether they are walking this frame, for their
+animation, and for being hit - the batch writes their new position back to them during
+Advance() and then calls their WalkerMoved(), so they pick their image for the direction they
+ended up facing.
+
+The batch is optional - see environment.BATCH_WALKERS - and moves walkers exactly as their own
+update() would.  Compare the two with "python -m benchmarks.scenarios [--batch-walkers]".
+
+Created on Oct 19, 2026
+
+@author: dscotton@gmail.com (David Scotton)
+"""
+
+from array import array
+
+from game_constants import LEFT
+from game_constants import RIGHT
+from game_constants import MAP_X
+from game_constants import MAP_Y
+from game_constants import TILE_WIDTH
+from game_constants import TILE_HEIGHT
+
+# Values for WalkerBatch.mode.
+WALK = 0  # Walk back and forth along the current platform.
+REST = 1  # Stand still, but still fall if unsupported.
+FROZEN = 2  # The batch doesn't touch the walker at all, e.g. while a BoomBug explodes.
+
+# Bit flags in WalkerBatch.solidity.
+SOLID_LEFT = 1
+SOLID_RIGHT = 2
+SOLID_TOP = 4
+SOLID_BOTTOM = 8
+SOLID_ALL = SOLID_LEFT | SOLID_RIGHT | SOLID_TOP | SOLID_BOTTOM
+
+
+class WalkerBatch(object):
+  """Structure-of-arrays storage and update for every walking enemy in a room.
+
+  Positions are of the top left corner of the walker's rect, relative to the map origin.
+  Collisions with the map use the walker's hitbox, which is found from the offsets returned by
+  its HitboxOffsets() method and can differ depending on which way it faces.
+
+  Attributes:
+    env: the Environment the walkers are in.
+    width: int width of the room in tiles.
+    height: int height of the room in tiles.
+    solidity: bytearray of SOLID_* bit flags for each tile, indexed by row * width + col.
+    sprites: list of the Character for each slot.
+    x, y: arrays of each walker's position.
+    box_left, box_right: arrays of the hitbox's x offset when facing LEFT and RIGHT.
+    box_top, box_w, box_h: arrays of the hitbox's y offset and size.
+    vx, vy: arrays of each walker's velocity.
+    direction: array of each walker's LEFT or RIGHT facing.
+    speed, accel, gravity, terminal: arrays of each walker's movement constants.
+    mode: array of WALK, REST or FROZEN for each walker.
+  """
+
+  def __init__(self, env):
+    self.env = env
+    self.width = env.width
+    self.height = env.height
+    self.solidity = bytearray(env.width * env.height)
+    for col, column in enumerate(env.grid):
+      for row, square in enumerate(column):
+        self.solidity[row * env.width + col] = (
+            (SOLID_LEFT if square.solid_left else 0)
+            | (SOLID_RIGHT if square.solid_right else 0)
+            | (SOLID_TOP if square.solid_top else 0)
+            | (SOLID_BOTTOM if square.solid_bottom else 0))
+    self.sprites = []
+    self.x = array('i')
+    self.y = array('i')
+    self.box_left = array('i')
+    self.box_right = array('i')
+    self.box_top = array('i')
+    self.box_w = array('i')
+    self.box_h = array('i')
+    self.vx = array('i')
+    self.vy = array('i')
+    self.direction = array('i')
+    self.speed = array('i')
+    self.accel = array('i')
+    self.gravity = array('i')
+    self.terminal = array('i')
+    self.mode = array('i')
+    self._columns = (self.x, self.y, self.box_left, self.box_right, self.box_top, self.box_w,
+                     self.box_h, self.vx, self.vy, self.direction, self.speed, self.accel,
+                     self.gravity, self.terminal, self.mode)
+
+  def __len__(self):
+    return len(self.sprites)
+
+  def Add(self, sprite):
+    """Start simulating a walker in the batch.  Sets sprite.walker_slot."""
+    left, top = self.env.MapCoordinateForScreenPoint(sprite.rect.left, sprite.rect.top)
+    sprite.walker_slot = len(self.sprites)
+    self.sprites.append(sprite)
+    self.x.append(left)
+    self.y.append(top)
+    box_left, box_top, box_w, box_h = sprite.HitboxOffsets(LEFT)
+    self.box_left.append(box_left)
+    self.box_right.append(sprite.HitboxOffsets(RIGHT)[0])
+    self.box_top.append(box_top)
+    self.box_w.append(box_w)
+    self.box_h.append(box_h)
+    self.vx.append(sprite.movement[0])
+    self.vy.append(sprite.movement[1])
+    self.direction.append(sprite.direction)
+    self.speed.append(sprite.SPEED)
+    self.accel.append(sprite.ACCEL)
+    self.gravity.append(sprite.GRAVITY)
+    self.terminal.append(sprite.TERMINAL_VELOCITY)
+    self.mode.append(WALK)
+
+  def _Remove(self, slot):
+    """Remove a slot by moving the last walker into it."""
+    removed = self.sprites[slot]
+    last = len(self.sprites) - 1
+    if slot != last:
+      for column in self._columns:
+        column[slot] = column[last]
+      self.sprites[slot] = self.sprites[last]
+      self.sprites[slot].walker_slot = slot
+    for column in self._columns:
+      column.pop()
+    self.sprites.pop()
+    removed.walker_slot = None
+
+  def SetMode(self, slot, mode, speed=None):
+    """Set what a walker does on the next Advance(), optionally changing its speed."""
+    self.mode[slot] = mode
+    if speed is not None:
+      self.speed[slot] = speed
+
+  def Push(self, slot, dx, dy):
+    """Add to a walker's velocity, e.g. when it's knocked back by an attack."""
+    self.vx[slot] += dx
+    self.vy[slot] += dy
+
+  def Solidity(self, col, row):
+    """Return the SOLID_* flags for a tile.  Tiles outside the room are fully solid."""
+    if col < 0 or col >= self.width or row < 0 or row >= self.height:
+      return SOLID_ALL
+    return self.solidity[row * self.width + col]
+
+  def ClampMove(self, left, top, width, height, vx, vy):
+    """Array version of Environment.AttemptMove() for a non-player hitbox.
+
+    Returns:
+      (vx, vy, blocked) where the vector is shortened so the box stops short of any tile it
+      isn't allowed to enter, and blocked is True if any shortening happened.
+    """
+    right = left + width
+    bottom = top + height
+    dest_left = left + vx
+    dest_top = top + vy
+    dest_right = right + vx
+    dest_bottom = bottom + vy
+    old_cols = range(left // TILE_WIDTH, right // TILE_WIDTH + 1)
+    old_rows = range(top // TILE_HEIGHT, bottom // TILE_HEIGHT + 1)
+    new_vx = vx
+    new_vy = vy
+    blocked = False
+    for col in range(dest_left // TILE_WIDTH, dest_right // TILE_WIDTH + 1):
+      tile_left = col * TILE_WIDTH
+      tile_right = tile_left + TILE_WIDTH - 1
+      for row in range(dest_top // TILE_HEIGHT, dest_bottom // TILE_HEIGHT + 1):
+        if col in old_cols and row in old_rows:
+          continue
+        flags = self.Solidity(col, row)
+        if not flags:
+          continue
+        tile_top = row * TILE_HEIGHT
+        tile_bottom = tile_top + TILE_HEIGHT - 1
+        if bottom < tile_top and flags & SOLID_TOP and dest_bottom >= tile_top:
+          new_vy = tile_top - bottom - 1
+          blocked = True
+        elif top > tile_bottom and flags & SOLID_BOTTOM and dest_top <= tile_bottom:
+          new_vy = tile_bottom - top + 1
+          blocked = True
+        if right < tile_left and flags & SOLID_LEFT and dest_right >= tile_left:
+          new_vx = tile_left - right - 1
+          blocked = True
+        elif left > tile_right and flags & SOLID_RIGHT and dest_left <= tile_right:
+          new_vx = tile_right - left + 1
+          blocked = True
+    return new_vx, new_vy, blocked
+
+  def IsSupported(self, left, top, width, height):
+    """Array version of Environment.IsRectSupported() in the downward direction."""
+    bottom = top + height
+    row = (bottom + 1) // TILE_HEIGHT
+    columns = range(max(left // TILE_WIDTH, 0),
+                    min((left + width) // TILE_WIDTH, self.width - 1) + 1)
+    if row == bottom // TILE_HEIGHT or not columns or row < 0:
+      # Moving down a pixel doesn't reach a new row of tiles inside the room.
+      return False
+    if row >= self.height:
+      return True
+    for col in columns:
+      if self.solidity[row * self.width + col] & SOLID_TOP:
+        return True
+    return False
+
+  def IsTileSupported(self, col, row):
+    """Array version of Environment.IsTileSupported()."""
+    if col < 0 or col >= self.width or row + 1 < 0:
+      return False
+    if row + 1 >= self.height:
+      return True
+    return bool(self.solidity[(row + 1) * self.width + col] & SOLID_TOP)
+
+  def Advance(self, skip=()):
+    """Move every walker one frame, then copy the results back to the sprites.
+
+    Args:
+      skip: collection of slots to leave untouched this frame, as if they were FROZEN.
+    """
+    dead = []
+    offset_x = MAP_X - self.env.screen_offset[0]
+    offset_y = MAP_Y - self.env.screen_offset[1]
+    for i in range(len(self.sprites)):
+      sprite = self.sprites[i]
+      if not sprite.alive():
+        dead.append(i)
+        continue
+      mode = self.mode[i]
+      if mode == FROZEN or i in skip:
+        continue
+      x, y = self.x[i], self.y[i]
+      width, height = self.box_w[i], self.box_h[i]
+      top = y + self.box_top[i]
+      vx, vy, direction = self.vx[i], self.vy[i], self.direction[i]
+      speed, accel, gravity = self.speed[i], self.accel[i], self.gravity[i]
+
+      if mode == WALK:
+        # Same as Character.WalkBackAndForth(): take a step, and turn around if the step
+        # would hit a wall or walk off the edge of the platform.  Grounded walkers use the
+        # Environment's patrol spans rather than probing the grid.
+        for attempt in (0, 1):
+          left = x + (self.box_left[i] if direction == LEFT else self.box_right[i])
+          if direction == LEFT:
+            vx = vx + gravity if vx < -speed else max(vx - accel, -speed)
+            lead_x = left + vx
+          else:
+            vx = vx - gravity if vx > speed else min(vx + accel, speed)
+            lead_x = left + width + vx
+          if attempt == 1:
+            break
+          limits = None
+          if vy == 0:
+            limits = self.env.PatrolLimits(left, top, left + width, top + height)
+          if limits is not None:
+            if limits[0] <= lead_x < limits[1]:
+              break
+          elif (not self.ClampMove(left, top, width, height, vx, vy)[2]
+                and self.IsTileSupported(lead_x // TILE_WIDTH, (top + height) // TILE_HEIGHT)):
+            break
+          direction = RIGHT if direction == LEFT else LEFT
+      else:
+        vx = 0
+
+      left = x + (self.box_left[i] if direction == LEFT else self.box_right[i])
+      move_x, move_y, blocked = self.ClampMove(left, top, width, height, vx, vy)
+      x += move_x
+      y += move_y
+      left += move_x
+      top += move_y
+      if self.IsSupported(left, top, width, height):
+        vy = 0
+        sprite.Supported()
+      elif vy < self.terminal[i]:
+        vy = min(vy + gravity, self.terminal[i])
+
+      self.x[i] = x
+      self.y[i] = y
+      self.vx[i] = vx
+      self.vy[i] = vy
+      self.direction[i] = direction
+
+      sprite.rect.topleft = (x + offset_x, y + offset_y)
+      sprite.movement[0] = vx
+      sprite.movement[1] = vy
+      sprite.direction = direction
+      center_col = (left + width // 2) // TILE_WIDTH
+      center_row = (top + height // 2) // TILE_HEIGHT
+      if (center_col < 0 or center_col >= self.width
+          or center_row < 0 or center_row >= self.height):
+        sprite.kill()
+        dead.append(i)
+      else:
+        sprite.WalkerMoved(mode == WALK)
+    for slot in reversed(dead):
+      self._Remove(slot)